@@ -6,8 +6,51 @@ Main entry point for handelsregister CLI application.
 import argparse
 import sys
 
+from config import (
+    READINESS_TIMEOUT,
+    SEARCH_BACKENDS,
+    PARSER_BACKENDS,
+    EXTRACTION_MODES,
+    RATE_LIMIT_PER_HOUR,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_DB_DIR,
+    RATE_LIMIT_DB_ENV,
+    RATE_LIMIT_DB_FILE,
+    DOCUMENT_TYPES,
+    DEFAULT_DOCUMENT_TYPES,
+    CACHE_MAX_AGE,
+    DOCUMENT_CACHE_MAX_AGE
+)
 from handelsregister_core import HandelsRegisterSelenium, SELENIUM_AVAILABLE
+from batch import run_batch
 from html_parser import pr_company_info, output_companies_json
+from result_store import ResultStore
+
+
+def document_types(value):
+    """Parse a comma-separated list of document types such as ``AD,CD,SI``."""
+    selected = [doc_type.strip().upper() for doc_type in value.split(",") if doc_type.strip()]
+    unknown = [doc_type for doc_type in selected if doc_type not in DOCUMENT_TYPES]
+    if not selected:
+        raise argparse.ArgumentTypeError("no document type given")
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"unknown document type(s) {', '.join(unknown)}; choose from {','.join(DOCUMENT_TYPES)}")
+    return selected
+
+
+def duration(value):
+    """Parse a duration in seconds, optionally with an s/m/h/d unit (``90m``, ``7d``)."""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    value = value.strip().lower()
+    factor = units.get(value[-1:], None)
+    try:
+        seconds = float(value[:-1] if factor else value) * (factor or 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid duration {value!r}; use e.g. 3600, 90m, 12h or 7d")
+    if seconds < 0:
+        raise argparse.ArgumentTypeError("duration must not be negative")
+    return seconds
 
 
 def parse_args():
@@ -26,11 +69,42 @@ def parse_args():
         action="store_true"
     )
     parser.add_argument(
+        "--max-age",
+        help="Treat cached results older than this as stale (seconds, or with unit: 90m, 12h, 7d)",
+        type=duration,
+        default=CACHE_MAX_AGE
+    )
+    query = parser.add_mutually_exclusive_group(required=True)
+    query.add_argument(
         "-s", "--schlagwoerter",
         help="Search for the provided keywords",
-        required=True,
         default="European EPC Competence Center"
     )
+    query.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="Run every query in FILE (one per line, or CSV) in one browser session and "
+             "stream companies as JSON lines"
+    )
+    query.add_argument(
+        "--register",
+        metavar="REF",
+        help="Look up a register number such as 'HRB 44343' in the local result store (no portal request)"
+    )
+    parser.add_argument(
+        "--court",
+        help="With --register: only companies whose register court contains this text"
+    )
+    parser.add_argument(
+        "--journal",
+        metavar="FILE",
+        help="Batch journal used to resume a --batch run (default: derived from the batch file in cache/batches/)"
+    )
+    parser.add_argument(
+        "--retry-failed",
+        help="With --batch: only re-run queries that failed in a previous run",
+        action="store_true"
+    )
     parser.add_argument(
         "-so", "--schlagwortOptionen",
         help="Keyword options: all=contain all keywords; min=contain at least one keyword; exact=contain the exact company name.",
@@ -42,6 +116,85 @@ def parse_args():
         help="Download and extract information from company PDF documents",
         action="store_true"
     )
+    parser.add_argument(
+        "--documents",
+        help=f"With -pd: comma-separated document types to fetch ({','.join(DOCUMENT_TYPES)}; default: SI, falling back to AD)",
+        type=document_types,
+        default=DEFAULT_DOCUMENT_TYPES
+    )
+    parser.add_argument(
+        "--documents-max-age",
+        help="With -pd: refetch a company's documents older than this (seconds, or with unit: 12h, 7d; "
+             "default: 30d)",
+        type=duration,
+        default=DOCUMENT_CACHE_MAX_AGE
+    )
+    parser.add_argument(
+        "--max-results",
+        help="Stop after this many companies (results are fetched page by page)",
+        type=int,
+        default=None
+    )
+    parser.add_argument(
+        "--backend",
+        help="Search backend: selenium=drive Chrome; http=replay the JSF form posts without a browser",
+        choices=SEARCH_BACKENDS,
+        default="selenium"
+    )
+    parser.add_argument(
+        "--parser",
+        help="Results page parser: lxml=XPath over lxml (fast); bs4=BeautifulSoup html.parser; "
+             "auto=lxml when installed",
+        choices=PARSER_BACKENDS,
+        default="auto"
+    )
+    parser.add_argument(
+        "--extract",
+        help="With the selenium backend: html=parse the page source in Python; "
+             "js=collect the result rows in the browser with one script call (HTML is kept only with --debug)",
+        choices=EXTRACTION_MODES,
+        default="html"
+    )
+    parser.add_argument(
+        "--offline",
+        help="Never call webdriver-manager; use the cached or pinned chromedriver (CHROMEDRIVER_PATH)",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--lean",
+        help="Lean browsing: block images, and block fonts, stylesheets and analytics by URL pattern via CDP",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--metrics",
+        help="Print bytes transferred and load time per navigation step",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--rate-limit",
+        help="Sustained portal requests per hour, shared by all processes using the same ledger",
+        type=float,
+        default=RATE_LIMIT_PER_HOUR
+    )
+    parser.add_argument(
+        "--burst",
+        help="Portal requests allowed back to back before the rate limit applies",
+        type=int,
+        default=RATE_LIMIT_BURST
+    )
+    parser.add_argument(
+        "--rate-limit-db",
+        help=f"Rate limit ledger file (default: ${RATE_LIMIT_DB_ENV} or "
+             f"{RATE_LIMIT_DB_DIR}/{RATE_LIMIT_DB_FILE})",
+        default=None
+    )
+    parser.add_argument(
+        "--max-wait",
+        help="Upper bound in seconds for each page readiness wait",
+        type=float,
+        default=READINESS_TIMEOUT
+    )
 
     args = parser.parse_args()
 
@@ -51,16 +204,48 @@ def parse_args():
     return args
 
 
+def lookup_register(args):
+    """Answer a register lookup from the local result store."""
+    try:
+        with ResultStore() as store:
+            companies = store.lookup(register=args.register, court=args.court)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return False
+
+    if not companies:
+        print(f"No stored company matches {args.register}"
+              f"{f' at {args.court}' if args.court else ''}; search the portal with -s NAME first")
+        return False
+
+    print(f"Found {len(companies)} stored companies:")
+    if any(company.get('extracted_data') for company in companies):
+        print(output_companies_json(companies))
+    else:
+        for company in companies:
+            pr_company_info(company)
+            print("-" * 40)
+    return True
+
+
 def main():
     """Main application entry point."""
-    if not SELENIUM_AVAILABLE:
+    args = parse_args()
+
+    if args.register:
+        sys.exit(0 if lookup_register(args) else 1)
+
+    if args.backend == "selenium" and not SELENIUM_AVAILABLE:
         print("Error: Selenium is not installed.")
         print("Install with: pip install selenium")
         print("Also install chromedriver: https://chromedriver.chromium.org/")
         sys.exit(1)
 
     try:
-        args = parse_args()
+        if args.batch:
+            if not run_batch(args):
+                sys.exit(1)
+            return
 
         # Create and run handelsregister search
         h = HandelsRegisterSelenium(args)
@@ -85,7 +270,7 @@ def main():
 
     except Exception as e:
         print(f"Error: {e}")
-        if 'args' in locals() and args.debug:
+        if args.debug:
             import traceback
             traceback.print_exc()
         sys.exit(1)
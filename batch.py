@@ -0,0 +1,240 @@
+"""Batch search mode streaming companies as JSON lines."""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import pathlib
+import sys
+import time
+from contextlib import redirect_stdout
+
+from config import (
+    CACHE_DIR_NAME,
+    SCHLAGWORT_OPTIONEN,
+    BATCH_QUERY_COLUMNS,
+    BATCH_OPTION_COLUMNS,
+    BATCH_JOURNAL_DIR,
+    READINESS_TIMEOUT
+)
+from handelsregister_core import HandelsRegisterSelenium, SELENIUM_AVAILABLE
+from html_parser import company_to_json
+from rate_limiter import create_rate_limiter
+
+if SELENIUM_AVAILABLE:
+    from driver_pool import DriverPool
+
+
+def read_batch_queries(path, default_option="all"):
+    """Yield ``(query, option)`` pairs from a text file or a CSV file.
+
+    Text files contain one query per line; blank lines and lines starting
+    with ``#`` are skipped. CSV files use a ``schlagwoerter``/``query``/``name``
+    column (or the first column) and an optional ``schlagwortOptionen``/``option``
+    column (or the second column).
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if str(path).lower().endswith(".csv"):
+            yield from _read_csv_queries(f, default_option)
+            return
+
+        for line in f:
+            query = line.strip()
+            if query and not query.startswith("#"):
+                yield query, default_option
+
+
+def _read_csv_queries(f, default_option):
+    """Yield queries from CSV rows, with or without a header."""
+    rows = csv.reader(f)
+    header = next(rows, None)
+    if header is None:
+        return
+
+    columns = [column.strip() for column in header]
+    query_index = _column_index(columns, BATCH_QUERY_COLUMNS)
+    option_index = _column_index(columns, BATCH_OPTION_COLUMNS)
+    if query_index is None:
+        # No recognised header: the first row is data
+        query_index, option_index = 0, 1
+        rows = _prepend(header, rows)
+
+    for row in rows:
+        if len(row) <= query_index or not row[query_index].strip():
+            continue
+        option = row[option_index].strip() if option_index is not None and len(row) > option_index else ""
+        yield row[query_index].strip(), option if option in SCHLAGWORT_OPTIONEN else default_option
+
+
+def _column_index(columns, names):
+    for name in names:
+        if name in columns:
+            return columns.index(name)
+    return None
+
+
+def _prepend(row, rows):
+    yield row
+    yield from rows
+
+
+class BatchJournal:
+    """Durable append-only journal of completed and failed batch queries.
+
+    Each finished query appends one fsynced JSON line, so a crash loses at
+    most the query in progress. Queries without an entry are pending. The
+    latest entry for a query wins, which lets failed queries be retried.
+    """
+
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.status = {}
+        self._torn_tail = False
+        self._load()
+
+    @classmethod
+    def for_batch_file(cls, batch_file):
+        """Return the journal kept in the cache directory for a batch file."""
+        digest = hashlib.sha256(str(pathlib.Path(batch_file).resolve()).encode("utf-8")).hexdigest()[:16]
+        name = f"{pathlib.Path(batch_file).stem}-{digest}.jsonl"
+        return cls(pathlib.Path(CACHE_DIR_NAME) / BATCH_JOURNAL_DIR / name)
+
+    def record(self, query, option, status, error=None):
+        """Append an entry and flush it to disk."""
+        entry = {'query': query, 'schlagwortOptionen': option, 'status': status, 'time': time.time()}
+        if error:
+            entry['error'] = error
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            if self._torn_tail:
+                f.write("\n")
+                self._torn_tail = False
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.status[(query, option)] = status
+
+    def select(self, queries, retry_failed=False):
+        """Filter queries down to the pending ones, or only the failed ones."""
+        for query, option in queries:
+            status = self.status.get((query, option))
+            if retry_failed:
+                if status == self.FAILED:
+                    yield query, option
+            elif status is None:
+                yield query, option
+
+    def summary(self, queries):
+        """Count done, failed and pending queries."""
+        counts = {self.DONE: 0, self.FAILED: 0, 'pending': 0}
+        for key in queries:
+            counts[self.status.get(key, 'pending')] += 1
+        return counts
+
+    def _load(self):
+        """Replay the journal; a torn last line from a crash is ignored."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    self._torn_tail = not line.endswith("\n")
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.status[(entry['query'], entry['schlagwortOptionen'])] = entry['status']
+        except OSError:
+            pass
+
+
+class BatchRunner:
+    """Runs many queries through a single driver session.
+
+    Every company is written as one JSON line and flushed as soon as its
+    results page has been parsed, so consumers can start before a long
+    query, let alone the batch, ends. A query that fails after some pages
+    leaves those companies in the stream, followed by its error line.
+    Status messages from the search go to stderr to keep the stream clean.
+    """
+
+    def __init__(self, args, out=None, journal=None):
+        self.args = args
+        self.out = out or sys.stdout
+        self.journal = journal
+        self.pool = None
+
+    def run(self, queries):
+        """Run all queries and return ``(succeeded, failed)`` counts."""
+        succeeded = failed = 0
+        if getattr(self.args, 'backend', 'selenium') == "selenium":
+            self.pool = DriverPool(
+                size=1,
+                max_uses=None,
+                debug=self.args.debug,
+                offline=getattr(self.args, 'offline', False),
+                max_wait=getattr(self.args, 'max_wait', READINESS_TIMEOUT),
+                lean=getattr(self.args, 'lean', False),
+                rate_limiter=create_rate_limiter(self.args)
+            )
+
+        try:
+            for query, option in queries:
+                if self.run_query(query, option):
+                    succeeded += 1
+                else:
+                    failed += 1
+        finally:
+            if self.pool is not None:
+                self.pool.close()
+
+        return succeeded, failed
+
+    def run_query(self, query, option):
+        """Search a single query and stream its companies. Returns success."""
+        query_args = argparse.Namespace(**vars(self.args))
+        query_args.schlagwoerter = query
+        query_args.schlagwortOptionen = option
+
+        def on_companies(companies):
+            for company in companies:
+                if company is None:
+                    continue
+                record = {'query': query, 'schlagwortOptionen': option}
+                record.update(company_to_json(company))
+                self._emit(record)
+
+        try:
+            with redirect_stdout(sys.stderr):
+                HandelsRegisterSelenium(query_args, pool=self.pool).search_company(on_companies)
+        except Exception as e:
+            self._emit({'query': query, 'schlagwortOptionen': option, 'error': str(e)})
+            if self.journal is not None:
+                self.journal.record(query, option, BatchJournal.FAILED, str(e))
+            return False
+
+        if self.journal is not None:
+            self.journal.record(query, option, BatchJournal.DONE)
+        return True
+
+    def _emit(self, record):
+        self.out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.out.flush()
+
+
+def run_batch(args, out=None):
+    """Run the batch file given by ``args.batch``, resuming from its journal."""
+    queries = list(read_batch_queries(args.batch, args.schlagwortOptionen))
+    journal_path = getattr(args, 'journal', None)
+    journal = BatchJournal(journal_path) if journal_path else BatchJournal.for_batch_file(args.batch)
+
+    counts = journal.summary(queries)
+    print(f"Batch journal {journal.path}: {counts['done']} done, {counts['failed']} failed, "
+          f"{counts['pending']} pending", file=sys.stderr)
+
+    selected = journal.select(queries, retry_failed=getattr(args, 'retry_failed', False))
+    succeeded, failed = BatchRunner(args, out, journal).run(selected)
+    print(f"Batch finished: {succeeded} queries succeeded, {failed} failed", file=sys.stderr)
+    return failed == 0
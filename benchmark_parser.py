@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark the results page parser on synthetic rows with long histories.
+
+Each row is built like a portal result (outer cell wrapping nested
+panelgrid tables, seven document links, one nested table per history
+entry). The single-pass row walker is timed against the previous
+approach, which joined the text of every ``td`` including the outer
+cells that repeat their nested cells, and whole pages are timed with
+both parser backends.
+
+Usage: python benchmark_parser.py [--rows 20] [--history 50 100 200] [--repeat 5]
+"""
+
+import argparse
+import time
+
+from bs4 import BeautifulSoup
+
+from html_parser import (
+    LXML_AVAILABLE,
+    _build_company,
+    _iter_rows_bs4,
+    get_companies_in_searchresults,
+    parse_result
+)
+
+DOCUMENT_TYPES = ["AD", "CD", "HD", "DK", "UT", "VÖ", "SI"]
+
+
+def synthetic_row(index, history):
+    """One ``tr[data-ri]`` result row with ``history`` history entries."""
+    links = "".join(
+        f'<a id="f:t:{index}:l:{i}:fade" href="#" class="dokumentList">'
+        f'<span id="f:t:{index}:l:{i}:popupLink" class="underlinedText">{doc_type}</span></a>'
+        for i, doc_type in enumerate(DOCUMENT_TYPES))
+    entries = "".join(
+        f'<table class="ui-panelgrid" role="grid"><tbody><tr role="row">'
+        f'<td role="gridcell">{i + 1}.) Firma {index} Name {i}</td>'
+        f'<td role="gridcell">{i + 1}.) Ort {i}</td><td role="gridcell"></td></tr></tbody></table>'
+        for i in range(history))
+    return (
+        f'<tr data-ri="{index}" role="row"><td role="gridcell" colspan="9">'
+        f'<table class="ui-panelgrid" role="grid"><tbody>'
+        f'<tr role="row"><td colspan="5">Berlin '
+        f'<span> District court Berlin (Charlottenburg) HRB {10000 + index} </span></td></tr>'
+        f'<tr role="row"><td colspan="5"><span>Firma {index} GmbH</span></td><td><span>Berlin</span></td>'
+        f'<td><span>currently registered</span></td><td colspan="2"><div class="linksPanel">{links}</div></td></tr>'
+        f'<tr role="row"><td colspan="7"><table class="ui-panelgrid" role="grid"><tbody>'
+        f'<tr role="row"><td>History</td></tr></tbody></table>{entries}</td></tr>'
+        f'</tbody></table></td></tr>')
+
+
+def synthetic_page(rows, history):
+    """A results page with ``rows`` rows of ``history`` history entries each."""
+    body = "".join(synthetic_row(index, history) for index in range(rows))
+    return f'<html><body><form><table role="grid"><tbody>{body}</tbody></table></form></body></html>'
+
+
+def previous_rows(rows):
+    """The former row parser: ``.text`` of every ``td``, then a second search for the links."""
+    companies = []
+    for row in rows:
+        cells = [cell.text.strip() for cell in row.find_all('td')]
+        links = []
+        for link in row.find_all('a', class_='dokumentList'):
+            span = link.find('span')
+            links.append({'id': link.get('id'), 'type': span.text.strip() if span else 'Unknown',
+                          'onclick': link.get('onclick', '')})
+        companies.append(_build_company(cells, links))
+    return companies
+
+
+def walker_rows(rows):
+    return [parse_result(row) for row in rows]
+
+
+def best_of(repeat, function, *args):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the results page parser")
+    parser.add_argument("--rows", type=int, default=20, help="Result rows per page")
+    parser.add_argument("--history", type=int, nargs="+", default=[50, 100, 200],
+                        help="History entries per row (one run each)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    # Row parsing is timed on a prebuilt tree; whole pages include building it
+    columns = ["rows previous", "rows walker", "page bs4"] + (["page lxml"] if LXML_AVAILABLE else [])
+    print(f"{'history':>8} {'page':>10}  " + "  ".join(f"{name:>14}" for name in columns))
+    for history in args.history:
+        html = synthetic_page(args.rows, history)
+        grid = BeautifulSoup(html, 'html.parser').find('table', role='grid')
+        rows = list(_iter_rows_bs4(grid))
+
+        expected = previous_rows(rows)
+        if walker_rows(rows) != expected or any(
+                get_companies_in_searchresults(html, backend=backend) != expected
+                for backend in ['bs4'] + (['lxml'] if LXML_AVAILABLE else [])):
+            raise RuntimeError("The row walker returned different records than the previous parser")
+
+        timings = [best_of(args.repeat, previous_rows, rows), best_of(args.repeat, walker_rows, rows),
+                   best_of(args.repeat, get_companies_in_searchresults, html, 'bs4')]
+        if LXML_AVAILABLE:
+            timings.append(best_of(args.repeat, get_companies_in_searchresults, html, 'lxml'))
+        print(f"{history:>8} {len(html):>10}  " + "  ".join(f"{seconds * 1000:>12.1f}ms" for seconds in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""Helpers shared by the on-disk caches."""
+
+import json
+import os
+import pathlib
+import tempfile
+
+
+def atomic_write(path, data):
+    """Write ``data`` (str or bytes) to ``path`` so readers never see a partial file.
+
+    The data goes to a uniquely named temporary file in the same directory,
+    which then replaces the target in one step. Concurrent writers each use
+    their own temporary file; the last replace wins.
+    """
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.remove(tmp_name)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path, value):
+    """Atomically write ``value`` as indented JSON."""
+    atomic_write(path, json.dumps(value, indent=2, ensure_ascii=False))
@@ -10,6 +10,27 @@ SCHLAGWORT_OPTIONEN = {
     "exact": 3
 }
 
+# Plain HTTP backend settings
+HTTP_TIMEOUT = 30
+HTTP_POOL_CONNECTIONS = 4
+HTTP_POOL_MAXSIZE = 8
+HTTP_MAX_RETRIES = 2
+JSF_VIEW_STATE_FIELD = "javax.faces.ViewState"
+HTTP_SEARCH_FIELD_PATTERN = r"schlagwoerter$"
+HTTP_SEARCH_OPTION_PATTERN = r"schlagwortOptionen"
+HTTP_PAGE_SIZE_PATTERN = r"ergebnisseProSeite"
+# Headers of a JSF partial (AJAX) request, as sent by PrimeFaces
+JSF_PARTIAL_REQUEST_HEADERS = {"Faces-Request": "partial/ajax", "X-Requested-With": "XMLHttpRequest"}
+
+# Available search backends
+SEARCH_BACKENDS = ["selenium", "http"]
+
+# Results page parsers: auto=lxml when installed, else BeautifulSoup's html.parser
+PARSER_BACKENDS = ["auto", "lxml", "bs4"]
+# How the selenium backend reads result pages: html=page source parsed in Python;
+# js=rows collected in the browser (RESULT_ROWS_SCRIPT)
+EXTRACTION_MODES = ["html", "js"]
+
 # Chrome WebDriver options for better automation
 CHROME_AUTOMATION_OPTIONS = [
     "--no-sandbox",
@@ -28,22 +49,162 @@ USER_AGENT = (
     "AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15.5 Safari/605.1.15"
 )
 
+# Chromedriver resolution
+CHROMEDRIVER_CACHE_FILE = "chromedriver.json"
+CHROMEDRIVER_PATH_ENV = "CHROMEDRIVER_PATH"
+CHROME_BINARY_CANDIDATES = [
+    "google-chrome",
+    "google-chrome-stable",
+    "chromium",
+    "chromium-browser",
+    "chrome"
+]
+# Standard install locations, for Chrome installs that are not on PATH (macOS, Windows);
+# environment variables are expanded
+CHROME_INSTALL_LOCATIONS = [
+    "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+    "/Applications/Chromium.app/Contents/MacOS/Chromium",
+    r"%ProgramFiles%\Google\Chrome\Application\chrome.exe",
+    r"%ProgramFiles(x86)%\Google\Chrome\Application\chrome.exe",
+    r"%LocalAppData%\Google\Chrome\Application\chrome.exe"
+]
+
 # Download preferences for Chrome
 DOWNLOAD_PREFS = {
     "download.prompt_for_download": False,
     "download.directory_upgrade": True,
     "safebrowsing.enabled": False,
-    "plugins.always_open_pdf_externally": True
+    # Let PDFs open in the built-in viewer: Chrome keeps the body of a rendered
+    # response for Network.getResponseBody, but not of one handed to the
+    # download manager. Attachments (e.g. SI XML) are still downloaded.
+    "plugins.always_open_pdf_externally": False
+}
+
+# Lean browsing: content settings and CDP URL patterns for assets the JSF flow does not need.
+# Chrome only has a content setting for images; stylesheets, fonts and analytics
+# are blocked by the URL patterns alone.
+LEAN_CONTENT_SETTINGS = {
+    "profile.managed_default_content_settings.images": 2
 }
 
+LEAN_BLOCKED_URL_PATTERNS = [
+    "*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.svg*", "*.ico*", "*.webp*",
+    "*.woff*", "*.ttf*", "*.otf*", "*.eot*",
+    "*.css*",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*matomo*", "*piwik*", "*etracker*"
+]
+
+# Returns the navigation duration of the current document in milliseconds
+NAVIGATION_DURATION_SCRIPT = (
+    "var nav = performance.getEntriesByType('navigation')[0];"
+    "return nav ? nav.duration : null;"
+)
+
 # Timeout constants
 DEFAULT_WAIT_TIMEOUT = 10
 EXTENDED_WAIT_TIMEOUT = 15
 DOWNLOAD_WAIT_TIMEOUT = 15
 
+# Each driver downloads into its own temporary directory with this prefix
+DOWNLOAD_DIR_PREFIX = "handelsregister-downloads-"
+# Chrome's in-progress download suffixes
+PARTIAL_DOWNLOAD_SUFFIXES = (".crdownload", ".tmp")
+
+# Responses with these MIME types are captured from the CDP network events
+DOCUMENT_MIME_TYPES = ("application/pdf", "application/xml", "text/xml")
+# Most recent document responses kept for capture; older ones are dropped
+DOCUMENT_RESPONSE_LIMIT = 32
+# Document types offered per company and the ones fetched by default
+# (SI, with the AD PDF fetched only when SI is not offered or yields no data)
+DOCUMENT_TYPES = ["AD", "CD", "HD", "DK", "UT", "VÖ", "SI"]
+DEFAULT_DOCUMENT_TYPES = ["SI"]
+# SI is structured XML; every other document type is a PDF
+DOCUMENT_FILE_SUFFIXES = {"SI": ".xml"}
+# Document types parsed into extracted_data, most preferred first
+EXTRACTION_DOCUMENT_TYPES = ["SI", "AD"]
+# Concurrent direct fetches per company (each still takes a rate limit token)
+DOCUMENT_FETCH_WORKERS = 3
+# Streamed PDF downloads are read and hashed in chunks of this size
+PDF_CHUNK_SIZE = 64 * 1024
+
+# Page readiness settings (upper bound and polling for event-driven waits)
+READINESS_TIMEOUT = 15
+READINESS_POLL_INTERVAL = 0.1
+NETWORK_IDLE_WINDOW = 0.5
+
+# Chrome performance log (CDP network events) used for network idle detection
+CHROME_LOGGING_PREFS = {"performance": "ALL"}
+
+# True when neither jQuery nor the PrimeFaces AJAX queue has pending requests
+AJAX_IDLE_SCRIPT = (
+    "var jq = window.jQuery ? window.jQuery.active === 0 : true;"
+    "var pf = (window.PrimeFaces && PrimeFaces.ajax && PrimeFaces.ajax.Queue)"
+    " ? PrimeFaces.ajax.Queue.isEmpty() : true;"
+    "return jq && pf;"
+)
+
+# Elements signalling that the search results have been rendered
+RESULTS_READY_SELECTORS = [
+    "table[role='grid'] tr[data-ri]",
+    "table.results",
+    "div.search-results",
+    ".ui-datatable-empty-message",
+    ".ui-messages-error"
+]
+
+# Portal rate limit (token bucket shared by all processes using the same ledger)
+RATE_LIMIT_PER_HOUR = 60
+RATE_LIMIT_BURST = 5
+RATE_LIMIT_BUCKET = "handelsregister.de"
+RATE_LIMIT_DB_FILE = "rate_limit.sqlite"
+RATE_LIMIT_DB_DIR = "~/.cache/handelsregister"
+RATE_LIMIT_DB_ENV = "HANDELSREGISTER_RATE_LIMIT_DB"
+
+# Batch input columns (CSV header names, first match wins)
+BATCH_QUERY_COLUMNS = ["schlagwoerter", "query", "name"]
+BATCH_OPTION_COLUMNS = ["schlagwortOptionen", "option"]
+
+# Batch journals live in this subdirectory of the cache directory
+BATCH_JOURNAL_DIR = "batches"
+
+# PrimeFaces datatable paginator
+PAGINATOR_ROWS_PER_PAGE_SELECTOR = "select.ui-paginator-rpp-options"
+PAGINATOR_NEXT_SELECTOR = ".ui-paginator-next"
+PAGINATOR_DISABLED_CLASS = "ui-state-disabled"
+RESULT_ROW_SELECTOR = "table[role='grid'] tr[data-ri]"
+RESULT_DATATABLE_CLASS = "ui-datatable"
+# Total row count and page size in the DataTable widget script
+PAGINATOR_ROW_COUNT_PATTERN = r"rowCount\s*:\s*(\d+)"
+PAGINATOR_ROWS_PATTERN = r"\brows\s*:\s*(\d+)"
+
+# Cached result pages are joined with this marker
+RESULT_PAGE_SEPARATOR = "\n<!-- handelsregister:next-page -->\n"
+
+# Driver pool settings
+DRIVER_POOL_SIZE = 2
+DRIVER_POOL_MAX_USES = 25
+DRIVER_POOL_CHECKOUT_TIMEOUT = 120
+
 # Cache directory name
 CACHE_DIR_NAME = "cache"
 
+# Search results cache (cache/search/<sha256>.html + .json); entries never expire unless --max-age is given
+SEARCH_CACHE_DIR = "search"
+CACHE_MAX_AGE = None
+# Downloaded documents of a company are refetched after this many seconds (--documents-max-age)
+DOCUMENT_CACHE_MAX_AGE = 30 * 24 * 3600
+# Extracted document data by content hash (cache/extractions/<ab>/<sha256>.json)
+EXTRACTION_CACHE_DIR = "extractions"
+
+# SQLite store of every company seen (cache/results.sqlite), for lookups without the portal
+RESULT_STORE_FILE = "results.sqlite"
+# Court column of a result: "<court> <register type> <number>[ <suffix>]"
+REGISTER_NUMBER_PATTERN = r"^(?P<court>.*?)\s+(?P<type>HRA|HRB|GnR|PR|VR|GsR)\s+(?P<number>\d+(?:\s*[A-Z]{1,3})?)$"
+
+# Applied after case folding when normalizing search terms for the cache key
+QUERY_TRANSLITERATIONS = {"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"}
+
 # CSS selectors for form elements
 SEARCH_FIELD_SELECTORS = [
     "textarea[name='form:schlagwoerter']",
@@ -74,6 +235,62 @@ SUBMIT_BUTTON_SELECTORS = [
     "input[value*='search']"
 ]
 
+# Collects the result rows in the page with one call (--extract js). Walks every
+# tr[data-ri] once like html_parser._RowWalker and returns, per row, its text
+# fragments, the [start, end) fragment span of each cell and the dokumentList
+# links (id, span of the first inner span), or null without results
+RESULT_ROWS_SCRIPT = (
+    "var grid = document.querySelector(\"table[role='grid']\") || document.querySelector('table.results')"
+    "  || document.querySelector('div.search-results');"
+    "if (!grid) { return null; }"
+    "var rows = [];"
+    "function findRows(el) {"
+    "  for (var c = el.firstElementChild; c; c = c.nextElementSibling) {"
+    "    if (c.localName === 'tr' && c.hasAttribute('data-ri')) { rows.push(c); } else { findRows(c); }"
+    "  }"
+    "}"
+    "function extract(row) {"
+    "  var texts = [], cells = [], links = [];"
+    "  function walk(el, link) {"
+    "    for (var n = el.firstChild; n; n = n.nextSibling) {"
+    "      if (n.nodeType === 3 || n.nodeType === 4) { texts.push(n.data); continue; }"
+    "      if (n.nodeType !== 1) { continue; }"
+    "      var name = n.localName, span;"
+    "      if (name === 'script' || name === 'style') { continue; }"
+    "      if (name === 'td') {"
+    "        span = [texts.length, 0]; cells.push(span); walk(n, link); span[1] = texts.length;"
+    "      } else if (name === 'a' && n.classList.contains('dokumentList') && n.getAttribute('id')) {"
+    "        var found = {id: n.getAttribute('id'), type: null};"
+    "        links.push(found); walk(n, found);"
+    "      } else if (name === 'span' && link && link.type === null) {"
+    "        span = [texts.length, 0]; link.type = span; walk(n, null); span[1] = texts.length;"
+    "      } else { walk(n, link); }"
+    "    }"
+    "  }"
+    "  walk(row, null);"
+    "  return {ri: row.getAttribute('data-ri'), texts: texts, cells: cells, links: links};"
+    "}"
+    "findRows(grid);"
+    "return rows.map(extract);"
+)
+
+# Learned form selectors, persisted in the cache directory
+SELECTOR_CACHE_FILE = "selectors.json"
+
+# Resolves a list of selectors with one combined querySelectorAll call and
+# returns [index, element] for the highest-priority match (or null)
+COMBINED_SELECTOR_PROBE_SCRIPT = (
+    "var selectors = arguments[0], clickable = arguments[1];"
+    "var best = null, bestIndex = selectors.length;"
+    "document.querySelectorAll(selectors.join(', ')).forEach(function (el) {"
+    "  if (clickable && (el.offsetParent === null || el.disabled)) { return; }"
+    "  for (var i = 0; i < bestIndex; i++) {"
+    "    if (el.matches(selectors[i])) { best = el; bestIndex = i; break; }"
+    "  }"
+    "});"
+    "return best ? [bestIndex, best] : null;"
+)
+
 # Common field IDs to try
 COMMON_FIELD_IDS = [
     'form:schlagwoerter',
@@ -86,6 +303,9 @@ COMMON_FIELD_IDS = [
 # Link text variations for navigation
 ADVANCED_SEARCH_LINK_TEXT = ["Advanced search", "Erweiterte Suche"]
 
+# URL fragment identifying the advanced search page
+ADVANCED_SEARCH_PAGE = "erweitertesuche.xhtml"
+
 # PDF processing regex patterns
 REGEX_PATTERNS = {
     'hrb_number': r'HRB\s*(\d+)',
@@ -103,3 +323,40 @@ REGEX_PATTERNS = {
     'legal_form': r'Gesellschaft mit beschränkter Haftung\s*Gesellschaftsvertrag vom\s*(\d{2}\.\d{2}\.\d{4})',
     'last_entry_date': r'Tag der letzten Eintragung:\s*(\d{2}\.\d{2}\.\d{4})'
 }
+
+# Root element of an SI document: an XJustiz register message (nachricht.reg.*)
+SI_NAMESPACE = "http://www.xjustiz.de"
+SI_ROOT_ELEMENT_PREFIX = "nachricht.reg."
+
+# SI (structured register content, XJustiz XML) element paths, matched by local name.
+# Each pattern lists element names that must appear in order, ending at the element itself.
+SI_FIELD_PATHS = {
+    'register_type': [('registereintragung', 'registerart', 'code'), ('registerart',)],
+    'register_number': [('registereintragung', 'registernummer'), ('registernummer',),
+                        ('instanzdaten', 'aktenzeichen')],
+    'number_of_entries': [('anzahlEintragungen',), ('anzahlDerEintragungen',)],
+    'business_purpose': [('basisdatenRegister', 'gegenstand'), ('gegenstand',)],
+    'capital': [('stammkapital', 'zahl'), ('grundkapital', 'zahl'), ('kapital', 'zahl')],
+    'currency': [('stammkapital', 'waehrung', 'code'), ('grundkapital', 'waehrung', 'code'), ('waehrung',)],
+    'representation_rules': [('allgemeineVertretungsregelung', 'vertretungsbefugnisFreitext'),
+                             ('allgemeineVertretungsregelung', 'code')],
+    'legal_form': [('rechtstraeger', 'rechtsform', 'code'), ('rechtsform',)],
+    'founding_date': [('satzungsdatum', 'aktuellesSatzungsdatum'), ('gesellschaftsvertrag', 'datum')],
+    'last_entry_date': [('letzteEintragung',), ('datumLetzteEintragung',)]
+}
+SI_PARTICIPANT_PATHS = {
+    'role': [('rollenbezeichnung', 'code'), ('rollenbezeichnung',)],
+    'organisation': [('organisation', 'bezeichnung', 'bezeichnung.aktuell'), ('organisation', 'bezeichnung')],
+    'seat': [('sitz', 'ort')],
+    'street': [('anschrift', 'strasse')],
+    'house_number': [('anschrift', 'hausnummer')],
+    'zip': [('anschrift', 'postleitzahl')],
+    'city': [('anschrift', 'ort')],
+    'residence': [('anschrift', 'wohnort')],
+    'first_name': [('vollerName', 'vorname')],
+    'last_name': [('vollerName', 'nachname')],
+    'birth_date': [('geburt', 'geburtsdatum')]
+}
+SI_COMPANY_ROLES = ["Rechtsträger"]
+SI_MANAGEMENT_ROLES = ["Geschäftsführer", "Vorstand", "Persönlich haftender", "Inhaber", "Liquidator"]
+SI_PROKURA_ROLES = ["Prokurist"]
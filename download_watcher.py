@@ -0,0 +1,111 @@
+"""Completion detection for browser downloads in a per-job directory."""
+
+import ctypes
+import ctypes.util
+import os
+import pathlib
+import select
+import sys
+import time
+
+from config import DOWNLOAD_WAIT_TIMEOUT, READINESS_POLL_INTERVAL, PARTIAL_DOWNLOAD_SUFFIXES
+
+# inotify(7) event masks
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+
+# inotify is Linux only; elsewhere the directory is polled
+try:
+    if not sys.platform.startswith('linux'):
+        raise OSError("inotify requires Linux")
+    _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    _libc.inotify_init1.argtypes = [ctypes.c_int]
+    _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = os.O_CLOEXEC
+    INOTIFY_AVAILABLE = True
+except (OSError, AttributeError, TypeError):
+    INOTIFY_AVAILABLE = False
+
+
+class DownloadWatcher:
+    """Waits for a finished download to appear in a directory.
+
+    Chrome writes ``<name>.crdownload`` and renames it once the transfer is
+    complete, so a finished file is the first new file without a partial
+    suffix. The watch is armed on construction; create the watcher before
+    triggering the download. Uses inotify where available and falls back
+    to polling the directory.
+    """
+
+    def __init__(self, directory, suffix='.pdf', debug=False):
+        self.directory = pathlib.Path(directory)
+        self.suffix = suffix.lower()
+        self.debug = debug
+        self._existing = set(os.listdir(self.directory))
+        self._fd = self._start_inotify() if INOTIFY_AVAILABLE else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def wait(self, timeout=DOWNLOAD_WAIT_TIMEOUT):
+        """Return the path of the completed download, or None on timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            finished = self._finished_download()
+            if finished is not None:
+                return finished
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._debug_print(f"No download completed in {self.directory} within {timeout}s")
+                return None
+            if self._fd is not None:
+                self._wait_for_event(remaining)
+            else:
+                time.sleep(min(READINESS_POLL_INTERVAL, remaining))
+
+    def close(self):
+        """Release the inotify descriptor."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _finished_download(self):
+        """Return the first new, complete file with the expected suffix."""
+        for name in sorted(set(os.listdir(self.directory)) - self._existing):
+            lowered = name.lower()
+            if lowered.endswith(PARTIAL_DOWNLOAD_SUFFIXES) or not lowered.endswith(self.suffix):
+                continue
+            path = self.directory / name
+            if path.is_file():
+                self._debug_print(f"Download completed: {path}")
+                return path
+        return None
+
+    def _start_inotify(self):
+        """Watch the directory for renames and closed writes; None if that fails."""
+        fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        if _libc.inotify_add_watch(fd, os.fsencode(self.directory), IN_MOVED_TO | IN_CLOSE_WRITE) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def _wait_for_event(self, timeout):
+        """Block until the directory changes, then drain the queued events."""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if readable:
+            try:
+                # Events only signal a change; the directory is rescanned afterwards
+                os.read(self._fd, 4096)
+            except BlockingIOError:
+                pass
+
+    def _debug_print(self, message):
+        """Print debug message if debug mode is enabled."""
+        if self.debug:
+            print(message)
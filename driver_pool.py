@@ -0,0 +1,177 @@
+"""Pool of pre-started WebDriver sessions for repeated handelsregister searches."""
+
+import queue
+import threading
+
+from config import DRIVER_POOL_SIZE, DRIVER_POOL_MAX_USES, DRIVER_POOL_CHECKOUT_TIMEOUT
+from web_automation import WebAutomation
+
+
+class DriverPool:
+    """Keeps warm WebAutomation instances parked on the advanced search page.
+
+    Every pooled driver has already launched Chrome, loaded the homepage and
+    navigated to ``erweitertesuche.xhtml``, so a borrower can fill in the
+    search form right away. Drivers are health-checked on checkout and
+    recycled after ``max_uses`` searches (never if ``max_uses`` is None).
+    Extra keyword arguments are passed to ``WebAutomation``.
+    """
+
+    def __init__(self, size=DRIVER_POOL_SIZE, max_uses=DRIVER_POOL_MAX_USES, debug=False,
+                 automation_factory=None, **automation_options):
+        self.size = size
+        self.max_uses = max_uses
+        self.debug = debug
+        self._automation_factory = automation_factory or (
+            lambda: WebAutomation(debug=debug, **automation_options))
+        self._idle = queue.Queue()
+        self._uses = {}
+        self._lock = threading.Lock()
+        self._started = 0
+        self._closed = False
+
+    def start(self):
+        """Pre-start the pool's drivers."""
+        while self._reserve_slot():
+            self._idle.put(self._create())
+        return self
+
+    def checkout(self, timeout=DRIVER_POOL_CHECKOUT_TIMEOUT):
+        """Borrow a healthy driver that is ready on the advanced search page."""
+        if self._closed:
+            raise RuntimeError("Driver pool is closed")
+
+        while True:
+            try:
+                automation = self._idle.get_nowait()
+            except queue.Empty:
+                automation = self._create_or_wait(timeout)
+
+            if self._is_healthy(automation):
+                return automation
+
+            self._debug_print("Discarding unhealthy pooled driver")
+            self._discard(automation)
+
+    def checkin(self, automation, failed=False):
+        """Return a borrowed driver to the pool, recycling it if needed."""
+        with self._lock:
+            self._uses[id(automation)] = self._uses.get(id(automation), 0) + 1
+            uses = self._uses[id(automation)]
+
+        worn_out = self.max_uses is not None and uses >= self.max_uses
+        if self._closed or failed or worn_out:
+            self._debug_print(f"Recycling pooled driver after {uses} uses")
+            self._discard(automation)
+            return
+
+        self._idle.put(automation)
+
+    def borrow(self):
+        """Context manager that checks a driver out and back in."""
+        return _BorrowedDriver(self)
+
+    def close(self):
+        """Quit every idle driver and refuse further checkouts."""
+        self._closed = True
+        while True:
+            try:
+                automation = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(automation)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _create_or_wait(self, timeout):
+        """Start a new driver if below capacity, otherwise wait for a checkin."""
+        if self._reserve_slot():
+            return self._create()
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError(f"No pooled driver became available within {timeout}s")
+
+    def _reserve_slot(self):
+        """Claim a driver slot if the pool is below capacity.
+
+        The slot is taken under the lock before the slow driver start, so
+        concurrent checkouts cannot both see a free slot and overfill the pool.
+        """
+        with self._lock:
+            if self._started >= self.size:
+                return False
+            self._started += 1
+            return True
+
+    def _create(self):
+        """Start a driver in a reserved slot and position it on the advanced search page.
+
+        The slot is released again if the driver cannot be started.
+        """
+        try:
+            automation = self._automation_factory()
+        except Exception:
+            with self._lock:
+                self._started -= 1
+            raise
+        try:
+            automation.setup_driver()
+            self._warm_up(automation)
+        except Exception:
+            self._discard(automation)
+            raise
+        self._debug_print("Started pooled driver")
+        return automation
+
+    def _warm_up(self, automation):
+        """Navigate a driver from the homepage to the advanced search form."""
+        automation.open_startpage()
+        if not automation.navigate_to_advanced_search():
+            raise RuntimeError("Could not navigate to advanced search page")
+
+    def _is_healthy(self, automation):
+        """Check that the browser responds and sits on the advanced search page."""
+        try:
+            if automation.is_on_advanced_search():
+                return True
+            # The previous borrower left the results page open
+            self._warm_up(automation)
+            return automation.is_on_advanced_search()
+        except Exception as e:
+            self._debug_print(f"Pooled driver health check failed: {e}")
+            return False
+
+    def _discard(self, automation):
+        """Quit a driver and free its slot."""
+        with self._lock:
+            self._uses.pop(id(automation), None)
+            self._started -= 1
+        try:
+            automation.close_driver()
+        except Exception as e:
+            self._debug_print(f"Error closing pooled driver: {e}")
+
+    def _debug_print(self, message):
+        """Print debug message if debug mode is enabled."""
+        if self.debug:
+            print(message)
+
+
+class _BorrowedDriver:
+    """Context manager returned by DriverPool.borrow()."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.automation = None
+
+    def __enter__(self):
+        self.automation = self.pool.checkout()
+        return self.automation
+
+    def __exit__(self, exc_type, exc, tb):
+        self.pool.checkin(self.automation, failed=exc_type is not None)
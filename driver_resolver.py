@@ -0,0 +1,141 @@
+"""Chromedriver path resolution with a local cache keyed by the Chrome version."""
+
+import json
+import os
+import pathlib
+import re
+import shutil
+import subprocess
+
+from cache_utils import atomic_write_json
+from config import (
+    CACHE_DIR_NAME,
+    CHROME_BINARY_CANDIDATES,
+    CHROME_INSTALL_LOCATIONS,
+    CHROMEDRIVER_CACHE_FILE,
+    CHROMEDRIVER_PATH_ENV
+)
+
+
+CHROME_VERSION_PATTERN = re.compile(r'(\d+\.\d+\.\d+\.\d+)')
+
+
+def detect_chrome_version():
+    """Return the installed Chrome/Chromium version string, or None."""
+    for path in _chrome_binaries():
+        if path.lower().endswith(".exe"):
+            version = _installed_version(path)
+        else:
+            version = _reported_version(path)
+        if version:
+            return version
+    return None
+
+
+def _chrome_binaries():
+    """Yield Chrome binaries on PATH, then those at the standard install locations."""
+    for binary in CHROME_BINARY_CANDIDATES:
+        path = shutil.which(binary)
+        if path:
+            yield path
+    for location in CHROME_INSTALL_LOCATIONS:
+        path = os.path.expandvars(location)
+        if os.path.isfile(path):
+            yield path
+
+
+def _reported_version(path):
+    """Ask a Chrome binary for its version."""
+    try:
+        output = subprocess.run(
+            [path, "--version"], capture_output=True, text=True, timeout=10
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = CHROME_VERSION_PATTERN.search(output)
+    return match.group(1) if match else None
+
+
+def _installed_version(path):
+    """Read the version of a Windows install from its version directory.
+
+    chrome.exe ignores ``--version`` and opens a browser window instead,
+    but the installer keeps each version's files in a directory named after
+    it next to the executable.
+    """
+    try:
+        names = os.listdir(os.path.dirname(path))
+    except OSError:
+        return None
+    versions = [name for name in names if CHROME_VERSION_PATTERN.fullmatch(name)]
+    if not versions:
+        return None
+    return max(versions, key=lambda version: tuple(int(part) for part in version.split('.')))
+
+
+def pinned_chromedriver_path():
+    """Return the pinned chromedriver from the environment or PATH, if any."""
+    pinned = os.environ.get(CHROMEDRIVER_PATH_ENV)
+    if pinned and os.path.isfile(pinned):
+        return pinned
+    return shutil.which("chromedriver")
+
+
+class ChromedriverResolver:
+    """Resolves the chromedriver binary without hitting webdriver-manager on every run.
+
+    The resolved path is stored in ``cache/chromedriver.json`` under the
+    detected Chrome version. webdriver-manager is only consulted when the
+    browser version changed or the cached binary disappeared. In offline mode
+    it is never consulted and the pinned driver path is used instead.
+    """
+
+    def __init__(self, offline=False, cache_file=None, debug=False):
+        self.offline = offline
+        self.debug = debug
+        self.cache_file = pathlib.Path(
+            cache_file or pathlib.Path(CACHE_DIR_NAME) / CHROMEDRIVER_CACHE_FILE)
+
+    def resolve(self):
+        """Return a usable chromedriver path."""
+        version = detect_chrome_version()
+        cached = self._load_cache().get(version) if version else None
+        if cached and os.path.isfile(cached):
+            self._debug_print(f"Using cached chromedriver for Chrome {version}: {cached}")
+            return cached
+
+        if self.offline:
+            pinned = pinned_chromedriver_path()
+            if not pinned:
+                raise RuntimeError(
+                    f"Offline mode: no cached chromedriver for Chrome {version} and no pinned driver. "
+                    f"Set {CHROMEDRIVER_PATH_ENV} or put chromedriver on PATH."
+                )
+            self._debug_print(f"Offline mode, using pinned chromedriver: {pinned}")
+            return pinned
+
+        from webdriver_manager.chrome import ChromeDriverManager
+        path = ChromeDriverManager().install()
+        self._debug_print(f"webdriver-manager resolved chromedriver for Chrome {version}: {path}")
+        if version:
+            self._store(version, path)
+        return path
+
+    def _load_cache(self):
+        """Load the version -> path mapping."""
+        try:
+            with open(self.cache_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _store(self, version, path):
+        """Remember the driver path for a Chrome version."""
+        entries = self._load_cache()
+        entries[version] = path
+        atomic_write_json(self.cache_file, entries)
+
+    def _debug_print(self, message):
+        """Print debug message if debug mode is enabled."""
+        if self.debug:
+            print(message)
@@ -0,0 +1,41 @@
+"""Cache of document extraction results keyed by the document's content hash."""
+
+import json
+import pathlib
+
+from cache_utils import atomic_write_json
+from config import CACHE_DIR_NAME, EXTRACTION_CACHE_DIR
+
+
+class ExtractionCache:
+    """Extracted text and ``extracted_data`` per document SHA-256.
+
+    Each entry records the parser and parser version that produced the
+    data. A document seen before costs one hash computation. When only the
+    parser version changed, the cached text lets the parser run again
+    without re-reading the PDF.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = pathlib.Path(cache_dir or pathlib.Path(CACHE_DIR_NAME) / EXTRACTION_CACHE_DIR)
+
+    def get(self, sha256):
+        """Return the entry for a document hash, or None."""
+        try:
+            with open(self._entry_file(sha256), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, sha256, parser, parser_version, extracted_data, text=None):
+        """Store the extraction result of a document."""
+        atomic_write_json(self._entry_file(sha256), {
+            'parser': parser,
+            'parser_version': parser_version,
+            'text': text,
+            'extracted_data': extracted_data
+        })
+
+    def _entry_file(self, sha256):
+        # Two-level fan-out keeps directories small
+        return self.cache_dir / sha256[:2] / f"{sha256}.json"
@@ -4,11 +4,33 @@ Refactored handelsregister core module using extracted components.
 This module contains the main HandelsRegisterSelenium class.
 """
 
+import os
 import pathlib
 import time
 
-from config import CACHE_DIR_NAME
-from html_parser import get_companies_in_searchresults
+from config import (
+    CACHE_DIR_NAME,
+    CACHE_MAX_AGE,
+    DOCUMENT_CACHE_MAX_AGE,
+    DEFAULT_DOCUMENT_TYPES,
+    SEARCH_CACHE_DIR,
+    EXTRACTION_CACHE_DIR,
+    RESULT_STORE_FILE,
+    READINESS_TIMEOUT,
+    RESULT_PAGE_SEPARATOR
+)
+from html_parser import (
+    ResultMerger,
+    merge_result_pages,
+    get_companies_in_searchresults,
+    iter_extracted_rows,
+    resolve_parser_backend
+)
+from http_backend import JSFHttpClient
+from extraction_cache import ExtractionCache
+from rate_limiter import create_rate_limiter
+from result_store import ResultStore, company_key
+from search_cache import SearchCache
 
 try:
     from selenium import webdriver
@@ -31,90 +53,221 @@ except ImportError:
 class HandelsRegisterSelenium:
     """Main class for handelsregister search functionality."""
 
-    def __init__(self, args):
-        if not SELENIUM_AVAILABLE:
+    def __init__(self, args, pool=None):
+        self.backend = getattr(args, 'backend', 'selenium')
+
+        if self.backend == 'selenium' and not SELENIUM_AVAILABLE:
             raise ImportError(
                 "Selenium is required for this script. Install with: pip install selenium\n"
                 "You'll also need to install a browser driver (e.g., chromedriver)"
             )
 
+        if self.backend == 'http' and args.download_pdfs:
+            raise ValueError(
+                "PDF download requires the selenium backend (document links are triggered via JavaScript)"
+            )
+
         if args.download_pdfs and not PDF_AVAILABLE:
             raise ImportError(
                 "PyPDF2 is required for PDF processing. Install with: pip install PyPDF2"
             )
 
         self.args = args
+        self.pool = pool
+        self.parser_backend = resolve_parser_backend(getattr(args, 'parser', 'auto'))
+        self.rate_limiter = create_rate_limiter(args)
         self.web_automation = WebAutomation(
-            debug=args.debug) if SELENIUM_AVAILABLE else None
+            debug=args.debug,
+            offline=getattr(args, 'offline', False),
+            max_wait=getattr(args, 'max_wait', READINESS_TIMEOUT),
+            lean=getattr(args, 'lean', False),
+            rate_limiter=self.rate_limiter
+        ) if self.backend == 'selenium' and pool is None else None
+        self.http_client = JSFHttpClient(
+            debug=args.debug,
+            rate_limiter=self.rate_limiter
+        ) if self.backend == 'http' else None
         self.pdf_processor = None
 
         # Set up cache directory
         self.cachedir = pathlib.Path(CACHE_DIR_NAME)
         self.cachedir.mkdir(parents=True, exist_ok=True)
-
-    def search_company(self):
-        """Perform the company search using Selenium."""
-        cachename = self._get_cache_filename(self.args.schlagwoerter)
-
-        # Check cache first (unless force refresh or PDF download requested)
-        if not self.args.force and cachename.exists() and not self.args.download_pdfs:
-            return self._load_cached_results(cachename)
+        self.search_cache = SearchCache(self.cachedir / SEARCH_CACHE_DIR)
+
+    def search_company(self, on_companies=None):
+        """Perform the company search using Selenium.
+
+        ``on_companies`` is called with the new companies of each results
+        page as soon as that page is parsed and its documents processed, so
+        callers can stream them. Cached results arrive in one call.
+        """
+        # Check cache first (unless force refresh requested)
+        if not self.args.force:
+            cached = self.search_cache.get(
+                self.args.schlagwoerter, self._cache_options(),
+                max_age=getattr(self.args, 'max_age', CACHE_MAX_AGE))
+            if cached is not None:
+                companies = self._load_cached_results(cached)
+                if companies is not None:
+                    if self.args.download_pdfs:
+                        self._complete_cached_documents(cached['key'], companies)
+                    if on_companies is not None:
+                        on_companies(companies)
+                    return companies
+
+        if self.backend == 'http':
+            return self._perform_http_search(on_companies)
+
+        if self.pool is not None:
+            return self._search_with_pooled_driver(on_companies)
 
         try:
-            # Perform web search
-            companies = self._perform_web_search(cachename)
-
-            # Download PDFs if requested
-            if self.args.download_pdfs and companies:
-                companies = self._process_pdf_documents(companies)
-
-            return companies
+            # Perform web search (downloads PDFs page by page if requested)
+            return self._perform_web_search(on_companies)
 
         finally:
             # Always clean up
             self.web_automation.close_driver()
 
-    def _get_cache_filename(self, search_term):
-        """Generate cache filename for search term."""
-        return self.cachedir / f"{search_term}_selenium"
+    def _search_with_pooled_driver(self, on_companies=None):
+        """Run the search on a warm driver borrowed from the pool."""
+        with self.pool.borrow() as web_automation:
+            self.web_automation = web_automation
+            try:
+                return self._perform_web_search(on_companies)
+            finally:
+                self.web_automation = None
+
+    def _cache_options(self):
+        """Options that change the results and therefore belong to the cache key."""
+        return {
+            'schlagwortOptionen': self.args.schlagwortOptionen,
+            'max_results': getattr(self.args, 'max_results', None),
+            'backend': self.backend
+        }
+
+    def _load_cached_results(self, metadata):
+        """Load the parsed companies of a cache entry (None if the entry vanished)."""
+        companies = self.search_cache.load_companies(metadata['key'], self._parse_results_html)
+        if companies is not None:
+            age = time.time() - metadata['fetched_at']
+            print(f"Return cached content for {self.args.schlagwoerter} (fetched {age:.0f}s ago)")
+        return companies
+
+    def _parse_results_html(self, html):
+        """Parse cached results pages into companies."""
+        return merge_result_pages(
+            html.split(RESULT_PAGE_SEPARATOR), getattr(self.args, 'max_results', None), self.parser_backend)
 
-    def _load_cached_results(self, cachename):
-        """Load results from cache."""
-        with open(cachename, "r") as f:
-            html = f.read()
-            print(f"Return cached content for {self.args.schlagwoerter}")
-            return get_companies_in_searchresults(html)
+    def _store_results(self, html, companies, response_seconds):
+        """Cache the results HTML of a fresh search and record its companies in the result store."""
+        self.search_cache.put(
+            self.args.schlagwoerter, self._cache_options(), html,
+            companies=companies, response_seconds=response_seconds)
+        with ResultStore(self.cachedir / RESULT_STORE_FILE) as store:
+            store.store(companies, query=self.args.schlagwoerter)
 
-    def _perform_web_search(self, cachename):
+    def _perform_web_search(self, on_companies=None):
         """Perform the actual web search and return results."""
-        # Set up the browser
-        self.web_automation.setup_driver()
+        # Pooled drivers are already waiting on the advanced search page
+        if self.pool is None:
+            # Set up the browser
+            self.web_automation.setup_driver()
 
-        # Navigate to homepage
-        self.web_automation.open_startpage()
+            # Navigate to homepage
+            self.web_automation.open_startpage()
 
-        # Navigate to advanced search
-        if not self.web_automation.navigate_to_advanced_search():
-            raise RuntimeError("Could not navigate to advanced search page")
+            # Navigate to advanced search
+            if not self.web_automation.navigate_to_advanced_search():
+                raise RuntimeError("Could not navigate to advanced search page")
 
-        # Fill and submit search form
-        if not self._execute_search():
-            raise RuntimeError("Could not complete search")
+        started = time.perf_counter()
+        with self.web_automation.measure_step('search'):
+            # Fill and submit search form
+            if not self._execute_search():
+                raise RuntimeError("Could not complete search")
 
-        # Wait for results page to load
-        time.sleep(3)
+            # Wait for results page to load
+            self.web_automation.wait_for_results()
+        response_seconds = time.perf_counter() - started
 
         if self.args.debug:
             print(f"Results page loaded: {self.web_automation.driver.title}")
             print(f"Results URL: {self.web_automation.driver.current_url}")
 
-        # Get and cache results
-        html = self.web_automation.driver.page_source
-        with open(cachename, "w") as f:
-            f.write(html)
+        merger = ResultMerger(getattr(self.args, 'max_results', None), self.parser_backend)
+        extract_in_browser = getattr(self.args, 'extract', 'html') == 'js'
+        debug_pages = []
+
+        def read_page():
+            if not extract_in_browser:
+                return self.web_automation.driver.page_source
+            # The page HTML is only kept for debugging; the cache stores the records
+            if self.args.debug:
+                debug_pages.append(self.web_automation.driver.page_source)
+            return self.web_automation.extract_result_rows()
+
+        def on_page(page):
+            new_companies = merger.add_rows(page) if extract_in_browser else merger.add_page(page)
+            # Document links can only be clicked while their page is shown
+            if self.args.download_pdfs and new_companies:
+                stale = new_companies if self.args.force else self._reuse_stored_documents(new_companies)
+                if stale:
+                    self._process_pdf_documents(stale)
+            if on_companies is not None and new_companies:
+                on_companies(new_companies)
+            return not merger.full
+
+        # Walk all result pages and cache them
+        pages = self.web_automation.collect_result_pages(on_page, read_page)
+        html = RESULT_PAGE_SEPARATOR.join(debug_pages if extract_in_browser else pages) or None
+        self._store_results(html, merger.companies, response_seconds)
+
+        if self.args.debug:
+            print(f"Total readiness wait: {self.web_automation.readiness.total_wait():.2f}s")
+
+        if getattr(self.args, 'metrics', False):
+            self._print_step_metrics()
+
+        return merger.companies
+
+    def _perform_http_search(self, on_companies=None):
+        """Perform the search over plain HTTP without a browser."""
+        merger = ResultMerger(getattr(self.args, 'max_results', None), self.parser_backend)
+        started = time.perf_counter()
+        response_seconds = []
+
+        def on_page(page):
+            if not response_seconds:
+                response_seconds.append(time.perf_counter() - started)
+            new_companies = merger.add_page(page)
+            if on_companies is not None and new_companies:
+                on_companies(new_companies)
+            return not merger.full
+
+        pages = self.http_client.search(
+            self.args.schlagwoerter,
+            self.args.schlagwortOptionen,
+            on_page
+        )
 
-        # Parse companies from results
-        return get_companies_in_searchresults(html)
+        if self.args.debug:
+            print(f"Results URL: {self.http_client.current_url}")
+
+        self._store_results(RESULT_PAGE_SEPARATOR.join(pages), merger.companies, response_seconds[0])
+        return merger.companies
+
+    def _print_step_metrics(self):
+        """Print bytes transferred and load time for each navigation step."""
+        mode = "lean" if self.web_automation.lean else "full"
+        print(f"Step metrics ({mode} browsing):")
+        for metrics in self.web_automation.step_metrics:
+            page_load = metrics['page_load_ms']
+            page_load = f"{page_load:.0f}ms" if page_load is not None else "-"
+            print(f"  {metrics['step']:<16} {metrics['bytes']:>10} bytes  {metrics['requests']:>4} requests  "
+                  f"{metrics['blocked']:>4} blocked  {metrics['seconds']:6.2f}s  page load {page_load}")
+        limiter = self.web_automation.rate_limiter
+        print(f"Rate limiter: {limiter.calls} portal calls, waited {limiter.total_wait:.1f}s")
 
     def _execute_search(self):
         """Execute the search form filling and submission."""
@@ -128,6 +281,117 @@ class HandelsRegisterSelenium:
         # Submit the form
         return self.web_automation.submit_search_form()
 
+    def _complete_cached_documents(self, key, companies):
+        """Fetch documents for the cached companies that lack fresh ones.
+
+        Only those companies are looked up in the browser, each with an
+        exact-name search, instead of repeating the whole search. The cache
+        entry and the result store are updated with the new documents.
+        """
+        stale = self._reuse_stored_documents(companies)
+        if not stale:
+            print(f"Documents of all {len(companies)} companies are cached")
+        else:
+            print(f"Documents missing or stale for {len(stale)} of {len(companies)} companies")
+            if self.pool is not None:
+                with self.pool.borrow() as web_automation:
+                    self.web_automation = web_automation
+                    try:
+                        self._fetch_company_documents(stale)
+                    finally:
+                        self.web_automation = None
+            else:
+                try:
+                    self.web_automation.setup_driver()
+                    self.web_automation.open_startpage()
+                    self._fetch_company_documents(stale)
+                finally:
+                    self.web_automation.close_driver()
+
+        self.search_cache.store_companies(key, companies)
+        with ResultStore(self.cachedir / RESULT_STORE_FILE) as store:
+            store.store(companies, query=self.args.schlagwoerter)
+
+    def _reuse_stored_documents(self, companies):
+        """Fill in fresh documents from the result store; return the companies still lacking them."""
+        stale = []
+        with ResultStore(self.cachedir / RESULT_STORE_FILE) as store:
+            for company in companies:
+                if not self._documents_fresh(company):
+                    company.update(store.load_documents(company))
+                if not self._documents_fresh(company):
+                    stale.append(company)
+        return stale
+
+    def _documents_fresh(self, company):
+        """Check that every selected document type the company offers was fetched within the TTL.
+
+        A type recorded as ``unavailable`` counts as fetched: the attempt is
+        not repeated before the TTL runs out. When SI is selected but not
+        offered or unavailable, the AD fallback must be fresh as well.
+        """
+        document_types = getattr(self.args, 'documents', None) or DEFAULT_DOCUMENT_TYPES
+        max_age = getattr(self.args, 'documents_max_age', DOCUMENT_CACHE_MAX_AGE)
+        offered = {link['type'] for link in company.get('document_links', [])}
+        document_files = company.get('document_files') or {}
+
+        required = offered.intersection(document_types)
+        si_missing = 'SI' not in offered or (document_files.get('SI') or {}).get('unavailable')
+        if 'SI' in document_types and 'AD' in offered and si_missing:
+            required.add('AD')
+
+        for doc_type in required:
+            document = document_files.get(doc_type)
+            if not document or 'fetched_at' not in document:
+                return False
+            if max_age is not None and time.time() - document['fetched_at'] > max_age:
+                return False
+            if not document.get('unavailable') and not os.path.exists(document['path']):
+                return False
+        return True
+
+    def _fetch_company_documents(self, companies):
+        """Download the documents of individual companies via exact-name searches."""
+        for i, company in enumerate(companies):
+            company_name = company.get('name', 'Unknown')
+            print(f"Looking up company {i+1}/{len(companies)}: {company_name}")
+
+            if not self._open_advanced_search():
+                raise RuntimeError("Could not navigate to advanced search page")
+            if not (self.web_automation.find_and_fill_search_field(company_name, 'exact')
+                    and self.web_automation.submit_search_form()):
+                print(f"Could not search for {company_name}")
+                continue
+            self.web_automation.wait_for_results()
+
+            # Document links of the cached record belong to an old page; use the live ones
+            key = company_key(company)
+            match = next((candidate for candidate in self._shown_companies()
+                          if company_key(candidate) == key), None)
+            if match is None:
+                print(f"{company_name} not found by exact-name search")
+                continue
+
+            self._process_pdf_documents([match])
+            for field in ('document_links', 'document_files', 'extracted_data'):
+                if field in match:
+                    company[field] = match[field]
+
+    def _shown_companies(self):
+        """Companies on the results page currently shown in the browser."""
+        if getattr(self.args, 'extract', 'html') == 'js':
+            return [company for _, company in iter_extracted_rows(self.web_automation.extract_result_rows())]
+        return get_companies_in_searchresults(self.web_automation.driver.page_source, self.parser_backend)
+
+    def _open_advanced_search(self):
+        """Show the advanced search form, from the start page if the results page has no link to it."""
+        if self.web_automation.is_on_advanced_search():
+            return True
+        if self.web_automation.navigate_to_advanced_search():
+            return True
+        self.web_automation.open_startpage()
+        return self.web_automation.navigate_to_advanced_search()
+
     def _process_pdf_documents(self, companies):
         """Process PDF documents for companies if requested."""
         company_count = len(companies)
@@ -136,7 +400,13 @@ class HandelsRegisterSelenium:
         # Initialize PDF processor
         self.pdf_processor = PDFProcessor(
             self.web_automation.driver,
-            debug=self.args.debug
+            debug=self.args.debug,
+            readiness=self.web_automation.readiness,
+            rate_limiter=self.web_automation.rate_limiter,
+            download_dir=self.web_automation.download_dir,
+            session=self.web_automation.http_session,
+            document_types=getattr(self.args, 'documents', None),
+            extraction_cache=ExtractionCache(self.cachedir / EXTRACTION_CACHE_DIR)
         )
 
         # Process each company
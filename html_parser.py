@@ -1,91 +1,377 @@
 """HTML parsing functionality for handelsregister search results."""
 
 import json
-from bs4 import BeautifulSoup
+import re
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
 
+from models import Company, DocumentLink
 
-def get_companies_in_searchresults(html):
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+# Bump whenever the company records produced below change shape or content
+PARSER_VERSION = 2
+
+# String types counted by BeautifulSoup's .text (not comments, script or style content)
+_BS4_TEXT_TYPES = (NavigableString, CData)
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# Same container lookup order as the BeautifulSoup path
+_GRID_XPATHS = (
+    "//table[@role='grid']",
+    f"//table[{_has_class('results')}]",
+    f"//div[{_has_class('search-results')}]",
+)
+
+
+def _class_pattern(name):
+    return r'''\sclass\s*=\s*(?:["'](?:[^"']*\s)?''' + name + r'''(?:\s[^"']*)?["']|''' + name + r'''(?=[\s/>]))'''
+
+
+# Start tags of the same containers (quoted or not), for the pre-scan in extract_results_container()
+_CONTAINER_START_PATTERNS = (
+    ('table', re.compile(r'''<table\b[^>]*?\srole\s*=\s*(?:["']grid["']|grid(?=[\s/>]))''', re.IGNORECASE)),
+    ('table', re.compile(r'<table\b[^>]*?' + _class_pattern('results'), re.IGNORECASE)),
+    ('div', re.compile(r'<div\b[^>]*?' + _class_pattern('search-results'), re.IGNORECASE)),
+)
+
+
+def resolve_parser_backend(backend=None):
+    """Return the parser backend to use: ``lxml`` or ``bs4``.
+
+    ``auto`` (or None) picks lxml when it is installed. Both backends
+    produce identical records.
+    """
+    if backend in (None, 'auto'):
+        return 'lxml' if LXML_AVAILABLE else 'bs4'
+    if backend == 'lxml' and not LXML_AVAILABLE:
+        raise ImportError("The lxml parser backend requires lxml. Install with: pip install lxml")
+    if backend not in ('lxml', 'bs4'):
+        raise ValueError(f"Unknown parser backend: {backend}")
+    return backend
+
+
+def get_companies_in_searchresults(html, backend=None):
     """Parse companies from search results HTML."""
-    soup = BeautifulSoup(html, 'html.parser')
+    return [company for _, company in iter_search_results(html, backend)]
 
-    # Try to find results table
-    grid = soup.find('table', role='grid')
-    if not grid:
-        # Try alternative patterns
-        grid = soup.find('table', class_='results')
-        if not grid:
-            grid = soup.find('div', class_='search-results')
 
-    if not grid:
+def merge_result_pages(pages, max_results=None, backend=None):
+    """Parse several results pages into one deduplicated company list."""
+    merger = ResultMerger(max_results, backend)
+    for html in pages:
+        merger.add_page(html)
+    return merger.companies
+
+
+class ResultMerger:
+    """Collects companies from consecutive results pages.
+
+    Rows are deduplicated by their ``data-ri`` index and collection stops
+    once ``max_results`` companies have been gathered.
+    """
+
+    def __init__(self, max_results=None, backend=None):
+        self.max_results = max_results
+        self.backend = backend
+        self.companies = []
+        self._seen = set()
+
+    @property
+    def full(self):
+        """True once the result cap has been reached."""
+        return self.max_results is not None and len(self.companies) >= self.max_results
+
+    def add_page(self, html):
+        """Add the companies of one page and return the newly added ones."""
+        return self._add(iter_search_results(html, self.backend))
+
+    def add_rows(self, rows):
+        """Add the companies of one page extracted in the browser and return the newly added ones."""
+        return self._add(iter_extracted_rows(rows))
+
+    def _add(self, results):
+        added = []
+        for index, company in results:
+            if self.full:
+                break
+            if index in self._seen:
+                continue
+            self._seen.add(index)
+            self.companies.append(company)
+            added.append(company)
+        return added
+
+
+def iter_search_results(html, backend=None):
+    """Yield ``(data_ri, company)`` for every result row in the HTML.
+
+    Only the results container located by ``extract_results_container``
+    is parsed, so header, navigation forms, footer and scripts never become
+    a tree. The whole page is parsed when the pre-scan finds nothing.
+    """
+    use_lxml = resolve_parser_backend(backend) == 'lxml'
+    find_grid = _find_grid_lxml if use_lxml else _find_grid_bs4
+
+    container = extract_results_container(html)
+    grid = find_grid(container) if container is not None else None
+    if grid is None:
+        grid = find_grid(html)
+
+    if grid is None:
         print("No results table found")
-        return []
+        return
 
-    results = []
-    rows = grid.find_all('tr')
+    rows = _iter_rows_lxml(grid) if use_lxml else _iter_rows_bs4(grid)
+    parse = _parse_result_lxml if use_lxml else parse_result
 
     for result in rows:
         data_ri = result.get('data-ri')
         if data_ri is not None:
             try:
                 index = int(data_ri)
-                company_info = parse_result(result)
-                if company_info:
-                    results.append(company_info)
             except (ValueError, TypeError):
                 continue
+            company_info = parse(result)
+            if company_info:
+                yield index, company_info
+
 
-    return results
+def iter_extracted_rows(rows):
+    """Yield ``(data_ri, company)`` for rows collected in the browser by ``RESULT_ROWS_SCRIPT``.
+
+    The script returns the same text fragments, cell spans and links that
+    ``_RowWalker`` collects, so the records match those parsed from HTML.
+    """
+    for row in rows or ():
+        try:
+            index = int(row['ri'])
+        except (ValueError, TypeError):
+            continue
+        walker = _RowWalker()
+        walker.texts = row['texts']
+        walker.cells = row['cells']
+        walker.links = row['links']
+        try:
+            company_info = walker.company()
+        except Exception as e:
+            print(f"Error parsing result: {e}")
+            continue
+        if company_info:
+            yield index, company_info
+
+
+def extract_results_container(html):
+    """Cut the results container out of a page (str or bytes) without parsing it.
+
+    The start tag is searched in the parsers' lookup order (``table[role=grid]``,
+    ``table.results``, ``div.search-results``), the end tag by counting
+    nested tags of the same name. Returns None without a complete container.
+    """
+    text = isinstance(html, str)
+    for tag, pattern in _CONTAINER_START_PATTERNS:
+        start = (pattern if text else _as_bytes_pattern(pattern)).search(html)
+        if start is None:
+            continue
+
+        tags = re.compile(rf'<(/?){tag}\b', re.IGNORECASE)
+        depth = 0
+        for match in (tags if text else _as_bytes_pattern(tags)).finditer(html, start.start()):
+            tag_end = html.find('>' if text else b'>', match.end())
+            if tag_end == -1:
+                return None
+            if match.group(1):
+                depth -= 1
+                if depth == 0:
+                    return html[start.start():tag_end + 1]
+            elif html[tag_end - 1:tag_end] != ('/' if text else b'/'):
+                depth += 1
+        return None
+    return None
+
+
+def _as_bytes_pattern(pattern):
+    return re.compile(pattern.pattern.encode('ascii'), pattern.flags & ~re.UNICODE)
+
+
+def _find_grid_bs4(html):
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Try to find results table
+    grid = soup.find('table', role='grid')
+    if not grid:
+        # Try alternative patterns
+        grid = soup.find('table', class_='results')
+        if not grid:
+            grid = soup.find('div', class_='search-results')
+    return grid
+
+
+def _find_grid_lxml(html):
+    if isinstance(html, str):
+        # lxml rejects str input that carries an XML encoding declaration
+        html = html.encode('utf-8')
+    try:
+        root = lxml_html.document_fromstring(html, parser=lxml_html.HTMLParser(encoding='utf-8'))
+    except (etree.ParserError, ValueError):
+        return None
+
+    for xpath in _GRID_XPATHS:
+        found = root.xpath(xpath)
+        if found:
+            return found[0]
+    return None
+
+
+def _parse_result_lxml(result):
+    """lxml version of ``parse_result``."""
+    try:
+        walker = _RowWalker()
+        walker.walk_lxml(result)
+        return walker.company()
+
+    except Exception as e:
+        print(f"Error parsing result: {e}")
+        return None
 
 
 def parse_result(result):
     """Parse a single result row."""
     try:
-        cells = []
-        for cell in result.find_all('td'):
-            cells.append(cell.text.strip())
-
-        if len(cells) < 5:
-            return None
-
-        company_info = {
-            'court': cells[1] if len(cells) > 1 else '',
-            'name': cells[2] if len(cells) > 2 else '',
-            'state': cells[3] if len(cells) > 3 else '',
-            'status': cells[4] if len(cells) > 4 else '',
-            'documents': cells[5] if len(cells) > 5 else '',
-            'history': [],
-            'document_links': []
-        }
-
-        # Extract document download links
-        document_links = result.find_all('a', class_='dokumentList')
-        for link in document_links:
-            if link.get('id'):
-                # Extract document type from the span text
-                span = link.find('span')
-                doc_type = span.text.strip() if span else 'Unknown'
-                onclick_value = link.get('onclick', '')
-
-                company_info['document_links'].append({
-                    'id': link.get('id'),
-                    'type': doc_type,
-                    'onclick': onclick_value
-                })
-
-        # Parse history if available
-        hist_start = 8
-        if len(cells) > hist_start:
-            for i in range(hist_start, len(cells), 3):
-                if i + 1 < len(cells):
-                    company_info['history'].append((cells[i], cells[i+1]))
-
-        return company_info
+        walker = _RowWalker()
+        walker.walk_bs4(result)
+        return walker.company()
 
     except Exception as e:
         print(f"Error parsing result: {e}")
         return None
 
 
+class _RowWalker:
+    """Collects cells and document links of a result row in one pass over its subtree.
+
+    Text fragments go to one list in document order. A cell records only
+    the slice of fragments it spans, so the text of outer cells wrapping
+    nested panelgrids is never built unless it is read. Cell texts match
+    BeautifulSoup's ``.text`` (script and style content left out).
+    """
+
+    def __init__(self):
+        self.texts = []
+        self.cells = []
+        self.links = []
+
+    def company(self):
+        links = [dict(link, type=self._text(*link['type']) if link['type'] else 'Unknown')
+                 for link in self.links]
+        return _build_company(_CellTexts(self.texts, self.cells), links)
+
+    def walk_bs4(self, element, link=None):
+        for child in element.children:
+            if type(child) in _BS4_TEXT_TYPES:
+                self.texts.append(child)
+            elif isinstance(child, Tag):
+                self._walk_element(child, child.name, child.get('class') or (), link, self.walk_bs4)
+
+    def walk_lxml(self, element, link=None):
+        if element.text:
+            self.texts.append(element.text)
+        for child in element:
+            # Comments and processing instructions have a non-string tag; only their tail is text
+            if isinstance(child.tag, str) and child.tag not in ('script', 'style'):
+                self._walk_element(child, child.tag, (child.get('class') or '').split(), link, self.walk_lxml)
+            if child.tail:
+                self.texts.append(child.tail)
+
+    def _walk_element(self, element, name, classes, link, walk):
+        if name == 'td':
+            span = [len(self.texts), None]
+            self.cells.append(span)
+            walk(element, link)
+            span[1] = len(self.texts)
+        elif name == 'a' and 'dokumentList' in classes and element.get('id'):
+            link = {'id': element.get('id'), 'type': None}
+            self.links.append(link)
+            walk(element, link)
+        elif name == 'span' and link is not None and link['type'] is None:
+            # The document type is the text of the link's first span
+            span = [len(self.texts), None]
+            link['type'] = span
+            walk(element, None)
+            span[1] = len(self.texts)
+        else:
+            walk(element, link)
+
+    def _text(self, start, end):
+        return "".join(self.texts[start:end]).strip()
+
+
+class _CellTexts:
+    """Read-only sequence of a row's cell texts, joined when accessed."""
+
+    def __init__(self, texts, spans):
+        self.texts = texts
+        self.spans = spans
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __getitem__(self, index):
+        start, end = self.spans[index]
+        return "".join(self.texts[start:end]).strip()
+
+
+def _iter_rows_bs4(element):
+    """Yield the ``tr[data-ri]`` rows below ``element`` without descending into them."""
+    for child in element.children:
+        if isinstance(child, Tag):
+            if child.name == 'tr' and child.get('data-ri') is not None:
+                yield child
+            else:
+                yield from _iter_rows_bs4(child)
+
+
+def _iter_rows_lxml(element):
+    """lxml version of ``_iter_rows_bs4``."""
+    for child in element:
+        if child.tag == 'tr' and child.get('data-ri') is not None:
+            yield child
+        elif isinstance(child.tag, str):
+            yield from _iter_rows_lxml(child)
+
+
+def _build_company(cells, document_links):
+    """Build the company record from a row's cell texts and document links."""
+    if len(cells) < 5:
+        return None
+
+    company_info = Company(
+        court=cells[1] if len(cells) > 1 else '',
+        name=cells[2] if len(cells) > 2 else '',
+        state=cells[3] if len(cells) > 3 else '',
+        status=cells[4] if len(cells) > 4 else '',
+        documents=cells[5] if len(cells) > 5 else '',
+        document_links=[DocumentLink(link['id'], link['type']) for link in document_links]
+    )
+
+    # Parse history if available
+    hist_start = 8
+    if len(cells) > hist_start:
+        for i in range(hist_start, len(cells), 3):
+            if i + 1 < len(cells):
+                company_info.history.append((cells[i], cells[i+1]))
+
+    return company_info
+
+
 def pr_company_info(company):
     """Print company information."""
     for tag in ('name', 'court', 'state', 'status'):
@@ -102,6 +388,30 @@ def pr_company_info(company):
               indent=2, ensure_ascii=False))
 
 
+def company_to_json(company):
+    """Convert a parsed company into the structured JSON output layout."""
+    company_data = {
+        'basic_info': {
+            'name': company.get('name', ''),
+            'court': company.get('court', ''),
+            'state': company.get('state', ''),
+            'status': company.get('status', ''),
+            'documents': company.get('documents', ''),
+            'history': company.get('history', [])
+        }
+    }
+
+    # Add extracted data if available
+    if company.get('extracted_data'):
+        company_data['extracted_data'] = company['extracted_data']
+
+    # Add downloaded documents (path, sha256, bytes per type) if available
+    if company.get('document_files'):
+        company_data['document_files'] = company['document_files']
+
+    return company_data
+
+
 def output_companies_json(companies):
     """Output companies with extracted data as JSON."""
     output_data = []
@@ -109,21 +419,6 @@ def output_companies_json(companies):
         if company is None:  # Skip None companies
             continue
 
-        company_data = {
-            'basic_info': {
-                'name': company.get('name', ''),
-                'court': company.get('court', ''),
-                'state': company.get('state', ''),
-                'status': company.get('status', ''),
-                'documents': company.get('documents', ''),
-                'history': company.get('history', [])
-            }
-        }
-
-        # Add extracted data if available
-        if company.get('extracted_data'):
-            company_data['extracted_data'] = company['extracted_data']
-
-        output_data.append(company_data)
+        output_data.append(company_to_json(company))
 
     return json.dumps(output_data, indent=2, ensure_ascii=False)
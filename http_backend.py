@@ -0,0 +1,323 @@
+"""Browser-free JSF client for the handelsregister search flow."""
+
+import re
+from urllib.parse import urljoin
+from xml.etree import ElementTree
+
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+
+from rate_limiter import RateLimiter
+
+from config import (
+    HANDELSREGISTER_URL,
+    USER_AGENT,
+    ADVANCED_SEARCH_LINK_TEXT,
+    ADVANCED_SEARCH_PAGE,
+    SCHLAGWORT_OPTIONEN,
+    HTTP_TIMEOUT,
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+    HTTP_MAX_RETRIES,
+    JSF_VIEW_STATE_FIELD,
+    HTTP_SEARCH_FIELD_PATTERN,
+    HTTP_SEARCH_OPTION_PATTERN,
+    HTTP_PAGE_SIZE_PATTERN,
+    JSF_PARTIAL_REQUEST_HEADERS,
+    RESULT_DATATABLE_CLASS,
+    PAGINATOR_ROW_COUNT_PATTERN,
+    PAGINATOR_ROWS_PATTERN
+)
+
+# Parameter pairs passed to mojarra.jsfcljs / PrimeFaces.addSubmitParam
+JSF_LINK_PARAM_PATTERN = re.compile(r"'([^']+)'\s*:\s*'([^']*)'")
+
+SKIPPED_INPUT_TYPES = ('submit', 'button', 'image', 'reset', 'file')
+
+# Result rows (nested panelgrid rows carry no data-ri)
+RESULT_ROW_PATTERN = re.compile(r"<tr\b[^>]*\bdata-ri=")
+
+
+def create_session():
+    """Create a requests session with a keep-alive connection pool."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=HTTP_MAX_RETRIES
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+class JSFHttpClient:
+    """Replays the homepage -> advanced search -> submit sequence over plain HTTP.
+
+    Cookies are kept in the pooled session and the current
+    ``javax.faces.ViewState`` is tracked across postbacks. ``search()``
+    returns the results pages as HTML the same parser reads from the
+    Selenium backend's ``driver.page_source``.
+    """
+
+    def __init__(self, base_url=HANDELSREGISTER_URL, session=None, debug=False, timeout=HTTP_TIMEOUT,
+                 rate_limiter=None):
+        self.base_url = base_url
+        self.session = session or create_session()
+        self.debug = debug
+        self.rate_limiter = rate_limiter or RateLimiter(debug=debug)
+        self.timeout = timeout
+        self.view_state = None
+        self.current_url = None
+        self.soup = None
+
+    def search(self, search_term, search_option, on_page=None):
+        """Run a complete search and return the HTML of every results page.
+
+        ``on_page(page)`` is called for each page and returns False to stop
+        early. Later pages are requested the way the PrimeFaces paginator
+        does, with one partial postback per page. A warning is printed when
+        fewer rows than the paginator's total could be fetched.
+        """
+        self.open_startpage()
+        if not self.navigate_to_advanced_search():
+            raise RuntimeError("Could not navigate to advanced search page")
+        page = self.submit_search(search_term, search_option)
+
+        table = self.soup.find('div', class_=RESULT_DATATABLE_CLASS, id=True)
+        row_count, page_size = self._paginator_state(table)
+        fetched = len(RESULT_ROW_PATTERN.findall(page))
+        pages = [page]
+        more = on_page is None or on_page(page)
+        while more and row_count is not None and fetched < row_count:
+            page = self.fetch_results_page(table, fetched, page_size or fetched)
+            rows = len(RESULT_ROW_PATTERN.findall(page))
+            if not rows:
+                break
+            pages.append(page)
+            fetched += rows
+            more = on_page is None or on_page(page)
+
+        if more and row_count is not None and fetched < row_count:
+            print(f"Warning: only {fetched} of {row_count} results could be fetched over HTTP")
+        self._debug_print(f"Collected {len(pages)} results page(s)")
+        return pages
+
+    def fetch_results_page(self, table, first, rows):
+        """Request the results starting at row ``first`` via a paginator postback.
+
+        The partial response carries the rows only; they are wrapped in a
+        grid table so the page parses like a full one.
+        """
+        table_id = table['id']
+        form = table.find_parent('form')
+        fields = self._form_fields(form) + [
+            ('javax.faces.partial.ajax', 'true'),
+            ('javax.faces.source', table_id),
+            ('javax.faces.partial.execute', table_id),
+            ('javax.faces.partial.render', table_id),
+            (table_id, table_id),
+            (f"{table_id}_pagination", 'true'),
+            (f"{table_id}_first", str(first)),
+            (f"{table_id}_rows", str(rows)),
+            (f"{table_id}_skipChildren", 'true'),
+            (f"{table_id}_encodeFeature", 'true'),
+        ]
+        self._debug_print(f"Requesting results from row {first}")
+        updates = self._post_partial(form, fields)
+        return f'<table role="grid"><tbody>{updates.get(table_id, "")}</tbody></table>'
+
+    def open_startpage(self):
+        """Load the homepage and start a JSF session."""
+        self._debug_print("Opening handelsregister.de homepage via HTTP...")
+        self.rate_limiter.acquire(reason="homepage")
+        response = self.session.get(self.base_url, timeout=self.timeout)
+        return self._remember(response)
+
+    def navigate_to_advanced_search(self):
+        """Trigger the advanced search command link via a form postback."""
+        link = self._find_advanced_search_link()
+        if link is None:
+            self._debug_print("Could not find advanced search link")
+            return False
+
+        form = link.find_parent('form')
+        if form is None:
+            self._debug_print("Advanced search link is not inside a form")
+            return False
+
+        fields = self._form_fields(form)
+        link_params = JSF_LINK_PARAM_PATTERN.findall(link.get('onclick', ''))
+        if link_params:
+            fields.extend(link_params)
+        elif link.get('id'):
+            fields.append((link['id'], link['id']))
+
+        self._post_form(form, fields)
+        self._debug_print(f"Advanced search page loaded: {self.current_url}")
+        return ADVANCED_SEARCH_PAGE in self.current_url or self._find_search_field() is not None
+
+    def submit_search(self, search_term, search_option):
+        """Fill the advanced search form and post it back."""
+        search_field = self._find_search_field()
+        if search_field is None:
+            raise RuntimeError("Could not find search field in advanced search form")
+
+        form = search_field.find_parent('form')
+        page_size = self._find_largest_page_size(form)
+        fields = [
+            (name, value) for name, value in self._form_fields(form)
+            if name != search_field['name'] and not re.search(HTTP_SEARCH_OPTION_PATTERN, name)
+            and not (page_size and name == page_size[0])
+        ]
+        fields.append((search_field['name'], search_term))
+        if page_size:
+            fields.append(page_size)
+
+        option_name = self._find_search_option_name(form)
+        if option_name:
+            fields.append((option_name, str(SCHLAGWORT_OPTIONEN.get(search_option, 1))))
+
+        submit = self._find_submit_button(form)
+        if submit is not None and submit.get('name'):
+            fields.append((submit['name'], submit.get('value', '')))
+
+        self._debug_print(f"Submitting search for: {search_term}")
+        return self._post_form(form, fields)
+
+    def close(self):
+        """Close the pooled session."""
+        self.session.close()
+
+    def _remember(self, response):
+        """Track URL, parsed page and ViewState of the latest response."""
+        response.raise_for_status()
+        self.current_url = response.url
+        self.soup = BeautifulSoup(response.text, 'html.parser')
+        view_state = self.soup.find('input', attrs={'name': JSF_VIEW_STATE_FIELD})
+        if view_state is not None:
+            self.view_state = view_state.get('value', '')
+        return response.text
+
+    def _post_form(self, form, fields):
+        """Post form fields to the form action with the current ViewState."""
+        action = urljoin(self.current_url, form.get('action') or self.current_url)
+        self.rate_limiter.acquire(reason="form postback")
+        response = self.session.post(
+            action, data=self._with_view_state(fields), timeout=self.timeout,
+            headers={"Referer": self.current_url}
+        )
+        return self._remember(response)
+
+    def _post_partial(self, form, fields):
+        """Post a JSF partial request and return its updates by component id.
+
+        The shown page stays the current one; only the ViewState is taken
+        over from the response.
+        """
+        action = urljoin(self.current_url, form.get('action') or self.current_url)
+        self.rate_limiter.acquire(reason="results page")
+        response = self.session.post(
+            action, data=self._with_view_state(fields), timeout=self.timeout,
+            headers=dict(JSF_PARTIAL_REQUEST_HEADERS, Referer=self.current_url)
+        )
+        response.raise_for_status()
+
+        updates = {}
+        for update in ElementTree.fromstring(response.content).iter('update'):
+            updates[update.get('id', '')] = update.text or ''
+            if JSF_VIEW_STATE_FIELD in update.get('id', ''):
+                self.view_state = update.text or ''
+        return updates
+
+    def _with_view_state(self, fields):
+        """Replace any ViewState among the fields with the current one."""
+        fields = [(name, value) for name, value in fields if name != JSF_VIEW_STATE_FIELD]
+        if self.view_state is not None:
+            fields.append((JSF_VIEW_STATE_FIELD, self.view_state))
+        return fields
+
+    def _form_fields(self, form):
+        """Collect the default successful controls of a form."""
+        fields = []
+        for element in form.find_all(['input', 'textarea', 'select']):
+            name = element.get('name')
+            if not name or element.has_attr('disabled'):
+                continue
+
+            if element.name == 'textarea':
+                fields.append((name, element.text))
+            elif element.name == 'select':
+                option = element.find('option', selected=True) or element.find('option')
+                if option is not None:
+                    fields.append((name, option.get('value', option.text)))
+            else:
+                input_type = element.get('type', 'text').lower()
+                if input_type in SKIPPED_INPUT_TYPES:
+                    continue
+                if input_type in ('checkbox', 'radio') and not element.has_attr('checked'):
+                    continue
+                fields.append((name, element.get('value', '')))
+        return fields
+
+    def _find_advanced_search_link(self):
+        """Find the advanced search command link by its text."""
+        for link in self.soup.find_all('a'):
+            if link.get_text(strip=True) in ADVANCED_SEARCH_LINK_TEXT:
+                return link
+        return None
+
+    def _find_search_field(self):
+        """Find the keyword field of the advanced search form."""
+        for element in self.soup.find_all(['textarea', 'input']):
+            if re.search(HTTP_SEARCH_FIELD_PATTERN, element.get('name', '')):
+                return element
+        return None
+
+    def _find_search_option_name(self, form):
+        """Return the name of the keyword option control, if present."""
+        for element in form.find_all(['input', 'select']):
+            name = element.get('name', '')
+            if re.search(HTTP_SEARCH_OPTION_PATTERN, name):
+                return name
+        return None
+
+    def _find_largest_page_size(self, form):
+        """Return ``(name, value)`` for the largest results-per-page option, if any."""
+        for select in form.find_all('select'):
+            name = select.get('name', '')
+            if not re.search(HTTP_PAGE_SIZE_PATTERN, name):
+                continue
+            sizes = [option.get('value', '') for option in select.find_all('option')]
+            sizes = [int(size) for size in sizes if size.isdigit()]
+            if sizes:
+                return name, str(max(sizes))
+        return None
+
+    def _paginator_state(self, table):
+        """Return ``(row_count, page_size)`` from the datatable's widget script, or Nones."""
+        if table is None:
+            return None, None
+        for script in self.soup.find_all('script'):
+            text = script.string or ''
+            if table['id'] not in text:
+                continue
+            row_count = re.search(PAGINATOR_ROW_COUNT_PATTERN, text)
+            if row_count:
+                page_size = re.search(PAGINATOR_ROWS_PATTERN, text)
+                return int(row_count.group(1)), int(page_size.group(1)) if page_size else None
+        return None, None
+
+    def _find_submit_button(self, form):
+        """Return the form's submit control."""
+        return form.find(
+            lambda tag: (tag.name == 'button' and tag.get('type', 'submit').lower() == 'submit')
+            or (tag.name == 'input' and tag.get('type', '').lower() == 'submit')
+        )
+
+    def _debug_print(self, message):
+        """Print debug message if debug mode is enabled."""
+        if self.debug:
+            print(message)
@@ -0,0 +1,115 @@
+"""Slotted record types for parsed search results."""
+
+import sys
+
+
+class _Record:
+    """Dict-style access to a slotted record, for code written against the former dicts.
+
+    ``record['name']``, ``record.get('name')``, ``'name' in record``,
+    ``record['extracted_data'] = ...`` and ``record.update(...)`` behave as
+    they did on dicts; optional fields that are unset count as missing.
+    ``to_dict()`` returns the former dict layout.
+    """
+
+    __slots__ = ()
+    _optional = ()
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        value = getattr(self, key)
+        if value is None and key in self._optional:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and not (key in self._optional and getattr(self, key) is None)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def update(self, values):
+        for key, value in values.items():
+            self[key] = value
+
+    def keys(self):
+        return [key for key in self.__slots__ if key in self]
+
+    def to_dict(self):
+        return {key: self[key] for key in self.keys()}
+
+    def __eq__(self, other):
+        if isinstance(other, _Record):
+            other = other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class DocumentLink(_Record):
+    """A document link of a result row.
+
+    The link's ``onclick`` JavaScript is not retained by the parser; it
+    only matters while the page is shown, and the PDF processor reads it
+    from the live element then. ``onclick`` is ``''`` unless one is given.
+    """
+
+    __slots__ = ('id', 'type', 'onclick')
+
+    def __init__(self, id, type, onclick=''):
+        self.id = id
+        self.type = sys.intern(type)
+        self.onclick = onclick or ''
+
+
+class Company(_Record):
+    """A company from the search results.
+
+    Values repeated across companies (state, status, the documents
+    column) are interned. The court column carries the register number,
+    so it is unique per company and kept as is. ``extracted_data`` and
+    ``document_files`` are set once documents were processed.
+    """
+
+    __slots__ = ('court', 'name', 'state', 'status', 'documents', 'history', 'document_links',
+                 'extracted_data', 'document_files')
+    _optional = ('extracted_data', 'document_files')
+
+    def __init__(self, court, name, state='', status='', documents='', history=None, document_links=None,
+                 extracted_data=None, document_files=None):
+        self.court = court
+        self.name = name
+        self.state = sys.intern(state)
+        self.status = sys.intern(status)
+        self.documents = sys.intern(documents)
+        self.history = history if history is not None else []
+        self.document_links = document_links if document_links is not None else []
+        self.extracted_data = extracted_data
+        self.document_files = document_files
+
+    def to_dict(self):
+        data = super().to_dict()
+        data['document_links'] = [link.to_dict() if isinstance(link, _Record) else link
+                                  for link in self.document_links]
+        return data
+
+
+def record_to_dict(record):
+    """``json.dumps`` default for records: their former dict layout."""
+    if isinstance(record, _Record):
+        return record.to_dict()
+    raise TypeError(f"Object of type {type(record).__name__} is not JSON serializable")
@@ -0,0 +1,181 @@
+"""Event-driven page readiness checks replacing fixed sleeps."""
+
+import collections
+import json
+import time
+
+from config import (
+    READINESS_TIMEOUT,
+    READINESS_POLL_INTERVAL,
+    NETWORK_IDLE_WINDOW,
+    DOCUMENT_MIME_TYPES,
+    DOCUMENT_RESPONSE_LIMIT,
+    AJAX_IDLE_SCRIPT,
+    RESULTS_READY_SELECTORS
+)
+
+
+class NetworkMonitor:
+    """Tracks in-flight requests and transferred bytes from Chrome's CDP performance log.
+
+    Only the last ``DOCUMENT_RESPONSE_LIMIT`` PDF/XML responses are kept, so
+    a monitor nobody takes them from does not grow over a long run.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.available = True
+        self.last_activity = time.monotonic()
+        self.bytes_received = 0
+        self.requests_sent = 0
+        self.requests_blocked = 0
+        self.document_responses = collections.deque(maxlen=DOCUMENT_RESPONSE_LIMIT)
+        self._inflight = set()
+
+    def poll(self):
+        """Drain pending CDP events from the performance log."""
+        if not self.available:
+            return
+        try:
+            entries = self.driver.get_log('performance')
+        except Exception:
+            # Performance logging not enabled for this driver
+            self.available = False
+            return
+
+        for entry in entries:
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, TypeError, ValueError):
+                continue
+            self._handle_event(message.get('method', ''), message.get('params', {}))
+
+    def is_idle(self, window, since):
+        """True when nothing is in flight and the network was quiet for ``window`` seconds."""
+        quiet_since = max(self.last_activity, since)
+        return not self._inflight and time.monotonic() - quiet_since >= window
+
+    def take_document_responses(self):
+        """Return and forget the PDF/XML responses that finished loading so far."""
+        finished = [response for response in self.document_responses if response['finished']]
+        self.document_responses = collections.deque(
+            (response for response in self.document_responses if not response['finished']),
+            maxlen=DOCUMENT_RESPONSE_LIMIT)
+        return finished
+
+    def _handle_event(self, method, params):
+        """Update the in-flight request set from a single CDP event."""
+        if not method.startswith('Network.'):
+            return
+        request_id = params.get('requestId')
+        if method == 'Network.requestWillBeSent':
+            self._inflight.add(request_id)
+            self.requests_sent += 1
+        elif method == 'Network.responseReceived':
+            response = params.get('response', {})
+            mime_type = response.get('mimeType', '').lower()
+            if mime_type in DOCUMENT_MIME_TYPES:
+                self.document_responses.append(
+                    {'requestId': request_id, 'url': response.get('url', ''), 'mimeType': mime_type,
+                     'finished': False})
+        elif method == 'Network.loadingFinished':
+            self._inflight.discard(request_id)
+            self.bytes_received += int(params.get('encodedDataLength', 0))
+            for response in self.document_responses:
+                if response['requestId'] == request_id:
+                    response['finished'] = True
+        elif method == 'Network.loadingFailed':
+            self._inflight.discard(request_id)
+            if params.get('blockedReason'):
+                self.requests_blocked += 1
+        self.last_activity = time.monotonic()
+
+
+class PageReadiness:
+    """Waits on concrete browser signals with a configurable upper bound.
+
+    Supported signals are ``document.readyState``, an idle PrimeFaces/JSF
+    AJAX queue, presence of the results table and network idle derived from
+    CDP events. Every wait is recorded in ``timings`` with the time it
+    actually took.
+    """
+
+    def __init__(self, driver, timeout=READINESS_TIMEOUT, poll_interval=READINESS_POLL_INTERVAL,
+                 network_idle_window=NETWORK_IDLE_WINDOW, debug=False):
+        self.driver = driver
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.network_idle_window = network_idle_window
+        self.debug = debug
+        self.network = NetworkMonitor(driver)
+        self.timings = []
+
+    def wait_for(self, signal, condition, timeout=None):
+        """Poll ``condition`` until it holds or the timeout expires."""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        satisfied = False
+
+        while True:
+            try:
+                satisfied = bool(condition())
+            except Exception:
+                satisfied = False
+            if satisfied or time.monotonic() >= deadline:
+                break
+            time.sleep(self.poll_interval)
+
+        elapsed = time.monotonic() - started
+        self.timings.append({'signal': signal, 'seconds': elapsed, 'satisfied': satisfied})
+        if self.debug:
+            state = "ready" if satisfied else "timed out"
+            print(f"Wait for {signal}: {state} after {elapsed:.2f}s")
+        return satisfied
+
+    def wait_for_document_ready(self, timeout=None):
+        """Wait until ``document.readyState`` is ``complete``."""
+        return self.wait_for('document_ready', self._document_ready, timeout)
+
+    def wait_for_ajax_idle(self, timeout=None):
+        """Wait until the PrimeFaces/JSF AJAX queue is empty."""
+        return self.wait_for('ajax_idle', self._ajax_idle, timeout)
+
+    def wait_for_network_idle(self, timeout=None):
+        """Wait until no request has been in flight for the idle window."""
+        since = time.monotonic()
+
+        def network_idle():
+            self.network.poll()
+            return not self.network.available or self.network.is_idle(self.network_idle_window, since)
+
+        return self.wait_for('network_idle', network_idle, timeout)
+
+    def wait_for_results(self, timeout=None):
+        """Wait until the results table (or an empty/error message) is rendered."""
+        ready = self.wait_for('results', self._results_present, timeout)
+        self.wait_for_ajax_idle(timeout)
+        return ready
+
+    def wait_for_page_ready(self, timeout=None):
+        """Wait for document load, an idle AJAX queue and an idle network."""
+        document_ready = self.wait_for_document_ready(timeout)
+        ajax_idle = self.wait_for_ajax_idle(timeout)
+        network_idle = self.wait_for_network_idle(timeout)
+        return document_ready and ajax_idle and network_idle
+
+    def total_wait(self):
+        """Total seconds spent waiting so far."""
+        return sum(timing['seconds'] for timing in self.timings)
+
+    def _document_ready(self):
+        return self.driver.execute_script("return document.readyState") == "complete"
+
+    def _ajax_idle(self):
+        return self.driver.execute_script(AJAX_IDLE_SCRIPT)
+
+    def _results_present(self):
+        return self.driver.execute_script(
+            "return document.querySelector(arguments[0]) !== null;",
+            ", ".join(RESULTS_READY_SELECTORS)
+        )
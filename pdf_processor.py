@@ -1,11 +1,31 @@
 """PDF processing functionality for handelsregister documents."""
 
+import base64
+import hashlib
+import io
 import os
-import time
 import re
 import json
-import requests
-from config import REGEX_PATTERNS, DOWNLOAD_WAIT_TIMEOUT
+import shutil
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from requests.cookies import RequestsCookieJar
+from config import (
+    REGEX_PATTERNS,
+    DOWNLOAD_WAIT_TIMEOUT,
+    HTTP_TIMEOUT,
+    PDF_CHUNK_SIZE,
+    DEFAULT_DOCUMENT_TYPES,
+    DOCUMENT_FETCH_WORKERS,
+    DOCUMENT_FILE_SUFFIXES,
+    EXTRACTION_DOCUMENT_TYPES
+)
+from download_watcher import DownloadWatcher
+from extraction_cache import ExtractionCache
+from http_backend import create_session
+from page_readiness import PageReadiness
+from rate_limiter import RateLimiter
+from si_parser import is_si_document, parse_si_document, SI_PARSER_VERSION
 
 try:
     import PyPDF2
@@ -13,13 +33,25 @@ try:
 except ImportError:
     PDF_AVAILABLE = False
 
+# Bump whenever _parse_company_data() output changes; cached PDF text is re-parsed then
+PDF_PARSER_VERSION = 1
+
 
 class PDFProcessor:
     """Handles PDF document downloading and content extraction."""
 
-    def __init__(self, driver, debug=False):
+    def __init__(self, driver, debug=False, readiness=None, rate_limiter=None, download_dir=None,
+                 session=None, document_types=None, max_workers=DOCUMENT_FETCH_WORKERS,
+                 extraction_cache=None):
         self.driver = driver
         self.debug = debug
+        self.download_dir = download_dir
+        self.session = session or create_session()
+        self.document_types = list(document_types or DEFAULT_DOCUMENT_TYPES)
+        self.max_workers = max_workers
+        self.extraction_cache = extraction_cache or ExtractionCache()
+        self.readiness = readiness or PageReadiness(driver, debug=debug)
+        self.rate_limiter = rate_limiter or RateLimiter(debug=debug)
 
         if not PDF_AVAILABLE:
             raise ImportError(
@@ -27,48 +59,159 @@ class PDFProcessor:
             )
 
     def download_company_documents(self, company):
-        """Download PDF documents for a company and extract information."""
-        if not company.get('document_links'):
+        """Download the selected documents of a company and extract information.
+
+        Clicks share the one browser page and run in order. Direct PDF URLs
+        are fetched on a thread pool, overlapping with the next clicks; every
+        fetch still draws a token from the rate limiter. ``extracted_data``
+        comes from the structured SI document when one was fetched and from
+        the AD PDF otherwise. Every attempted type gets a ``document_files``
+        entry; one that could not be fetched is marked ``unavailable``, so
+        the miss counts as fresh until the document TTL runs out.
+        """
+        company_name = company.get('name', 'Unknown')
+        doc_links = self._selected_document_links(company)
+        ad_fallback = 'SI' in self.document_types and any(
+            link['type'] == 'AD' for link in company.get('document_links', []))
+        if not doc_links and not ad_fallback:
             if self.debug:
-                company_name = company.get('name', 'Unknown')
-                print(f"No document links found for {company_name}")
+                print(f"No {', '.join(self.document_types)} document links found for {company_name}")
             return company
 
         company['extracted_data'] = {}
+        company['document_files'] = {}
+        documents = {}
+        attempted = [doc_link['type'] for doc_link in doc_links]
 
-        for doc_link in company['document_links']:
-            # Only process 'AD' documents (Aktuelle Daten / Current Data)
-            if doc_link['type'] == 'AD':
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = []
+            for doc_link in doc_links:
+                if self.debug:
+                    print(f"Processing {doc_link['type']} document for {company_name}")
+                page = self._current_page()
+                pending.append((doc_link, self._download_document(doc_link, company, executor)))
+                # The next link is looked up on the results page
+                self._restore_page(page)
+
+            for doc_link, download in pending:
                 try:
-                    if self.debug:
-                        company_name = company.get('name', 'Unknown')
-                        print(f"Processing {doc_link['type']} document for {company_name}")
-
-                    pdf_path = self._download_pdf_document(doc_link, company)
-                    if pdf_path:
-                        extracted_data = self._extract_pdf_content(pdf_path)
-                        if extracted_data:
-                            company['extracted_data'] = extracted_data
-                            if self.debug:
-                                doc_type = doc_link['type']
-                                print(f"Successfully extracted data from {doc_type} document")
-                        break  # Stop after first successful AD document
+                    document = download.result() if isinstance(download, Future) else download
                 except Exception as e:
                     print(f"Error processing document {doc_link['type']}: {e}")
                     continue
+                if document:
+                    documents[doc_link['type']] = document
+
+        # SI was asked for but is not offered, missing or empty: fall back to the AD PDF
+        extracted_data = self._extract_company_data(documents)
+        if not extracted_data and ad_fallback and 'AD' not in documents:
+            ad_link = next((link for link in company['document_links'] if link['type'] == 'AD'), None)
+            if ad_link is not None:
+                if self.debug:
+                    print(f"No SI data for {company_name}, falling back to the AD document")
+                attempted.append('AD')
+                page = self._current_page()
+                document = self._download_document(ad_link, company)
+                self._restore_page(page)
+                if document:
+                    documents['AD'] = document
+                    extracted_data = self._extract_company_data(documents)
+
+        fetched_at = time.time()
+        for doc_type in attempted:
+            document = documents.get(doc_type)
+            if document:
+                company['document_files'][doc_type] = dict(
+                    {key: document[key] for key in ('path', 'sha256', 'bytes')}, fetched_at=fetched_at)
+            else:
+                company['document_files'][doc_type] = {
+                    'path': None, 'sha256': None, 'bytes': 0, 'unavailable': True, 'fetched_at': fetched_at}
+        if extracted_data:
+            company['extracted_data'] = extracted_data
 
         return company
 
-    def _download_pdf_document(self, doc_link, company):
-        """Download a PDF document by clicking the link."""
+    def _extract_company_data(self, documents):
+        """Parse the most preferred downloaded document that yields data."""
+        for doc_type in EXTRACTION_DOCUMENT_TYPES:
+            document = documents.get(doc_type)
+            if not document:
+                continue
+            source = document.get('content') or document['path']
+            if doc_type == 'SI':
+                extracted_data = self._extract_si_content(source, document.get('sha256'))
+            else:
+                extracted_data = self._extract_pdf_content(source, document.get('sha256'))
+            if extracted_data:
+                if self.debug:
+                    print(f"Successfully extracted data from {doc_type} document")
+                return extracted_data
+        return {}
+
+    def _current_page(self):
+        """Window handle, open windows and URL of the results page before a click."""
+        try:
+            return (self.driver.current_window_handle, set(self.driver.window_handles),
+                    self.driver.current_url)
+        except Exception:
+            return None
+
+    def _restore_page(self, page):
+        """Return to the results page after a document, whatever the click did.
+
+        A document can open in a new window or navigate the current one, and
+        ``_find_pdf_url()`` switches to such windows. Windows opened since
+        ``page`` was taken are closed, so a later document does not pick up
+        an earlier one's PDF tab, and the page is navigated back if needed.
+        """
+        if page is None:
+            return
+        window, windows, url = page
+        try:
+            for handle in self.driver.window_handles:
+                if handle not in windows:
+                    self.driver.switch_to.window(handle)
+                    self.driver.close()
+            if self.driver.current_window_handle != window:
+                self.driver.switch_to.window(window)
+
+            if self.driver.current_url != url:
+                if self.debug:
+                    print(f"Returning to {url} from {self.driver.current_url}")
+                self.rate_limiter.acquire(reason="back to results page")
+                self.driver.back()
+                self.readiness.wait_for_document_ready()
+                if self.driver.current_url != url:
+                    self.rate_limiter.acquire(reason="results page")
+                    self.driver.get(url)
+                    self.readiness.wait_for_document_ready()
+        except Exception as e:
+            print(f"Error returning to the results page: {e}")
+
+    def _selected_document_links(self, company):
+        """Return the first link of every selected document type, in selection order."""
+        links = {}
+        for doc_link in company.get('document_links', []):
+            links.setdefault(doc_link['type'], doc_link)
+        return [links[doc_type] for doc_type in self.document_types if doc_type in links]
+
+    def _download_document(self, doc_link, company, executor=None):
+        """Download a document by clicking the link.
+
+        Returns a document record (``path``, ``sha256``, ``bytes`` and, when
+        the response was captured from the browser, ``content``) or None.
+        A direct PDF URL is fetched on ``executor`` and a future is returned.
+        """
         try:
             # Find the document link on the current page
             from selenium.webdriver.common.by import By
             link_element = self.driver.find_element(By.ID, doc_link['id'])
 
+            # Parsed records do not retain the onclick JavaScript; read it from the live link
+            onclick = doc_link.get('onclick') or link_element.get_attribute('onclick')
+
             # Execute the onclick JavaScript to trigger the download
-            if doc_link['onclick']:
-                onclick = doc_link['onclick']
+            if onclick:
 
                 if self.debug:
                     print(f"Executing onclick: {onclick[:100]}...")
@@ -77,30 +220,48 @@ class PDFProcessor:
                 current_url_before = self.driver.current_url
                 page_source_before = self.driver.page_source[:1000]
 
-                # Execute the onclick JavaScript
-                self.driver.execute_script(onclick)
+                # Forget document responses of earlier clicks so the capture pairs with this one
+                self.readiness.network.poll()
+                self.readiness.network.take_document_responses()
 
-                # Wait for potential navigation or content change
-                time.sleep(5)
+                # Arm the watcher before the click so a fast download is not missed
+                suffix = self._document_suffix(doc_link['type'])
+                with DownloadWatcher(self.download_dir or '.', suffix=suffix, debug=self.debug) as watcher:
+                    # Execute the onclick JavaScript
+                    self.rate_limiter.acquire(reason=f"{doc_link['type']} document")
+                    self.driver.execute_script(onclick)
 
-                # Check if URL changed (form submission likely caused navigation)
-                current_url_after = self.driver.current_url
-                page_source_after = self.driver.page_source[:1000]
+                    # Wait for potential navigation or content change
+                    self.readiness.wait_for_network_idle(DOWNLOAD_WAIT_TIMEOUT)
+                    self.readiness.wait_for_document_ready()
 
-                if self.debug:
-                    self._debug_pdf_download_state(
-                        current_url_before, current_url_after,
-                        page_source_before, page_source_after
-                    )
+                    # Take the document straight from the response body if the browser received one
+                    content = self._capture_document_response(doc_link['type'])
+                    if content:
+                        return self._save_document(content, doc_link['type'], company)
 
-                # Try different methods to get the PDF
-                pdf_url = self._find_pdf_url(current_url_after)
+                    # Check if URL changed (form submission likely caused navigation)
+                    current_url_after = self.driver.current_url
+                    page_source_after = self.driver.page_source[:1000]
 
-                if pdf_url:
-                    return self._download_pdf_from_url(pdf_url, doc_link['type'], company)
-                else:
-                    # Wait for file download in current directory
-                    return self._wait_for_download(company)
+                    if self.debug:
+                        self._debug_pdf_download_state(
+                            current_url_before, current_url_after,
+                            page_source_before, page_source_after
+                        )
+
+                    # Try different methods to get the PDF (SI is only ever a download)
+                    pdf_url = self._find_pdf_url(current_url_after) if suffix == '.pdf' else None
+
+                    if pdf_url:
+                        # The worker must not touch the driver; hand it what it needs from the browser
+                        cookies, referer = self._browser_context()
+                        fetch_args = (pdf_url, doc_link['type'], company, cookies, referer)
+                        if executor is not None:
+                            return executor.submit(self._download_pdf_from_url, *fetch_args)
+                        return self._download_pdf_from_url(*fetch_args)
+                    # Wait for the file to land in this job's download directory
+                    return self._wait_for_download(watcher, doc_link['type'], company)
 
         except Exception as e:
             print(f"Error downloading document: {e}")
@@ -109,6 +270,41 @@ class PDFProcessor:
                 traceback.print_exc()
             return None
 
+    def _capture_document_response(self, doc_type):
+        """Return the body of the latest captured response for a document type, or None."""
+        self.readiness.network.poll()
+        for response in reversed(self.readiness.network.take_document_responses()):
+            try:
+                body = self.driver.execute_cdp_cmd(
+                    'Network.getResponseBody', {'requestId': response['requestId']})
+            except Exception as e:
+                # Bodies of responses handed to the download manager are not retained
+                if self.debug:
+                    print(f"Could not capture document response {response['url']}: {e}")
+                continue
+
+            data = body.get('body', '')
+            content = base64.b64decode(data) if body.get('base64Encoded') else data.encode('utf-8')
+            # XML responses include JSF partial responses of the page itself
+            if self._document_suffix(doc_type) == '.xml':
+                matches = is_si_document(content)
+            else:
+                matches = content.startswith(b'%PDF')
+            if matches:
+                if self.debug:
+                    print(f"Captured {doc_type} response ({len(content)} bytes): {response['url']}")
+                return content
+        return None
+
+    def _save_document(self, content, doc_type, company):
+        """Keep a copy of a captured document in the current directory."""
+        filename = self._document_filename(doc_type, company)
+        with open(filename, 'wb') as f:
+            f.write(content)
+        print(f"Downloaded document: {filename}")
+        return {'path': filename, 'sha256': hashlib.sha256(content).hexdigest(),
+                'bytes': len(content), 'content': content}
+
     def _debug_pdf_download_state(self, url_before, url_after, page_before, page_after):
         """Debug helper to print download state information."""
         print(f"URL before: {url_before}")
@@ -177,8 +373,9 @@ class PDFProcessor:
                 By.XPATH, "//a[contains(text(), 'Download') or contains(@title, 'PDF') or contains(@class, 'download')]"
             )
             if download_elements:
+                self.rate_limiter.acquire(reason="download button")
                 download_elements[0].click()
-                time.sleep(3)
+                self.readiness.wait_for_network_idle()
                 # Check again for PDF
                 current_url_final = self.driver.current_url
                 if current_url_final.endswith('.pdf') or 'pdf' in current_url_final.lower():
@@ -203,110 +400,138 @@ class PDFProcessor:
 
         return None
 
-    def _download_pdf_from_url(self, pdf_url, doc_type, company):
-        """Download PDF from a direct URL."""
+    def _download_pdf_from_url(self, pdf_url, doc_type, company, cookies=None, referer=None):
+        """Stream a PDF from a direct URL to disk and return its document record.
+
+        Runs on the fetch thread pool, so it never calls the driver: the
+        browser's cookies and the Referer come from ``_browser_context()``,
+        taken on the driver's thread. The body is hashed and counted chunk by
+        chunk, so a large document is never held in memory.
+        """
+        filename = self._document_filename(doc_type, company)
+        partial_name = f"{filename}.part"
+        headers = {"Referer": referer} if referer else {}
         try:
-            # Create filename
-            company_name = company.get('name', 'Unknown').replace(
-                ' ', '_').replace('/', '_')
-            filename = f"{company_name}_{doc_type}.pdf"
-
-            # Get cookies from selenium driver for the request
-            cookies = self.driver.get_cookies()
-            session = requests.Session()
-            for cookie in cookies:
-                session.cookies.set(cookie['name'], cookie['value'])
-
-            # Download the PDF
-            response = session.get(pdf_url)
-            response.raise_for_status()
-
-            # Save to current directory
-            with open(filename, 'wb') as f:
-                f.write(response.content)
+            self.rate_limiter.acquire(reason=f"{doc_type} download")
+            digest = hashlib.sha256()
+            size = 0
+            with self.session.get(pdf_url, stream=True, timeout=HTTP_TIMEOUT,
+                                  cookies=cookies, headers=headers) as response:
+                response.raise_for_status()
+                with open(partial_name, 'wb') as f:
+                    for chunk in response.iter_content(PDF_CHUNK_SIZE):
+                        digest.update(chunk)
+                        size += len(chunk)
+                        f.write(chunk)
+            os.replace(partial_name, filename)
 
             print(f"Downloaded PDF: {filename}")
-            return filename
+            if self.debug:
+                print(f"{size} bytes, sha256 {digest.hexdigest()}")
+            return {'path': filename, 'sha256': digest.hexdigest(), 'bytes': size}
 
         except Exception as e:
             print(f"Error downloading PDF from URL: {e}")
+            if os.path.exists(partial_name):
+                os.remove(partial_name)
             return None
 
-    def _wait_for_download(self, company, timeout=DOWNLOAD_WAIT_TIMEOUT):
-        """Wait for a file to be downloaded and return the filename."""
+    def _browser_context(self):
+        """Snapshot the browser's cookies and current URL for a direct fetch.
+
+        The cookies go into a jar of their own and are sent with that one
+        request, so concurrent fetches never write to the shared session.
+        """
+        cookies = RequestsCookieJar()
+        for cookie in self.driver.get_cookies():
+            cookies.set(cookie['name'], cookie['value'],
+                        domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+        return cookies, self.driver.current_url
+
+    def _wait_for_download(self, watcher, doc_type, company, timeout=DOWNLOAD_WAIT_TIMEOUT):
+        """Wait for the download in this job's directory and move it next to the other PDFs."""
+        downloaded_file = watcher.wait(timeout)
+        if downloaded_file is None:
+            return None
+
+        target_name = self._document_filename(doc_type, company)
+        shutil.move(str(downloaded_file), target_name)
+        if self.debug:
+            print(f"Detected new PDF file: {downloaded_file.name} -> {target_name}")
+
+        digest = hashlib.sha256()
+        with open(target_name, 'rb') as f:
+            for chunk in iter(lambda: f.read(PDF_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return {'path': target_name, 'sha256': digest.hexdigest(), 'bytes': os.path.getsize(target_name)}
+
+    def _document_suffix(self, doc_type):
+        return DOCUMENT_FILE_SUFFIXES.get(doc_type, '.pdf')
+
+    def _document_filename(self, doc_type, company):
+        """File name under which a company's document is kept."""
         company_name = company.get('name', 'Unknown').replace(
             ' ', '_').replace('/', '_')
+        return f"{company_name}_{doc_type}{self._document_suffix(doc_type)}"
 
-        # Get list of PDF files before (to detect new downloads)
-        pdf_files_before = set(
-            [f for f in os.listdir('.') if f.endswith('.pdf')])
-
-        # Wait for new files to appear
-        for i in range(timeout):
-            time.sleep(1)
-            pdf_files_after = set(
-                [f for f in os.listdir('.') if f.endswith('.pdf')])
-            new_pdf_files = pdf_files_after - pdf_files_before
+    def _extract_si_content(self, si, sha256=None):
+        """Parse SI bytes or an SI file into ``extracted_data``, reusing cached results."""
+        entry = self.extraction_cache.get(sha256) if sha256 else None
+        if entry and entry['parser'] == 'SI' and entry['parser_version'] == SI_PARSER_VERSION:
+            if self.debug:
+                print(f"Using cached SI extraction {sha256[:12]}")
+            return entry['extracted_data']
 
-            # Look for new PDF files
-            if new_pdf_files:
-                downloaded_file = list(new_pdf_files)[0]  # Get first new PDF
-                if self.debug:
-                    print(f"Detected new PDF file: {downloaded_file}")
+        try:
+            extracted_data = parse_si_document(io.BytesIO(si) if isinstance(si, bytes) else si)
+        except Exception as e:
+            print(f"Error parsing SI document: {e}")
+            return None
 
-                # Optionally rename to our naming convention
-                target_name = f"{company_name}_AD.pdf"
-                try:
-                    if downloaded_file != target_name and not os.path.exists(target_name):
-                        os.rename(downloaded_file, target_name)
-                        return target_name
-                except:
-                    pass
-                return downloaded_file
-
-            # Also check for .crdownload files (Chrome partial downloads)
-            all_files = set(os.listdir('.'))
-            partial_files = [f for f in all_files if f.endswith('.crdownload')]
-            if partial_files and i < timeout - 2:  # Still waiting for download to complete
-                if self.debug and i % 5 == 0:  # Print every 5 seconds
-                    print(
-                        f"Waiting for download to complete... ({i+1}/{timeout})")
-                continue
+        if sha256:
+            self.extraction_cache.put(sha256, 'SI', SI_PARSER_VERSION, extracted_data)
+        return extracted_data
 
-        # Final check for any PDF files that might match the company
-        all_pdfs = [f for f in os.listdir('.') if f.endswith('.pdf')]
-        for pdf_file in all_pdfs:
-            # Check if this might be our company's PDF (contains HRB number or similar pattern)
-            if 'HRB' in pdf_file and 'AD' in pdf_file:
-                file_time = os.path.getmtime(pdf_file)
-                current_time = time.time()
-                # If file was created in the last 30 seconds, likely our download
-                if current_time - file_time < 30:
-                    if self.debug:
-                        print(
-                            f"Found recent PDF file that might be ours: {pdf_file}")
-                    return pdf_file
+    def _extract_pdf_content(self, pdf, sha256=None):
+        """Extract text content from PDF bytes or a PDF file and parse company information.
 
-        return None
+        Results are cached by the PDF's SHA-256. Cached text is re-parsed
+        when only ``PDF_PARSER_VERSION`` changed.
+        """
+        entry = self.extraction_cache.get(sha256) if sha256 else None
+        if entry and entry['parser'] == 'PDF' and entry['parser_version'] == PDF_PARSER_VERSION:
+            if self.debug:
+                print(f"Using cached PDF extraction {sha256[:12]}")
+            return entry['extracted_data']
 
-    def _extract_pdf_content(self, pdf_path):
-        """Extract text content from PDF and parse company information."""
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-
-                # Extract text from all pages
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text()
+            text = entry.get('text') if entry and entry['parser'] == 'PDF' else None
+            if text is None:
+                if isinstance(pdf, bytes):
+                    text = self._extract_pdf_text(io.BytesIO(pdf))
+                else:
+                    with open(pdf, 'rb') as file:
+                        text = self._extract_pdf_text(file)
 
-                # Parse the extracted text into structured data
-                return self._parse_company_data(text)
+            # Parse the extracted text into structured data
+            extracted_data = self._parse_company_data(text)
 
         except Exception as e:
             print(f"Error extracting PDF content: {e}")
             return None
 
+        if sha256:
+            self.extraction_cache.put(sha256, 'PDF', PDF_PARSER_VERSION, extracted_data, text=text)
+        return extracted_data
+
+    def _extract_pdf_text(self, stream):
+        """Extract the text from all pages of a PDF stream."""
+        pdf_reader = PyPDF2.PdfReader(stream)
+        text = ""
+        for page in pdf_reader.pages:
+            text += page.extract_text()
+        return text
+
     def _parse_company_data(self, text):
         """Parse extracted PDF text into structured JSON data."""
         data = {}
@@ -0,0 +1,124 @@
+"""Token-bucket rate limiter shared across processes via a SQLite ledger."""
+
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+
+from config import (
+    RATE_LIMIT_DB_DIR,
+    RATE_LIMIT_DB_ENV,
+    RATE_LIMIT_DB_FILE,
+    RATE_LIMIT_PER_HOUR,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_BUCKET
+)
+
+
+class RateLimiter:
+    """Token bucket whose state lives in a SQLite database.
+
+    Every process on the host that uses the same ledger file draws from the
+    same bucket. ``BEGIN IMMEDIATE`` serialises the read-modify-write of the
+    bucket, so concurrent workers cannot overspend it. The bucket refills at
+    ``rate_per_hour`` and holds at most ``burst`` tokens.
+    """
+
+    def __init__(self, rate_per_hour=RATE_LIMIT_PER_HOUR, burst=RATE_LIMIT_BURST, db_path=None,
+                 bucket=RATE_LIMIT_BUCKET, debug=False, clock=time.time, sleep=time.sleep):
+        if rate_per_hour <= 0 or burst < 1:
+            raise ValueError("Rate limit needs a positive rate and a burst of at least 1")
+        self.rate_per_second = rate_per_hour / 3600.0
+        self.burst = burst
+        self.db_path = pathlib.Path(db_path or default_ledger_path())
+        self.bucket = bucket
+        self.debug = debug
+        self._clock = clock
+        self._sleep = sleep
+        self.calls = 0
+        self.total_wait = 0.0
+        self.last_wait = 0.0
+        self._stats_lock = threading.Lock()
+
+    def acquire(self, cost=1, reason=None):
+        """Block until ``cost`` tokens are available and take them.
+
+        Returns the number of seconds this call waited.
+        """
+        waited = 0.0
+        while True:
+            wait = self._try_acquire(cost)
+            if wait <= 0:
+                break
+            if self.debug:
+                print(f"Rate limit reached{f' ({reason})' if reason else ''}, waiting {wait:.1f}s")
+            self._sleep(wait)
+            waited += wait
+
+        with self._stats_lock:
+            self.calls += 1
+            self.total_wait += waited
+            self.last_wait = waited
+        return waited
+
+    def _try_acquire(self, cost):
+        """Take tokens if available, otherwise return the seconds until they are."""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=60, isolation_level=None)
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute("BEGIN IMMEDIATE")
+            now = self._clock()
+            row = conn.execute(
+                "SELECT tokens, updated FROM buckets WHERE name = ?", (self.bucket,)
+            ).fetchone()
+            if row is None:
+                tokens = float(self.burst)
+            else:
+                elapsed = max(0.0, now - row[1])
+                tokens = min(float(self.burst), row[0] + elapsed * self.rate_per_second)
+
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / self.rate_per_second
+
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (self.bucket, tokens, now)
+            )
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+
+def default_ledger_path():
+    """Return the ledger shared by the user's processes, whatever their working directory.
+
+    ``HANDELSREGISTER_RATE_LIMIT_DB`` overrides it, e.g. to share one
+    bucket between several users of the host.
+    """
+    override = os.environ.get(RATE_LIMIT_DB_ENV)
+    if override:
+        return pathlib.Path(override).expanduser()
+    return pathlib.Path(RATE_LIMIT_DB_DIR).expanduser() / RATE_LIMIT_DB_FILE
+
+
+def create_rate_limiter(args):
+    """Build the portal rate limiter from CLI arguments."""
+    return RateLimiter(
+        rate_per_hour=getattr(args, 'rate_limit', RATE_LIMIT_PER_HOUR),
+        burst=getattr(args, 'burst', RATE_LIMIT_BURST),
+        db_path=getattr(args, 'rate_limit_db', None),
+        debug=getattr(args, 'debug', False)
+    )
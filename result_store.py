@@ -0,0 +1,216 @@
+"""SQLite store of every company seen, indexed for lookups without the portal."""
+
+import json
+import pathlib
+import re
+import sqlite3
+import time
+
+from config import CACHE_DIR_NAME, RESULT_STORE_FILE, REGISTER_NUMBER_PATTERN
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS companies (
+    id INTEGER PRIMARY KEY,
+    register_key TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    court TEXT NOT NULL,
+    register_court TEXT,
+    register_type TEXT,
+    register_number TEXT,
+    state TEXT,
+    status TEXT,
+    documents TEXT,
+    extracted_data TEXT,
+    document_files TEXT,
+    query TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS companies_register ON companies (register_type, register_number);
+CREATE INDEX IF NOT EXISTS companies_register_court ON companies (register_court);
+CREATE INDEX IF NOT EXISTS companies_name ON companies (name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS companies_status ON companies (status);
+CREATE TABLE IF NOT EXISTS history (
+    company_id INTEGER NOT NULL REFERENCES companies (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT,
+    location TEXT,
+    PRIMARY KEY (company_id, position)
+);
+CREATE TABLE IF NOT EXISTS document_links (
+    company_id INTEGER NOT NULL REFERENCES companies (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    element_id TEXT,
+    onclick TEXT,
+    PRIMARY KEY (company_id, position)
+);
+"""
+
+
+def split_register(court):
+    """Split ``District court Berlin (Charlottenburg) HRB 44343`` into court, type and number.
+
+    Returns ``(court, None, None)`` when the text carries no register number.
+    """
+    match = re.match(REGISTER_NUMBER_PATTERN, court.strip(), re.IGNORECASE)
+    if not match:
+        return court.strip(), None, None
+    number = re.sub(r'\s+', ' ', match.group('number')).upper()
+    return match.group('court').strip(), match.group('type').upper(), number
+
+
+def parse_register(register):
+    """Parse a register reference such as ``HRB 44343`` into ``(type, number)``."""
+    _, register_type, register_number = split_register(f"- {register}")
+    if register_type is None:
+        raise ValueError(f"Not a register number: {register!r} (expected e.g. 'HRB 44343')")
+    return register_type, register_number
+
+
+def company_key(company):
+    """Key a company by register court and number, or by court text and name without a number."""
+    court = company.get('court', '')
+    register_court, register_type, register_number = split_register(court)
+    if register_number:
+        return f"{register_court}|{register_type}|{register_number}"
+    return f"{court}|{company.get('name', '')}"
+
+
+class ResultStore:
+    """Companies, their history, document links and extracted PDF data in SQLite.
+
+    Rows are keyed by court and register number, so repeated searches
+    update a company in place. Lookups by register type/number, court,
+    name or status are served from indexes.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = pathlib.Path(db_path or pathlib.Path(CACHE_DIR_NAME) / RESULT_STORE_FILE)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path), timeout=60)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def store(self, companies, query=None):
+        """Insert or update companies; returns the number stored."""
+        stored = 0
+        with self.conn:
+            for company in companies:
+                if company is None:
+                    continue
+                self._store_company(company, query)
+                stored += 1
+        return stored
+
+    def lookup(self, register=None, court=None, name=None, status=None):
+        """Return stored companies matching every given criterion.
+
+        ``register`` is a reference such as ``HRB 44343``; ``court`` and
+        ``name`` match case-insensitive substrings and ``status`` exactly.
+        """
+        clauses, params = [], []
+        if register:
+            register_type, register_number = parse_register(register)
+            clauses.append("register_type = ? AND register_number = ?")
+            params += [register_type, register_number]
+        if court:
+            clauses.append("register_court LIKE ?")
+            params.append(f"%{court}%")
+        if name:
+            clauses.append("name LIKE ?")
+            params.append(f"%{name}%")
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+
+        sql = "SELECT * FROM companies"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        rows = self.conn.execute(sql + " ORDER BY name", params).fetchall()
+        return [self._load_company(row) for row in rows]
+
+    def load_documents(self, company):
+        """Return the stored ``document_files`` and ``extracted_data`` of a company (empty if none)."""
+        row = self.conn.execute(
+            "SELECT extracted_data, document_files FROM companies WHERE register_key = ?",
+            (company_key(company),)).fetchone()
+        documents = {}
+        if row is not None and row['document_files']:
+            documents['document_files'] = json.loads(row['document_files'])
+            if row['extracted_data']:
+                documents['extracted_data'] = json.loads(row['extracted_data'])
+        return documents
+
+    def close(self):
+        self.conn.close()
+
+    def _store_company(self, company, query):
+        court = company.get('court', '')
+        name = company.get('name', '')
+        register_court, register_type, register_number = split_register(court)
+        register_key = company_key(company)
+
+        self.conn.execute(
+            "INSERT INTO companies (register_key, name, court, register_court, register_type, register_number, "
+            "state, status, documents, extracted_data, document_files, query, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (register_key) DO UPDATE SET name = excluded.name, court = excluded.court, "
+            "state = excluded.state, status = excluded.status, documents = excluded.documents, "
+            "extracted_data = COALESCE(excluded.extracted_data, companies.extracted_data), "
+            "document_files = COALESCE(excluded.document_files, companies.document_files), "
+            "query = excluded.query, updated_at = excluded.updated_at",
+            (register_key, name, court, register_court, register_type, register_number,
+             company.get('state', ''), company.get('status', ''), company.get('documents', ''),
+             _json_or_none(company.get('extracted_data')), _json_or_none(company.get('document_files')),
+             query, time.time())
+        )
+        company_id = self.conn.execute(
+            "SELECT id FROM companies WHERE register_key = ?", (register_key,)).fetchone()['id']
+
+        self.conn.execute("DELETE FROM history WHERE company_id = ?", (company_id,))
+        self.conn.executemany(
+            "INSERT INTO history (company_id, position, name, location) VALUES (?, ?, ?, ?)",
+            [(company_id, position, entry[0], entry[1])
+             for position, entry in enumerate(company.get('history', []))]
+        )
+        self.conn.execute("DELETE FROM document_links WHERE company_id = ?", (company_id,))
+        self.conn.executemany(
+            "INSERT INTO document_links (company_id, position, type, element_id, onclick) VALUES (?, ?, ?, ?, ?)",
+            [(company_id, position, link.get('type'), link.get('id'), link.get('onclick'))
+             for position, link in enumerate(company.get('document_links', []))]
+        )
+
+    def _load_company(self, row):
+        """Rebuild the parser's company dict from a stored row."""
+        company_id = row['id']
+        company = {
+            'court': row['court'],
+            'name': row['name'],
+            'state': row['state'],
+            'status': row['status'],
+            'documents': row['documents'],
+            'history': [tuple(entry) for entry in self.conn.execute(
+                "SELECT name, location FROM history WHERE company_id = ? ORDER BY position", (company_id,))],
+            'document_links': [
+                {'id': element_id, 'type': doc_type, 'onclick': onclick}
+                for doc_type, element_id, onclick in self.conn.execute(
+                    "SELECT type, element_id, onclick FROM document_links WHERE company_id = ? ORDER BY position",
+                    (company_id,))
+            ]
+        }
+        if row['extracted_data']:
+            company['extracted_data'] = json.loads(row['extracted_data'])
+        if row['document_files']:
+            company['document_files'] = json.loads(row['document_files'])
+        return company
+
+
+def _json_or_none(value):
+    return json.dumps(value, ensure_ascii=False) if value else None
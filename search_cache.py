@@ -0,0 +1,146 @@
+"""Content-addressed cache of search result pages."""
+
+import hashlib
+import json
+import pathlib
+import re
+import time
+
+from cache_utils import atomic_write, atomic_write_json
+from config import CACHE_DIR_NAME, SEARCH_CACHE_DIR, QUERY_TRANSLITERATIONS
+from html_parser import PARSER_VERSION
+from models import record_to_dict
+
+
+def normalize_query(search_term):
+    """Normalize a search term so trivially different spellings share a cache entry.
+
+    Case is folded, umlauts and ß are transliterated (``Müller`` and
+    ``Mueller`` are the same query) and whitespace is collapsed.
+    """
+    normalized = search_term.casefold()
+    for character, replacement in QUERY_TRANSLITERATIONS.items():
+        normalized = normalized.replace(character, replacement)
+    return re.sub(r'\s+', ' ', normalized).strip()
+
+
+def search_cache_key(search_term, options):
+    """Hash of the normalized query and every option that changes the results."""
+    payload = json.dumps({'query': normalize_query(search_term), 'options': options}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SearchCache:
+    """Stores results under the hash of the normalized query and options.
+
+    Every entry is a ``<key>.html`` file, the parsed companies in
+    ``<key>.records.json`` and a ``<key>.json`` metadata file (query,
+    options, fetch time, size and portal response time) written last. All
+    writes are atomic and the metadata file marks the entry as complete,
+    so an interrupted run never leaves a half entry behind.
+
+    Records carry the parser version that produced them. A hit costs one
+    JSON load; records from another parser version are re-derived from the
+    retained HTML on first use.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = pathlib.Path(cache_dir or pathlib.Path(CACHE_DIR_NAME) / SEARCH_CACHE_DIR)
+
+    def get(self, search_term, options, max_age=None):
+        """Return the metadata of a fresh entry, or None.
+
+        Entries older than ``max_age`` seconds count as missing.
+        """
+        key = search_cache_key(search_term, options)
+        metadata = self.metadata(key)
+        if metadata is None:
+            return None
+        if max_age is not None and time.time() - metadata['fetched_at'] > max_age:
+            return None
+        return metadata
+
+    def load_companies(self, key, parse_html):
+        """Return the cached companies of an entry, or None if it is gone.
+
+        ``parse_html`` turns the retained HTML into companies; it is only
+        called when the stored records are missing or from another parser
+        version, and its result replaces them.
+        """
+        try:
+            with open(self._records_file(key), "r", encoding="utf-8") as f:
+                records = json.load(f)
+            if records.get('parser_version') == PARSER_VERSION:
+                return records['companies']
+        except (OSError, ValueError, AttributeError):
+            pass
+
+        html = self.load_html(key)
+        if html is None:
+            return None
+        companies = parse_html(html)
+        self.store_companies(key, companies)
+        return companies
+
+    def load_html(self, key):
+        """Return the retained results HTML of an entry, or None."""
+        try:
+            with open(self._html_file(key), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, search_term, options, html, companies=None, response_seconds=None):
+        """Store results HTML with its parsed companies and return the entry's metadata.
+
+        ``html`` may be None when the companies were extracted in the
+        browser; such an entry is a miss once its records are outdated.
+        """
+        key = search_cache_key(search_term, options)
+        data = html.encode('utf-8') if html is not None else b''
+        metadata = {
+            'key': key,
+            'query': search_term,
+            'normalized_query': normalize_query(search_term),
+            'options': options,
+            'fetched_at': time.time(),
+            'bytes': len(data),
+            'response_seconds': response_seconds
+        }
+        if html is not None:
+            atomic_write(self._html_file(key), data)
+        else:
+            self._remove(self._html_file(key))
+        if companies is not None:
+            self.store_companies(key, companies)
+        atomic_write_json(self._metadata_file(key), metadata)
+        return metadata
+
+    def metadata(self, key):
+        """Return the metadata of an entry, or None if it does not exist."""
+        try:
+            with open(self._metadata_file(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store_companies(self, key, companies):
+        """Replace the parsed companies of an entry, e.g. after their documents were fetched."""
+        atomic_write(self._records_file(key), json.dumps(
+            {'parser_version': PARSER_VERSION, 'companies': companies},
+            ensure_ascii=False, separators=(',', ':'), default=record_to_dict))
+
+    def _remove(self, path):
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+    def _records_file(self, key):
+        return self.cache_dir / f"{key}.records.json"
+
+    def _html_file(self, key):
+        return self.cache_dir / f"{key}.html"
+
+    def _metadata_file(self, key):
+        return self.cache_dir / f"{key}.json"
@@ -0,0 +1,47 @@
+"""Persisted cache of the form selectors that last matched on the portal."""
+
+import json
+import pathlib
+
+from cache_utils import atomic_write_json
+from config import CACHE_DIR_NAME, SELECTOR_CACHE_FILE
+
+
+class SelectorCache:
+    """Remembers the winning CSS selector per form element.
+
+    Keys are logical element names (``search_field``, ``search_option``,
+    ``submit_button``). Entries are tried first on later runs and dropped
+    as soon as they stop matching.
+    """
+
+    def __init__(self, cache_file=None):
+        self.cache_file = pathlib.Path(
+            cache_file or pathlib.Path(CACHE_DIR_NAME) / SELECTOR_CACHE_FILE)
+        self._entries = self._load()
+
+    def get(self, key):
+        """Return the learned selector for ``key`` or None."""
+        return self._entries.get(key)
+
+    def remember(self, key, selector):
+        """Store the selector that matched for ``key``."""
+        if self._entries.get(key) == selector:
+            return
+        self._entries[key] = selector
+        self._save()
+
+    def invalidate(self, key):
+        """Forget the selector for ``key`` after it failed to match."""
+        if self._entries.pop(key, None) is not None:
+            self._save()
+
+    def _load(self):
+        try:
+            with open(self.cache_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        atomic_write_json(self.cache_file, self._entries)
@@ -0,0 +1,164 @@
+"""Streaming parser for SI documents (structured register content, XJustiz XML)."""
+
+import io
+import re
+import xml.etree.ElementTree as ET
+
+from config import (
+    SI_NAMESPACE,
+    SI_ROOT_ELEMENT_PREFIX,
+    SI_FIELD_PATHS,
+    SI_PARTICIPANT_PATHS,
+    SI_COMPANY_ROLES,
+    SI_MANAGEMENT_ROLES,
+    SI_PROKURA_ROLES
+)
+
+# Bump whenever parse_si_document() output changes
+SI_PARSER_VERSION = 1
+
+ISO_DATE_PATTERN = re.compile(r'^(\d{4})-(\d{2})-(\d{2})')
+
+
+def parse_si_document(source):
+    """Parse an SI document into the ``extracted_data`` layout of the AD PDF parser.
+
+    ``source`` is a file name or a binary file object. The document is read
+    with ``iterparse`` and every element is cleared and removed from its
+    parent once handled, so the tree never holds more than the currently
+    open elements and memory stays flat however many participants and
+    entries it lists. Elements are
+    matched by local name, which keeps the parser independent of the XJustiz
+    namespace version.
+    """
+    fields = {}
+    participants = []
+    participant = None
+    path = []
+    open_elements = []
+
+    for event, element in ET.iterparse(source, events=('start', 'end')):
+        name = _local_name(element.tag)
+        if event == 'start':
+            path.append(name)
+            open_elements.append(element)
+            if name == 'beteiligung':
+                participant = {}
+            continue
+
+        text = (element.text or '').strip()
+        if text:
+            target, paths = (participant, SI_PARTICIPANT_PATHS) if participant is not None \
+                else (fields, SI_FIELD_PATHS)
+            for key, patterns in paths.items():
+                if key not in target and any(_path_matches(path, pattern) for pattern in patterns):
+                    target[key] = text
+
+        if name == 'beteiligung' and participant is not None:
+            participants.append(participant)
+            participant = None
+        path.pop()
+        open_elements.pop()
+        element.clear()
+        if open_elements:
+            # Finished children are removed right away, so this is the only one
+            open_elements[-1].remove(element)
+
+    return _build_extracted_data(fields, participants)
+
+
+def is_si_document(content):
+    """Tell whether XML bytes are an SI document, judged by the root element.
+
+    Other XML the portal sends, such as the JSF ``<partial-response>`` of an
+    AJAX postback, is rejected. Only the root element is read.
+    """
+    try:
+        for _, element in ET.iterparse(io.BytesIO(content), events=('start',)):
+            namespace = element.tag[1:].split('}', 1)[0] if element.tag.startswith('{') else ''
+            return namespace == SI_NAMESPACE and _local_name(element.tag).startswith(SI_ROOT_ELEMENT_PREFIX)
+    except ET.ParseError:
+        return False
+    return False
+
+
+def _build_extracted_data(fields, participants):
+    """Map the collected element texts onto the AD ``extracted_data`` keys."""
+    data = {}
+
+    register_type = fields.get('register_type', '')
+    register_number = fields.get('register_number', '')
+    if register_number:
+        data['company_number'] = register_number if register_number.startswith(register_type) \
+            else f"{register_type} {register_number}".strip()
+
+    if fields.get('number_of_entries', '').isdigit():
+        data['number_of_entries'] = int(fields['number_of_entries'])
+
+    for participant in participants:
+        role = participant.get('role', '')
+        if any(company_role in role for company_role in SI_COMPANY_ROLES) and 'company_name' not in data:
+            if participant.get('organisation'):
+                data['company_name'] = participant['organisation']
+            if participant.get('seat'):
+                data['location'] = participant['seat']
+            address = _format_address(participant)
+            if address:
+                data['business_address'] = address
+        elif any(management_role in role for management_role in SI_MANAGEMENT_ROLES):
+            data.setdefault('management', []).append(_format_person(participant))
+        elif any(prokura_role in role for prokura_role in SI_PROKURA_ROLES):
+            data.setdefault('prokura', []).append(_format_person(participant))
+
+    if fields.get('business_purpose'):
+        data['business_purpose'] = fields['business_purpose']
+    if fields.get('capital'):
+        data['capital'] = f"{fields['capital']} {fields.get('currency', '')}".strip()
+    if fields.get('representation_rules'):
+        data['representation_rules'] = re.sub(r'\s+', ' ', fields['representation_rules'])
+    if fields.get('legal_form'):
+        data['legal_form'] = fields['legal_form']
+    if fields.get('founding_date'):
+        data['founding_date'] = _format_date(fields['founding_date'])
+    if fields.get('last_entry_date'):
+        data['last_entry_date'] = _format_date(fields['last_entry_date'])
+
+    return data
+
+
+def _format_person(participant):
+    """Format a natural person like the AD parser: ``Last, First`` plus location and birth date."""
+    name = ", ".join(part for part in (participant.get('last_name'), participant.get('first_name')) if part)
+    return {
+        'name': name or participant.get('organisation', ''),
+        'location': participant.get('residence') or participant.get('city', ''),
+        'birth_date': _format_date(participant.get('birth_date', ''))
+    }
+
+
+def _format_address(participant):
+    """Format ``Street No, ZIP City`` from the participant's address parts."""
+    street = " ".join(part for part in (participant.get('street'), participant.get('house_number')) if part)
+    city = " ".join(part for part in (participant.get('zip'), participant.get('city')) if part)
+    return ", ".join(part for part in (street, city) if part)
+
+
+def _format_date(value):
+    """Convert ISO dates to the ``DD.MM.YYYY`` form used in AD documents."""
+    match = ISO_DATE_PATTERN.match(value)
+    return f"{match.group(3)}.{match.group(2)}.{match.group(1)}" if match else value
+
+
+def _path_matches(path, pattern):
+    """True if ``pattern`` ends at the current element and its names appear in order in ``path``."""
+    if path[-1] != pattern[-1]:
+        return False
+    position = 0
+    for name in path[:-1]:
+        if position < len(pattern) - 1 and name == pattern[position]:
+            position += 1
+    return position == len(pattern) - 1
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
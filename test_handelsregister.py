@@ -1,14 +1,21 @@
 import pytest
 import os
 import json
+import pathlib
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs
 from html_parser import get_companies_in_searchresults
 from handelsregister_core import HandelsRegisterSelenium
 import argparse
 
 
+# simplified html from a real search
+GASAG_RESULT_HTML = '<html><body>%s</body></html>' % """<table role="grid"><thead></thead><tbody id="ergebnissForm:selectedSuchErgebnisFormTable_data" class="ui-datatable-data ui-widget-content"><tr data-ri="0" class="ui-widget-content ui-datatable-even" role="row"><td role="gridcell" colspan="9" class="borderBottom3"><table id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt147" class="ui-panelgrid ui-widget" role="grid"><tbody><tr class="ui-widget-content ui-panelgrid-even borderBottom1" role="row"><td role="gridcell" class="ui-panelgrid-cell fontTableNameSize" colspan="5">Berlin  <span class="fontWeightBold"> District court Berlin (Charlottenburg) HRB 44343  </span></td></tr><tr class="ui-widget-content ui-panelgrid-odd" role="row"><td role="gridcell" class="ui-panelgrid-cell paddingBottom20Px" colspan="5"><span class="marginLeft20">GASAG AG</span></td><td role="gridcell" class="ui-panelgrid-cell sitzSuchErgebnisse"><span class="verticalText ">Berlin</span></td><td role="gridcell" class="ui-panelgrid-cell" style="text-align: center;padding-bottom: 20px;"><span class="verticalText">currently registered</span></td><td role="gridcell" class="ui-panelgrid-cell textAlignLeft paddingBottom20Px" colspan="2"><div id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt160" class="ui-outputpanel ui-widget linksPanel"><script type="text/javascript" src="/rp_web/javax.faces.resource/jsf.js.xhtml?ln=javax.faces"></script><a id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:0:fade" href="#" class="dokumentList" aria-describedby="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:0:toolTipFade"><span id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:0:popupLink" class="underlinedText">AD</span></a><a id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:1:fade" href="#" class="dokumentList" aria-describedby="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:1:toolTipFade"><span id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:1:popupLink" class="underlinedText">CD</span></a><a id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:2:fade" href="#" class="dokumentList" aria-describedby="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:2:toolTipFade"><span id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:2:popupLink" class="underlinedText">HD</span></a><a id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:3:fade" href="#" class="dokumentList" aria-describedby="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:3:toolTipFade"><span id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:3:popupLink" class="underlinedText">DK</span></a><a id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:4:fade" href="#" class="dokumentList" aria-describedby="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:4:toolTipFade"><span id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:4:popupLink" class="underlinedText">UT</span></a><a id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:5:fade" href="#" class="dokumentList" aria-describedby="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:5:toolTipFade"><span id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:5:popupLink" class="underlinedText">VÖ</span></a><a id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:6:fade" href="#" class="dokumentList" aria-describedby="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:6:toolTipFade"><span id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:6:popupLink" class="underlinedText">SI</span></a></div></td></tr><tr class="ui-widget-content ui-panelgrid-even" role="row"><td role="gridcell" class="ui-panelgrid-cell" colspan="7"><table id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt172" class="ui-panelgrid ui-widget marginLeft20" role="grid"><tbody><tr class="ui-widget-content ui-panelgrid-even borderBottom1 RegPortErg_Klein" role="row"><td role="gridcell" class="ui-panelgrid-cell padding0Px">History</td></tr></tbody></table><table id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt176" class="ui-panelgrid ui-widget" role="grid"><tbody><tr class="ui-widget-content" role="row"><td role="gridcell" class="ui-panelgrid-cell RegPortErg_HistorieZn marginLeft20 padding0Px" colspan="5"><span class="marginLeft20 fontSize85">1.) Gasag Berliner Gaswerke Aktiengesellschaft</span></td><td role="gridcell" class="ui-panelgrid-cell RegPortErg_SitzStatus "><span class="fontSize85">1.) Berlin</span></td><td role="gridcell" class="ui-panelgrid-cell textAlignCenter"></td></tr></tbody></table></td></tr></tbody></table></td></tr></tbody></table>"""
+
+
 def test_parse_search_result():
-    # simplified html from a real search
-    html = '<html><body>%s</body></html>' % """<table role="grid"><thead></thead><tbody id="ergebnissForm:selectedSuchErgebnisFormTable_data" class="ui-datatable-data ui-widget-content"><tr data-ri="0" class="ui-widget-content ui-datatable-even" role="row"><td role="gridcell" colspan="9" class="borderBottom3"><table id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt147" class="ui-panelgrid ui-widget" role="grid"><tbody><tr class="ui-widget-content ui-panelgrid-even borderBottom1" role="row"><td role="gridcell" class="ui-panelgrid-cell fontTableNameSize" colspan="5">Berlin  <span class="fontWeightBold"> District court Berlin (Charlottenburg) HRB 44343  </span></td></tr><tr class="ui-widget-content ui-panelgrid-odd" role="row"><td role="gridcell" class="ui-panelgrid-cell paddingBottom20Px" colspan="5"><span class="marginLeft20">GASAG AG</span></td><td role="gridcell" class="ui-panelgrid-cell sitzSuchErgebnisse"><span class="verticalText ">Berlin</span></td><td role="gridcell" class="ui-panelgrid-cell" style="text-align: center;padding-bottom: 20px;"><span class="verticalText">currently registered</span></td><td role="gridcell" class="ui-panelgrid-cell textAlignLeft paddingBottom20Px" colspan="2"><div id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt160" class="ui-outputpanel ui-widget linksPanel"><script type="text/javascript" src="/rp_web/javax.faces.resource/jsf.js.xhtml?ln=javax.faces"></script><a id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:0:fade" href="#" class="dokumentList" aria-describedby="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:0:toolTipFade"><span id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:0:popupLink" class="underlinedText">AD</span></a><a id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:1:fade" href="#" class="dokumentList" aria-describedby="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:1:toolTipFade"><span id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:1:popupLink" class="underlinedText">CD</span></a><a id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:2:fade" href="#" class="dokumentList" aria-describedby="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:2:toolTipFade"><span id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:2:popupLink" class="underlinedText">HD</span></a><a id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:3:fade" href="#" class="dokumentList" aria-describedby="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:3:toolTipFade"><span id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:3:popupLink" class="underlinedText">DK</span></a><a id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:4:fade" href="#" class="dokumentList" aria-describedby="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:4:toolTipFade"><span id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:4:popupLink" class="underlinedText">UT</span></a><a id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:5:fade" href="#" class="dokumentList" aria-describedby="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:5:toolTipFade"><span id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:5:popupLink" class="underlinedText">VÖ</span></a><a id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:6:fade" href="#" class="dokumentList" aria-describedby="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:6:toolTipFade"><span id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:6:popupLink" class="underlinedText">SI</span></a></div></td></tr><tr class="ui-widget-content ui-panelgrid-even" role="row"><td role="gridcell" class="ui-panelgrid-cell" colspan="7"><table id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt172" class="ui-panelgrid ui-widget marginLeft20" role="grid"><tbody><tr class="ui-widget-content ui-panelgrid-even borderBottom1 RegPortErg_Klein" role="row"><td role="gridcell" class="ui-panelgrid-cell padding0Px">History</td></tr></tbody></table><table id="ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt176" class="ui-panelgrid ui-widget" role="grid"><tbody><tr class="ui-widget-content" role="row"><td role="gridcell" class="ui-panelgrid-cell RegPortErg_HistorieZn marginLeft20 padding0Px" colspan="5"><span class="marginLeft20 fontSize85">1.) Gasag Berliner Gaswerke Aktiengesellschaft</span></td><td role="gridcell" class="ui-panelgrid-cell RegPortErg_SitzStatus "><span class="fontSize85">1.) Berlin</span></td><td role="gridcell" class="ui-panelgrid-cell textAlignCenter"></td></tr></tbody></table></td></tr></tbody></table></td></tr></tbody></table>"""
+    html = GASAG_RESULT_HTML
     res = get_companies_in_searchresults(html)
     assert res == [{
         'court': 'Berlin   District court Berlin (Charlottenburg) HRB 44343',
@@ -114,3 +121,1240 @@ def test_pdf_download_european_epc():
                 print(f"Cleaned up: {pdf_file}")
             except:
                 pass
+
+
+class FakeAutomation:
+    """Stand-in for WebAutomation that never launches a browser."""
+
+    def __init__(self):
+        self.driver = None
+        self.closed = False
+        self.on_advanced_search = False
+
+    def setup_driver(self):
+        self.driver = object()
+
+    def open_startpage(self):
+        self.on_advanced_search = False
+
+    def navigate_to_advanced_search(self):
+        self.on_advanced_search = True
+        return True
+
+    def is_on_advanced_search(self):
+        return self.on_advanced_search
+
+    def close_driver(self):
+        self.closed = True
+
+
+def test_driver_pool_reuses_and_recycles():
+    from driver_pool import DriverPool
+
+    created = []
+
+    def factory():
+        created.append(FakeAutomation())
+        return created[-1]
+
+    with DriverPool(size=1, max_uses=2, automation_factory=factory) as pool:
+        first = pool.checkout()
+        assert first.is_on_advanced_search()
+        first.on_advanced_search = False  # borrower left the results page open
+        pool.checkin(first)
+
+        with pool.borrow() as second:
+            assert second is first
+            assert second.is_on_advanced_search()
+
+        # Recycled after max_uses, so the next checkout starts a fresh driver
+        assert first.closed
+        third = pool.checkout()
+        assert third is not first
+        pool.checkin(third)
+
+    assert len(created) == 2
+    assert created[1].closed
+
+
+def test_driver_pool_reserves_slots_before_starting_drivers():
+    from driver_pool import DriverPool
+
+    starting = threading.Event()
+    release = threading.Event()
+    created = []
+
+    class SlowAutomation(FakeAutomation):
+        def setup_driver(self):
+            starting.set()
+            release.wait(5)
+            super().setup_driver()
+
+    def factory():
+        created.append(SlowAutomation())
+        return created[-1]
+
+    pool = DriverPool(size=1, automation_factory=factory)
+    first = []
+    thread = threading.Thread(target=lambda: first.append(pool.checkout()))
+    thread.start()
+    starting.wait(5)
+    # The only slot is taken while its driver is still starting
+    with pytest.raises(RuntimeError, match="No pooled driver"):
+        pool.checkout(timeout=0.05)
+    release.set()
+    thread.join()
+    assert len(created) == 1
+    pool.checkin(first[0], failed=True)
+
+    # A driver that cannot be started frees its slot again
+    def failing_factory():
+        raise RuntimeError("Chrome did not start")
+
+    pool._automation_factory = failing_factory
+    with pytest.raises(RuntimeError, match="Chrome did not start"):
+        pool.checkout()
+    assert pool._started == 0
+
+
+def test_chromedriver_resolver_uses_cache_and_pinned_path(tmp_path, monkeypatch):
+    import driver_resolver
+    from driver_resolver import ChromedriverResolver
+
+    pinned = tmp_path / "chromedriver"
+    pinned.write_text("")
+    cache_file = tmp_path / "chromedriver.json"
+    monkeypatch.setenv("CHROMEDRIVER_PATH", str(pinned))
+    monkeypatch.setattr(driver_resolver, "detect_chrome_version", lambda: "120.0.6099.109")
+
+    # Offline without a cache entry falls back to the pinned driver
+    assert ChromedriverResolver(offline=True, cache_file=cache_file).resolve() == str(pinned)
+
+    # A cached entry for the current Chrome version skips webdriver-manager entirely
+    cached = tmp_path / "cached-chromedriver"
+    cached.write_text("")
+    cache_file.write_text(json.dumps({"120.0.6099.109": str(cached)}))
+    assert ChromedriverResolver(cache_file=cache_file).resolve() == str(cached)
+
+
+def test_chrome_version_is_found_at_standard_install_locations(tmp_path, monkeypatch):
+    import driver_resolver
+
+    # Windows: chrome.exe is not asked (it would open a window); its version directories are read
+    application = tmp_path / "Google" / "Chrome" / "Application"
+    for name in ("119.0.6045.200", "120.0.6099.109", "SetupMetrics"):
+        (application / name).mkdir(parents=True)
+    (application / "chrome.exe").write_text("")
+    monkeypatch.setenv("FAKE_PROGRAM_FILES", str(tmp_path))
+    monkeypatch.setattr(driver_resolver, "CHROME_BINARY_CANDIDATES", [])
+    monkeypatch.setattr(driver_resolver, "CHROME_INSTALL_LOCATIONS", [
+        str(tmp_path / "missing" / "Google Chrome"),
+        os.path.join("$FAKE_PROGRAM_FILES", "Google", "Chrome", "Application", "chrome.exe")])
+    assert driver_resolver.detect_chrome_version() == "120.0.6099.109"
+
+    # macOS: the app bundle's binary reports its version
+    mac_binary = tmp_path / "Google Chrome"
+    mac_binary.write_text("#!/bin/sh\necho 'Google Chrome 121.0.6167.85'\n")
+    mac_binary.chmod(0o755)
+    monkeypatch.setattr(driver_resolver, "CHROME_INSTALL_LOCATIONS", [str(mac_binary)])
+    if os.name == "posix":
+        assert driver_resolver.detect_chrome_version() == "121.0.6167.85"
+
+
+def test_page_readiness_records_waits_and_network_idle():
+    from page_readiness import PageReadiness
+
+    class FakeDriver:
+        def __init__(self):
+            self.logs = [
+                {'message': json.dumps({'message': {
+                    'method': 'Network.requestWillBeSent', 'params': {'requestId': '1'}}})},
+                {'message': json.dumps({'message': {
+                    'method': 'Network.loadingFinished', 'params': {'requestId': '1'}}})},
+            ]
+
+        def get_log(self, log_type):
+            logs, self.logs = self.logs, []
+            return logs
+
+        def execute_script(self, script, *args):
+            return True if 'readyState' not in script else 'complete'
+
+    readiness = PageReadiness(FakeDriver(), timeout=2, poll_interval=0.01, network_idle_window=0.05)
+    assert readiness.wait_for_page_ready()
+    assert [t['signal'] for t in readiness.timings] == ['document_ready', 'ajax_idle', 'network_idle']
+    assert all(t['seconds'] < 2 for t in readiness.timings)
+
+    assert not readiness.wait_for('never', lambda: False, timeout=0.05)
+    assert readiness.timings[-1]['satisfied'] is False
+
+
+def test_learned_selector_is_tried_first_and_invalidated_on_miss(tmp_path):
+    from selector_cache import SelectorCache
+    from web_automation import WebAutomation, SEARCH_FIELD_CANDIDATES
+
+    class FakeDriver:
+        def __init__(self, present):
+            self.present = present
+            self.probes = []
+
+        def execute_script(self, script, selectors, clickable):
+            self.probes.append(list(selectors))
+            for index, selector in enumerate(selectors):
+                if selector in self.present:
+                    return [index, f"element:{selector}"]
+            return None
+
+    automation = WebAutomation()
+    automation.selector_cache = SelectorCache(tmp_path / "selectors.json")
+    automation.driver = FakeDriver({"textarea[name='form:schlagwoerter']"})
+
+    # First run resolves every candidate in one probe and persists the winner
+    element, selector = automation._find_with_learned_selector('search_field', SEARCH_FIELD_CANDIDATES)
+    assert selector == "textarea[name='form:schlagwoerter']"
+    assert len(automation.driver.probes) == 1
+    assert SelectorCache(tmp_path / "selectors.json").get('search_field') == selector
+
+    # Later runs try only the learned selector
+    automation.driver.probes.clear()
+    automation._find_with_learned_selector('search_field', SEARCH_FIELD_CANDIDATES)
+    assert automation.driver.probes == [[selector]]
+
+    # A stale entry is invalidated and the combined probe picks the new winner
+    automation.driver = FakeDriver({"[id='search']"})
+    element, selector = automation._find_with_learned_selector('search_field', SEARCH_FIELD_CANDIDATES)
+    assert selector == "[id='search']"
+    assert SelectorCache(tmp_path / "selectors.json").get('search_field') == "[id='search']"
+
+
+FIXTURE_DIR = pathlib.Path(__file__).parent / "fixtures" / "portal"
+STAND_IN_PDF = b"%PDF-1.4\n" + b"0" * 200000
+
+
+class StandInPortalHandler(BaseHTTPRequestHandler):
+    """Replays recorded portal pages and enforces the JSF session protocol.
+
+    With ``row_count`` set, the results page announces that many rows and
+    paginator postbacks return copies of its row, one per page.
+    """
+
+    posted = []
+    row_count = None
+    table_id = "ergebnissForm:selectedSuchErgebnisFormTable"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/":
+            self._redirect("/rp_web/welcome.xhtml", cookie="JSESSIONID=stand-in")
+        elif self.path == "/rp_web/welcome.xhtml":
+            self._page("welcome.xhtml", "vs-1")
+        elif self.path == "/rp_web/erweitertesuche.xhtml?cid=2" and self._has_session():
+            self._page("erweitertesuche.xhtml", "vs-2")
+        elif self.path == "/rp_web/document.pdf" and self._has_session():
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(STAND_IN_PDF)))
+            self.end_headers()
+            self.wfile.write(STAND_IN_PDF)
+        else:
+            self.send_error(400)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode("utf-8"), keep_blank_values=True)
+        self.posted.append((self.path, form))
+        view_state = form.get("javax.faces.ViewState", [None])[0]
+
+        if not self._has_session():
+            self.send_error(400)
+        elif self.path == "/rp_web/welcome.xhtml" and view_state == "vs-1" \
+                and "naviForm:erweiterteSucheLink" in form:
+            self._redirect("/rp_web/erweitertesuche.xhtml?cid=2")
+        elif self.path == "/rp_web/erweitertesuche.xhtml?cid=2" and view_state == "vs-2" \
+                and "form:btnSuche" in form:
+            self._page("sucheErgebnisse.xhtml", "vs-3")
+        elif self.path == "/rp_web/sucheErgebnisse/welcome.xhtml?cid=2" and view_state \
+                and self.headers.get("Faces-Request") == "partial/ajax" \
+                and form.get(f"{self.table_id}_pagination") == ["true"]:
+            self._results_rows(int(form[f"{self.table_id}_first"][0]), int(view_state[3:]))
+        else:
+            self.send_error(400)
+
+    def _results_rows(self, first, view_state):
+        html = (FIXTURE_DIR / "sucheErgebnisse.xhtml").read_text(encoding="utf-8")
+        row = html[html.index('<tr data-ri="0"'):html.rindex('</tbody></table></div>')]
+        row = row.replace('data-ri="0"', f'data-ri="{first}"').replace('>GASAG AG<', f'>GASAG AG {first}<')
+        body = (f'<?xml version="1.0" encoding="UTF-8"?><partial-response><changes>'
+                f'<update id="{self.table_id}"><![CDATA[{row}]]></update>'
+                f'<update id="j_id1:javax.faces.ViewState:0"><![CDATA[vs-{view_state + 1}]]></update>'
+                f'</changes></partial-response>').encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _has_session(self):
+        return "JSESSIONID=stand-in" in self.headers.get("Cookie", "")
+
+    def _redirect(self, location, cookie=None):
+        self.send_response(302)
+        self.send_header("Location", location)
+        if cookie:
+            self.send_header("Set-Cookie", f"{cookie}; Path=/")
+        self.end_headers()
+
+    def _page(self, name, view_state):
+        body = (FIXTURE_DIR / name).read_text(encoding="utf-8")
+        body = body.replace("{view_state}", view_state).replace("{cid}", "2")
+        if name == "sucheErgebnisse.xhtml" and self.row_count:
+            widget = (f'<script>PrimeFaces.cw("DataTable","widget_results",{{id:"{self.table_id}",'
+                      f'paginator:{{rows:1,rowCount:{self.row_count},page:0}}}});</script>')
+            body = body.replace("</form>", widget + "</form>")
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def stand_in_portal():
+    server = HTTPServer(("127.0.0.1", 0), StandInPortalHandler)
+    StandInPortalHandler.posted = []
+    StandInPortalHandler.row_count = None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_http_backend_replays_jsf_flow(stand_in_portal, tmp_path):
+    from http_backend import JSFHttpClient
+    from rate_limiter import RateLimiter
+
+    limiter = RateLimiter(rate_per_hour=3600, burst=10, db_path=tmp_path / "rate.sqlite")
+    client = JSFHttpClient(base_url=stand_in_portal, rate_limiter=limiter)
+    pages = client.search("gasag", "exact")
+    client.close()
+
+    assert len(pages) == 1
+    companies = get_companies_in_searchresults(pages[0])
+    assert [c['name'] for c in companies] == ['GASAG AG']
+    assert client.view_state == "vs-3"
+    assert limiter.calls == 3
+
+    path, form = StandInPortalHandler.posted[-1]
+    assert form["form:schlagwoerter"] == ["gasag"]
+    assert form["form:schlagwortOptionen"] == ["3"]
+    assert form["form:ergebnisseProSeite_input"] == ["100"]
+
+
+def test_network_monitor_counts_bytes_and_blocked_requests():
+    from page_readiness import NetworkMonitor
+
+    def event(method, **params):
+        return {'message': json.dumps({'message': {'method': method, 'params': params}})}
+
+    class FakeDriver:
+        logs = [
+            event('Network.requestWillBeSent', requestId='1'),
+            event('Network.requestWillBeSent', requestId='2'),
+            event('Network.loadingFinished', requestId='1', encodedDataLength=2048),
+            event('Network.loadingFailed', requestId='2', blockedReason='inspector'),
+        ]
+
+        def get_log(self, log_type):
+            return self.logs
+
+    monitor = NetworkMonitor(FakeDriver())
+    monitor.poll()
+    assert (monitor.bytes_received, monitor.requests_sent, monitor.requests_blocked) == (2048, 2, 1)
+    assert monitor.is_idle(0, since=0)
+
+
+def test_network_monitor_keeps_only_recent_document_responses():
+    from config import DOCUMENT_RESPONSE_LIMIT
+    from page_readiness import NetworkMonitor
+
+    def event(method, **params):
+        return {'message': json.dumps({'message': {'method': method, 'params': params}})}
+
+    class FakeDriver:
+        logs = []
+
+        def get_log(self, log_type):
+            logs, self.logs = self.logs, []
+            return logs
+
+    driver = FakeDriver()
+    monitor = NetworkMonitor(driver)
+    # Document responses nobody takes, e.g. a long run without --download-pdfs
+    for i in range(DOCUMENT_RESPONSE_LIMIT * 3):
+        driver.logs = [
+            event('Network.responseReceived', requestId=str(i),
+                  response={'url': f'https://portal/{i}.pdf', 'mimeType': 'application/pdf'}),
+            event('Network.loadingFinished', requestId=str(i), encodedDataLength=1),
+        ]
+        monitor.poll()
+    assert len(monitor.document_responses) == DOCUMENT_RESPONSE_LIMIT
+
+    finished = monitor.take_document_responses()
+    assert finished[-1]['url'] == f'https://portal/{DOCUMENT_RESPONSE_LIMIT * 3 - 1}.pdf'
+    assert not monitor.document_responses
+
+
+def test_http_backend_walks_later_results_pages(stand_in_portal, tmp_path, capsys, monkeypatch):
+    from html_parser import ResultMerger
+    from http_backend import JSFHttpClient
+    from rate_limiter import RateLimiter
+
+    StandInPortalHandler.row_count = 3
+    limiter = RateLimiter(rate_per_hour=3600, burst=20, db_path=tmp_path / "rate.sqlite")
+    client = JSFHttpClient(base_url=stand_in_portal, rate_limiter=limiter)
+    merger = ResultMerger()
+    pages = client.search("gasag", "exact", lambda page: bool(merger.add_page(page)))
+
+    assert len(pages) == 3 and limiter.calls == 5
+    assert [c['name'] for c in merger.companies] == ['GASAG AG', 'GASAG AG 1', 'GASAG AG 2']
+    assert client.view_state == "vs-5"
+    path, form = StandInPortalHandler.posted[-1]
+    assert form["ergebnissForm:selectedSuchErgebnisFormTable_first"] == ["2"]
+    assert form["ergebnissForm:selectedSuchErgebnisFormTable_rows"] == ["1"]
+    assert "Warning" not in capsys.readouterr().out
+
+    # Stopping early is not a shortfall
+    StandInPortalHandler.row_count = 5
+    client = JSFHttpClient(base_url=stand_in_portal, rate_limiter=limiter)
+    seen = []
+    assert len(client.search("gasag", "exact", lambda page: len(seen.append(page) or seen) < 2)) == 2
+    assert "Warning" not in capsys.readouterr().out
+
+    # Rows the portal announces but does not return are reported
+    client = JSFHttpClient(base_url=stand_in_portal, rate_limiter=limiter)
+    fetch = client.fetch_results_page
+    monkeypatch.setattr(client, "fetch_results_page", lambda table, first, rows: (
+        fetch(table, first, rows) if first < 3 else '<table role="grid"><tbody></tbody></table>'))
+    assert len(client.search("gasag", "exact")) == 3
+    assert "only 3 of 5 results" in capsys.readouterr().out
+
+
+def test_batch_reads_queries_and_streams_json_lines(tmp_path, monkeypatch):
+    import io
+    import batch
+
+    text_file = tmp_path / "queries.txt"
+    text_file.write_text("GASAG AG\n\n# comment\nEuropean EPC\n", encoding="utf-8")
+    assert list(batch.read_batch_queries(text_file)) == [("GASAG AG", "all"), ("European EPC", "all")]
+
+    csv_file = tmp_path / "queries.csv"
+    csv_file.write_text("name,option\nGASAG AG,exact\nBroken,bogus\n", encoding="utf-8")
+    assert list(batch.read_batch_queries(csv_file, "min")) == [("GASAG AG", "exact"), ("Broken", "min")]
+
+    class FakeSearch:
+        def __init__(self, args, pool=None):
+            self.args = args
+
+        def search_company(self, on_companies=None):
+            first_page = [{'name': self.args.schlagwoerter, 'court': 'Berlin', 'history': []}]
+            on_companies(first_page)
+            # The first page is on the stream before the query goes on
+            assert json.loads(out.getvalue().splitlines()[-1])['basic_info']['name'] == self.args.schlagwoerter
+            if self.args.schlagwoerter == "Broken":
+                raise RuntimeError("portal error")
+            print("status output goes to stderr")
+            return first_page
+
+    monkeypatch.setattr(batch, "HandelsRegisterSelenium", FakeSearch)
+    args = argparse.Namespace(debug=False, force=False, schlagwoerter=None, schlagwortOptionen='all',
+                              download_pdfs=False, backend='http', batch=str(csv_file))
+    out = io.StringIO()
+    succeeded, failed = batch.BatchRunner(args, out).run(batch.read_batch_queries(csv_file))
+
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert (succeeded, failed) == (1, 1)
+    assert len(lines) == 3
+    assert lines[0]['query'] == "GASAG AG" and lines[0]['basic_info']['name'] == "GASAG AG"
+    assert lines[2] == {'query': "Broken", 'schlagwortOptionen': 'all', 'error': 'portal error'}
+
+
+def test_batch_journal_resumes_and_retries_failed(tmp_path):
+    from batch import BatchJournal
+
+    queries = [("A", "all"), ("B", "all"), ("C", "all")]
+    journal = BatchJournal(tmp_path / "journal.jsonl")
+    journal.record("A", "all", BatchJournal.DONE)
+    journal.record("B", "all", BatchJournal.FAILED, "timeout")
+    with open(tmp_path / "journal.jsonl", "a") as f:
+        f.write('{"query": "C", "schlag')  # torn write from a crash
+
+    resumed = BatchJournal(tmp_path / "journal.jsonl")
+    assert resumed.summary(queries) == {'done': 1, 'failed': 1, 'pending': 1}
+    assert list(resumed.select(queries)) == [("C", "all")]
+    assert list(resumed.select(queries, retry_failed=True)) == [("B", "all")]
+
+    resumed.record("C", "all", BatchJournal.DONE)
+    assert BatchJournal(tmp_path / "journal.jsonl").summary(queries)['done'] == 2
+
+
+def test_rate_limiter_shares_bucket_across_instances(tmp_path):
+    from rate_limiter import RateLimiter
+
+    now = [1000.0]
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+
+    def limiter():
+        # Separate instances on one ledger behave like separate processes
+        return RateLimiter(rate_per_hour=3600, burst=2, db_path=tmp_path / "rate.sqlite",
+                           clock=lambda: now[0], sleep=sleep)
+
+    first, second = limiter(), limiter()
+    assert first.acquire() == 0
+    assert second.acquire() == 0
+    assert first.acquire() == pytest.approx(1.0)
+    assert first.total_wait == pytest.approx(1.0) and first.calls == 2
+
+    now[0] += 10  # the bucket refills, but never beyond the burst size
+    assert second.acquire() == 0
+    assert second.acquire() == 0
+    assert second.acquire() == pytest.approx(1.0)
+
+
+def test_rate_limiter_ledger_does_not_depend_on_working_directory(tmp_path, monkeypatch):
+    from rate_limiter import create_rate_limiter
+
+    monkeypatch.delenv("HANDELSREGISTER_RATE_LIMIT_DB", raising=False)
+    args = argparse.Namespace(rate_limit=60, burst=5, debug=False)
+    monkeypatch.chdir(tmp_path)
+    first = create_rate_limiter(args).db_path
+    (tmp_path / "elsewhere").mkdir()
+    monkeypatch.chdir(tmp_path / "elsewhere")
+    assert create_rate_limiter(args).db_path == first
+    assert first.is_absolute()
+
+    monkeypatch.setenv("HANDELSREGISTER_RATE_LIMIT_DB", str(tmp_path / "shared.sqlite"))
+    assert create_rate_limiter(args).db_path == tmp_path / "shared.sqlite"
+    args.rate_limit_db = str(tmp_path / "flag.sqlite")
+    assert create_rate_limiter(args).db_path == tmp_path / "flag.sqlite"
+
+
+def test_result_merger_dedupes_rows_across_pages_and_caps():
+    from html_parser import ResultMerger, merge_result_pages
+    from config import RESULT_PAGE_SEPARATOR
+
+    def page(*indices):
+        rows = "".join(
+            f'<tr data-ri="{i}"><td></td><td>Court {i}</td><td>Firm {i}</td><td>Berlin</td><td>aktuell</td></tr>'
+            for i in indices)
+        return f'<table role="grid"><tbody>{rows}</tbody></table>'
+
+    merger = ResultMerger()
+    assert [c['name'] for c in merger.add_page(page(0, 1))] == ["Firm 0", "Firm 1"]
+    # A page re-rendered after a page-size change repeats earlier rows
+    assert [c['name'] for c in merger.add_page(page(1, 2))] == ["Firm 2"]
+    assert len(merger.companies) == 3 and not merger.full
+
+    cached = RESULT_PAGE_SEPARATOR.join([page(0, 1), page(2, 3)])
+    capped = merge_result_pages(cached.split(RESULT_PAGE_SEPARATOR), max_results=3)
+    assert [c['name'] for c in capped] == ["Firm 0", "Firm 1", "Firm 2"]
+
+
+def test_lxml_parser_backend_matches_beautifulsoup():
+    pytest.importorskip("lxml")
+    from html_parser import resolve_parser_backend
+
+    for html in [GASAG_RESULT_HTML, (FIXTURE_DIR / "sucheErgebnisse.xhtml").read_text(encoding="utf-8")]:
+        companies = get_companies_in_searchresults(html, backend='bs4')
+        assert companies[0]['name'] == 'GASAG AG' and companies[0]['history']
+        assert get_companies_in_searchresults(html, backend='lxml') == companies
+        assert get_companies_in_searchresults(html.encode("utf-8"), backend='lxml') == companies
+    assert resolve_parser_backend('auto') == 'lxml'
+
+
+@pytest.mark.parametrize("backend", ["bs4", "lxml"])
+def test_results_container_is_cut_out_before_parsing(backend, monkeypatch):
+    import html_parser
+
+    if backend == "lxml":
+        pytest.importorskip("lxml")
+    html = (FIXTURE_DIR / "sucheErgebnisse.xhtml").read_text(encoding="utf-8")
+    expected = get_companies_in_searchresults(html, backend='bs4')
+
+    # Navigation and scripts before the grid, nested panelgrid tables inside it
+    noisy = html.replace('<table role="grid">', '<div><table class="nav"><tr><td>Menu</td></tr></table>'
+                         '<script>var t = "<table>";</script></div><table role="grid">', 1)
+    container = html_parser.extract_results_container(noisy)
+    assert container.startswith('<table role="grid">') and container.endswith('</table>')
+    assert 'Menu' not in container and container.count('<table') == container.count('</table>')
+    assert html_parser.extract_results_container(noisy.encode("utf-8")) == container.encode("utf-8")
+
+    parsed = []
+    find_grid = getattr(html_parser, f"_find_grid_{backend}")
+    monkeypatch.setattr(html_parser, f"_find_grid_{backend}", lambda page: parsed.append(page) or find_grid(page))
+    assert get_companies_in_searchresults(noisy, backend=backend) == expected
+    assert parsed == [container]
+
+    unquoted = html.replace('<table role="grid">', '<table role=grid>', 1)
+    assert html_parser.extract_results_container(unquoted).startswith('<table role=grid>')
+
+    # A truncated page has no complete container: the whole page is parsed
+    truncated = html[:html.rindex('</table>')]
+    assert html_parser.extract_results_container(truncated) is None
+    assert get_companies_in_searchresults(truncated, backend=backend) == expected
+    assert parsed[-1] == truncated
+
+
+def test_row_walker_matches_cell_text_parsing_on_long_histories():
+    from bs4 import BeautifulSoup
+    from html_parser import LXML_AVAILABLE
+    from benchmark_parser import previous_rows, synthetic_page
+
+    html = synthetic_page(rows=3, history=60)
+    grid = BeautifulSoup(html, 'html.parser').find('table', role='grid')
+    expected = previous_rows(grid.find_all('tr', attrs={'data-ri': True}))
+    assert len(expected) == 3 and len(expected[2]['history']) == 60
+    assert expected[2]['history'][59] == ('60.) Firma 2 Name 59', '60.) Ort 59')
+
+    for backend in ['bs4'] + (['lxml'] if LXML_AVAILABLE else []):
+        assert get_companies_in_searchresults(html, backend=backend) == expected
+
+
+def test_rows_extracted_in_browser_match_parsed_html(tmp_path, monkeypatch):
+    from bs4 import BeautifulSoup
+    import search_cache
+    from html_parser import ResultMerger, _RowWalker
+    from web_automation import WebAutomation
+    from config import RESULT_ROWS_SCRIPT
+
+    html = (FIXTURE_DIR / "sucheErgebnisse.xhtml").read_text(encoding="utf-8")
+    rows = []
+    for row in BeautifulSoup(html, 'html.parser').find_all('tr', attrs={'data-ri': True}):
+        walker = _RowWalker()
+        walker.walk_bs4(row)
+        rows.append({'ri': row['data-ri'], 'texts': walker.texts, 'cells': walker.cells, 'links': walker.links})
+    # What RESULT_ROWS_SCRIPT hands back over the WebDriver wire
+    payload = json.loads(json.dumps(rows))
+
+    class FakeDriver:
+        @property
+        def page_source(self):
+            pytest.fail("the page source must not be read")
+
+        def execute_script(self, script, *args):
+            assert script == RESULT_ROWS_SCRIPT
+            return payload
+
+    automation = WebAutomation()
+    automation.driver = FakeDriver()
+    monkeypatch.setattr(automation, "_select_largest_page_size", lambda: True)
+    monkeypatch.setattr(automation, "_goto_next_results_page", lambda: False)
+    merger = ResultMerger()
+    automation.collect_result_pages(merger.add_rows, automation.extract_result_rows)
+    assert merger.companies == get_companies_in_searchresults(html)
+
+    # Without HTML the cached records serve hits until the parser version changes
+    cache = search_cache.SearchCache(tmp_path)
+    key = cache.put("gasag", {}, None, companies=merger.companies)['key']
+    assert cache.load_html(key) is None
+    cached = cache.load_companies(key, lambda page: pytest.fail("no HTML to parse"))
+    assert [c['name'] for c in cached] == ['GASAG AG']
+    monkeypatch.setattr(search_cache, "PARSER_VERSION", search_cache.PARSER_VERSION + 1)
+    assert cache.load_companies(key, lambda page: pytest.fail("no HTML to parse")) is None
+
+
+# Minimal DOM for RESULT_ROWS_SCRIPT under node: the tree built by html.parser, with the
+# node properties the script walks and the selectors it queries
+RESULT_ROWS_DOM_SHIM = """
+const tree = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+const elements = [];
+function build(node) {
+  const el = {nodeType: node.type, data: node.data, localName: node.name, attrs: node.attrs || {}};
+  el.getAttribute = name => (name in el.attrs ? el.attrs[name] : null);
+  el.hasAttribute = name => name in el.attrs;
+  el.classList = {contains: name => (el.attrs['class'] || '').split(/\\s+/).includes(name)};
+  if (node.type === 1) { elements.push(el); }
+  const children = (node.children || []).map(build);
+  const childElements = children.filter(child => child.nodeType === 1);
+  children.forEach((child, i) => { child.nextSibling = children[i + 1] || null; });
+  childElements.forEach((child, i) => { child.nextElementSibling = childElements[i + 1] || null; });
+  el.firstChild = children[0] || null;
+  el.firstElementChild = childElements[0] || null;
+  return el;
+}
+build(tree);
+const selectors = {
+  "table[role='grid']": el => el.localName === 'table' && el.getAttribute('role') === 'grid',
+  'table.results': el => el.localName === 'table' && el.classList.contains('results'),
+  'div.search-results': el => el.localName === 'div' && el.classList.contains('search-results'),
+};
+const document = {querySelector: selector => {
+  if (!(selector in selectors)) { throw new Error('selector not supported by the test DOM: ' + selector); }
+  return elements.find(selectors[selector]) || null;
+}};
+process.stdout.write(JSON.stringify(new Function('document', process.argv[1])(document)));
+"""
+
+
+def _dom_tree(node):
+    from bs4 import Comment, Tag
+
+    if isinstance(node, Tag):
+        attrs = {name: ' '.join(value) if isinstance(value, list) else value for name, value in node.attrs.items()}
+        return {'type': 1, 'name': node.name, 'attrs': attrs, 'children': [_dom_tree(child) for child in node.children]}
+    return {'type': 8} if isinstance(node, Comment) else {'type': 3, 'data': str(node)}
+
+
+@pytest.mark.parametrize("page", ["fixture", "synthetic"])
+def test_result_rows_script_matches_parsed_html(page):
+    import shutil
+    import subprocess
+    from bs4 import BeautifulSoup
+    from benchmark_parser import synthetic_page
+    from config import RESULT_ROWS_SCRIPT
+    from html_parser import iter_extracted_rows
+
+    node = shutil.which("node")
+    if node is None:
+        pytest.skip("node is needed to run RESULT_ROWS_SCRIPT")
+
+    if page == "fixture":
+        html = (FIXTURE_DIR / "sucheErgebnisse.xhtml").read_text(encoding="utf-8")
+    else:
+        html = synthetic_page(3, 40)
+    document = {'type': 9, 'children': [_dom_tree(child) for child in BeautifulSoup(html, 'html.parser').children]}
+    result = subprocess.run([node, "-e", RESULT_ROWS_DOM_SHIM, RESULT_ROWS_SCRIPT], input=json.dumps(document),
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+
+    rows = json.loads(result.stdout)
+    expected = get_companies_in_searchresults(html, backend='bs4')
+    assert expected and [company for _, company in iter_extracted_rows(rows)] == expected
+
+
+def test_company_records_are_slotted_and_keep_the_dict_interface():
+    from models import Company, DocumentLink, record_to_dict
+
+    html = (FIXTURE_DIR / "sucheErgebnisse.xhtml").read_text(encoding="utf-8")
+    company = get_companies_in_searchresults(html)[0]
+    assert isinstance(company, Company) and not hasattr(company, '__dict__')
+    assert isinstance(company['document_links'][0], DocumentLink)
+    # Repeated values are shared, onclick JavaScript is left on the page
+    assert company.status is get_companies_in_searchresults(html)[0].status
+    assert company['document_links'][0].to_dict() == {
+        'id': 'ergebnissForm:selectedSuchErgebnisFormTable:0:j_idt161:0:fade', 'type': 'AD', 'onclick': ''}
+
+    assert company.get('extracted_data') is None and 'extracted_data' not in company
+    company['extracted_data'] = {'company_number': 'HRB 44343'}
+    company.update({'document_files': {}})
+    assert 'extracted_data' in company and company['document_files'] == {}
+    with pytest.raises(KeyError):
+        company['missing'] = 1
+
+    data = company.to_dict()
+    assert list(data) == ['court', 'name', 'state', 'status', 'documents', 'history', 'document_links',
+                          'extracted_data', 'document_files']
+    assert company == data and json.loads(json.dumps(company, default=record_to_dict))['name'] == 'GASAG AG'
+
+
+def test_pdf_response_is_captured_from_cdp_without_download():
+    import base64
+    from page_readiness import PageReadiness
+    from pdf_processor import PDFProcessor
+
+    def event(method, **params):
+        return {'message': json.dumps({'message': {'method': method, 'params': params}})}
+
+    class FakeDriver:
+        logs = [
+            event('Network.responseReceived', requestId='7',
+                  response={'url': 'https://portal/doc.pdf', 'mimeType': 'application/pdf'}),
+            event('Network.responseReceived', requestId='8',
+                  response={'url': 'https://portal/page.xhtml', 'mimeType': 'text/html'}),
+            event('Network.loadingFinished', requestId='7', encodedDataLength=9),
+            event('Network.loadingFinished', requestId='8', encodedDataLength=100),
+        ]
+
+        def get_log(self, log_type):
+            logs, self.logs = self.logs, []
+            return logs
+
+        def execute_cdp_cmd(self, cmd, params):
+            assert (cmd, params) == ('Network.getResponseBody', {'requestId': '7'})
+            return {'body': base64.b64encode(b'%PDF-1.4\n').decode(), 'base64Encoded': True}
+
+    driver = FakeDriver()
+    processor = PDFProcessor(driver, readiness=PageReadiness(driver), rate_limiter=object())
+    assert processor._capture_document_response('AD') == b'%PDF-1.4\n'
+    assert processor._capture_document_response('AD') is None
+
+
+def test_si_capture_skips_jsf_partial_responses():
+    from page_readiness import PageReadiness
+    from pdf_processor import PDFProcessor
+
+    si_document = (pathlib.Path(__file__).parent / "fixtures" / "documents" / "GASAG_AG_SI.xml").read_bytes()
+    partial_response = (b'<?xml version="1.0" encoding="UTF-8"?><partial-response id="j_id1"><changes>'
+                        b'<update id="j_id1:javax.faces.ViewState:0"><![CDATA[vs-4]]></update>'
+                        b'</changes></partial-response>')
+    bodies = {'1': si_document, '2': partial_response}
+
+    def event(method, **params):
+        return {'message': json.dumps({'message': {'method': method, 'params': params}})}
+
+    class FakeDriver:
+        def __init__(self, request_ids):
+            self.logs = [event('Network.responseReceived', requestId=request_id,
+                               response={'url': f'https://portal/{request_id}', 'mimeType': 'text/xml'})
+                         for request_id in request_ids]
+            self.logs += [event('Network.loadingFinished', requestId=request_id, encodedDataLength=1)
+                          for request_id in request_ids]
+
+        def get_log(self, log_type):
+            logs, self.logs = self.logs, []
+            return logs
+
+        def execute_cdp_cmd(self, cmd, params):
+            return {'body': bodies[params['requestId']].decode('utf-8'), 'base64Encoded': False}
+
+    # The postback answered after the download is not taken for the SI document
+    driver = FakeDriver(['1', '2'])
+    processor = PDFProcessor(driver, readiness=PageReadiness(driver), rate_limiter=object())
+    assert processor._capture_document_response('SI') == si_document
+
+    driver = FakeDriver(['2'])
+    processor = PDFProcessor(driver, readiness=PageReadiness(driver), rate_limiter=object())
+    assert processor._capture_document_response('SI') is None
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_download_watcher_waits_for_crdownload_rename(tmp_path, monkeypatch, use_inotify):
+    import download_watcher
+    from download_watcher import DownloadWatcher
+
+    if use_inotify and not download_watcher.INOTIFY_AVAILABLE:
+        pytest.skip("inotify is not available on this platform")
+    monkeypatch.setattr(download_watcher, "INOTIFY_AVAILABLE", use_inotify)
+    (tmp_path / "other_job.pdf").write_bytes(b"%PDF")
+
+    def download():
+        partial = tmp_path / "Unconfirmed 1.crdownload"
+        partial.write_bytes(b"%PDF-1.4")
+        threading.Event().wait(0.1)
+        partial.rename(tmp_path / "document.pdf")
+
+    with DownloadWatcher(tmp_path) as watcher:
+        threading.Thread(target=download).start()
+        assert watcher.wait(timeout=5) == tmp_path / "document.pdf"
+    with DownloadWatcher(tmp_path) as later_job:
+        assert later_job.wait(timeout=0.05) is None
+
+
+def test_download_watcher_imports_and_polls_without_inotify(tmp_path, monkeypatch):
+    import importlib
+    import sys
+    import download_watcher
+
+    # Windows: no O_NONBLOCK/O_CLOEXEC and find_library('c') is None
+    monkeypatch.setattr(sys, "platform", "win32")
+    monkeypatch.delattr(os, "O_NONBLOCK", raising=False)
+    monkeypatch.delattr(os, "O_CLOEXEC", raising=False)
+    monkeypatch.setattr("ctypes.util.find_library", lambda name: None)
+    try:
+        watcher_module = importlib.reload(download_watcher)
+        assert not watcher_module.INOTIFY_AVAILABLE
+        with watcher_module.DownloadWatcher(tmp_path) as watcher:
+            (tmp_path / "document.pdf").write_bytes(b"%PDF")
+            assert watcher.wait(timeout=5) == tmp_path / "document.pdf"
+    finally:
+        monkeypatch.undo()
+        importlib.reload(download_watcher)
+
+
+def test_pdf_fetch_streams_through_shared_session(stand_in_portal, tmp_path, monkeypatch):
+    import hashlib
+    from pdf_processor import PDFProcessor
+    from rate_limiter import RateLimiter
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    class FakeDriver:
+        # WebDriver is not thread-safe; fetch workers must not call it
+        @property
+        def current_url(self):
+            assert threading.current_thread() is threading.main_thread()
+            return stand_in_portal
+
+        def get_cookies(self):
+            assert threading.current_thread() is threading.main_thread()
+            return [{'name': 'JSESSIONID', 'value': 'stand-in', 'domain': '127.0.0.1', 'path': '/'}]
+
+    monkeypatch.chdir(tmp_path)
+    driver = FakeDriver()
+    limiter = RateLimiter(rate_per_hour=3600, burst=10, db_path=tmp_path / "rate.sqlite")
+    processor = PDFProcessor(driver, readiness=object(), rate_limiter=limiter)
+
+    url = stand_in_portal + "rp_web/document.pdf"
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        cookies, referer = processor._browser_context()
+        document = executor.submit(processor._download_pdf_from_url, url, "AD", {'name': 'GASAG AG'},
+                                   cookies, referer).result()
+    assert document == {'path': "GASAG_AG_AD.pdf", 'bytes': len(STAND_IN_PDF),
+                        'sha256': hashlib.sha256(STAND_IN_PDF).hexdigest()}
+    assert (tmp_path / "GASAG_AG_AD.pdf").read_bytes() == STAND_IN_PDF
+    assert not processor.session.cookies
+
+    session = processor.session
+    document = processor._download_pdf_from_url(url, "CD", {'name': 'GASAG AG'}, *processor._browser_context())
+    assert document['path'] == "GASAG_AG_CD.pdf"
+    assert processor.session is session and limiter.calls == 2
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_selected_document_types_are_fetched_in_one_pass(monkeypatch):
+    from pdf_processor import PDFProcessor
+
+    processor = PDFProcessor(object(), readiness=object(), rate_limiter=object(),
+                             document_types=["SI", "AD", "HD"])
+    clicked = []
+
+    def download(doc_link, company, executor=None):
+        clicked.append(doc_link['id'])
+        document = {'path': f"{doc_link['type']}.pdf", 'sha256': doc_link['id'], 'bytes': 1}
+        if doc_link['type'] == 'SI':
+            # Direct URLs are fetched on the pool while the next link is clicked
+            return executor.submit(lambda: document)
+        return document
+
+    monkeypatch.setattr(processor, "_download_document", download)
+    monkeypatch.setattr(processor, "_extract_pdf_content", lambda pdf, sha256=None: {'source': pdf})
+
+    company = {'name': 'GASAG AG', 'document_links': [
+        {'id': 'ad', 'type': 'AD', 'onclick': ''},
+        {'id': 'cd', 'type': 'CD', 'onclick': ''},
+        {'id': 'si', 'type': 'SI', 'onclick': ''},
+        {'id': 'ad-2', 'type': 'AD', 'onclick': ''},
+    ]}
+    processor.download_company_documents(company)
+
+    assert clicked == ['si', 'ad']
+    assert sorted(company['document_files']) == ['AD', 'SI']
+    assert company['extracted_data'] == {'source': 'AD.pdf'}
+
+
+def test_results_page_is_restored_after_each_document(monkeypatch):
+    from pdf_processor import PDFProcessor
+
+    class FakeDriver:
+        def __init__(self):
+            self.windows = {'results': 'https://portal/erweitertesuche.xhtml'}
+            self.current_window_handle = 'results'
+            self.switch_to = self
+            self.history = []
+
+        @property
+        def window_handles(self):
+            return list(self.windows)
+
+        @property
+        def current_url(self):
+            return self.windows[self.current_window_handle]
+
+        def window(self, handle):
+            self.current_window_handle = handle
+
+        def close(self):
+            del self.windows[self.current_window_handle]
+
+        def back(self):
+            self.windows[self.current_window_handle] = self.history.pop()
+
+    class Readiness:
+        def wait_for_document_ready(self):
+            pass
+
+    class Limiter:
+        def __init__(self):
+            self.reasons = []
+
+        def acquire(self, cost=1, reason=None):
+            self.reasons.append(reason)
+
+    driver = FakeDriver()
+    limiter = Limiter()
+    processor = PDFProcessor(driver, readiness=Readiness(), rate_limiter=limiter, document_types=["AD", "CD"])
+    seen = []
+
+    def download(doc_link, company, executor=None):
+        seen.append((driver.current_window_handle, driver.current_url, len(driver.windows)))
+        if doc_link['type'] == 'AD':
+            # The click opened the PDF in a new tab and _find_pdf_url() switched to it
+            driver.windows['pdf-tab'] = 'https://portal/document.pdf'
+            driver.current_window_handle = 'pdf-tab'
+        else:
+            # The click navigated the results window itself
+            driver.history.append(driver.current_url)
+            driver.windows['results'] = 'https://portal/document.pdf'
+        return {'path': f"{doc_link['type']}.pdf", 'sha256': doc_link['id'], 'bytes': 1}
+
+    monkeypatch.setattr(processor, "_download_document", download)
+    monkeypatch.setattr(processor, "_extract_pdf_content", lambda pdf, sha256=None: {})
+
+    company = {'name': 'GASAG AG', 'document_links': [
+        {'id': 'ad', 'type': 'AD', 'onclick': ''},
+        {'id': 'cd', 'type': 'CD', 'onclick': ''},
+    ]}
+    processor.download_company_documents(company)
+
+    results_page = ('results', 'https://portal/erweitertesuche.xhtml', 1)
+    assert seen == [results_page, results_page]
+    assert (driver.current_window_handle, driver.current_url, len(driver.windows)) == results_page
+    # Going back is a portal navigation too
+    assert limiter.reasons == ["back to results page"]
+
+
+def test_si_document_is_parsed_and_preferred_over_ad(tmp_path, monkeypatch):
+    from extraction_cache import ExtractionCache
+    from si_parser import parse_si_document
+    from pdf_processor import PDFProcessor
+
+    si_file = pathlib.Path(__file__).parent / "fixtures" / "documents" / "GASAG_AG_SI.xml"
+    data = parse_si_document(str(si_file))
+    assert data == {
+        'company_number': 'HRB 44343',
+        'number_of_entries': 97,
+        'company_name': 'GASAG AG',
+        'location': 'Berlin',
+        'business_address': 'EUREF-Campus 23-24, 10829 Berlin',
+        'management': [{'name': 'Mustermann, Erika', 'location': 'Potsdam', 'birth_date': '17.05.1970'}],
+        'prokura': [{'name': 'Beispiel, Max', 'location': 'Berlin', 'birth_date': '02.01.1981'}],
+        'business_purpose': 'Versorgung mit Energie, insbesondere mit Gas.',
+        'capital': '306.775.000,00 EUR',
+        'representation_rules': 'Die Gesellschaft wird durch zwei Vorstandsmitglieder oder durch ein '
+                                'Vorstandsmitglied gemeinsam mit einem Prokuristen vertreten.',
+        'legal_form': 'Aktiengesellschaft',
+        'founding_date': '09.06.1999',
+        'last_entry_date': '30.11.2023',
+    }
+
+    processor = PDFProcessor(object(), readiness=object(), rate_limiter=object(), document_types=["SI"],
+                             extraction_cache=ExtractionCache(tmp_path))
+    documents = {'SI': {'path': 'GASAG_AG_SI.xml', 'sha256': 'x', 'bytes': 1, 'content': si_file.read_bytes()},
+                 'AD': {'path': 'missing.pdf', 'sha256': 'y', 'bytes': 1}}
+    monkeypatch.setattr(processor, "_extract_pdf_content",
+                        lambda pdf, sha256=None: pytest.fail("AD must not be parsed"))
+    assert processor._extract_company_data(documents) == data
+
+
+def test_extraction_cache_skips_parsing_of_known_documents(tmp_path, monkeypatch):
+    import pdf_processor
+    from extraction_cache import ExtractionCache
+
+    processor = pdf_processor.PDFProcessor(object(), readiness=object(), rate_limiter=object(),
+                                           extraction_cache=ExtractionCache(tmp_path))
+    text = "Amtsgericht Charlottenburg HRB 44343 B\nGASAG AG\n"
+    monkeypatch.setattr(processor, "_extract_pdf_text", lambda stream: text)
+    data = processor._extract_pdf_content(b"%PDF-1.4", sha256="ab" * 32)
+    assert (tmp_path / "ab" / f"{'ab' * 32}.json").exists()
+
+    # Same content hash: neither PyPDF2 nor the parser runs again
+    monkeypatch.setattr(processor, "_extract_pdf_text", lambda stream: pytest.fail("PDF read twice"))
+    monkeypatch.setattr(processor, "_parse_company_data", lambda text: pytest.fail("PDF parsed twice"))
+    assert processor._extract_pdf_content(b"%PDF-1.4", sha256="ab" * 32) == data
+
+    # A new parser version re-parses the cached text without reading the PDF
+    monkeypatch.setattr(pdf_processor, "PDF_PARSER_VERSION", pdf_processor.PDF_PARSER_VERSION + 1)
+    monkeypatch.setattr(processor, "_parse_company_data", lambda cached: {'text': cached})
+    assert processor._extract_pdf_content(b"%PDF-1.4", sha256="ab" * 32) == {'text': text}
+
+
+def test_search_cache_normalizes_queries_and_honours_max_age(tmp_path, monkeypatch):
+    from search_cache import SearchCache, normalize_query
+
+    assert normalize_query("  Müller   GmbH ") == normalize_query("MUELLER gmbh") == "mueller gmbh"
+
+    monkeypatch.chdir(tmp_path)
+    args = argparse.Namespace(
+        debug=False, force=False, schlagwoerter='Gasag  AG', schlagwortOptionen='exact',
+        download_pdfs=False, backend='http', max_age=3600)
+    h = HandelsRegisterSelenium(args)
+    html = (FIXTURE_DIR / "sucheErgebnisse.xhtml").read_text(encoding="utf-8")
+    metadata = h.search_cache.put("gasag ag", h._cache_options(), html, response_seconds=1.5)
+    assert metadata['bytes'] == len(html.encode("utf-8"))
+
+    assert [c['name'] for c in h.search_company()] == ['GASAG AG']
+    # The search option is part of the key
+    assert SearchCache(tmp_path / "cache" / "search").get(
+        "gasag ag", dict(h._cache_options(), schlagwortOptionen='all')) is None
+
+    stale = tmp_path / "cache" / "search" / f"{metadata['key']}.json"
+    stale.write_text(json.dumps(dict(metadata, fetched_at=metadata['fetched_at'] - 7200)))
+    assert h.search_cache.get("gasag ag", h._cache_options(), max_age=3600) is None
+    assert h.search_cache.get("gasag ag", h._cache_options())['response_seconds'] == 1.5
+
+
+def test_search_cache_serves_parsed_records_and_rederives_on_parser_change(tmp_path):
+    import html_parser
+    from models import record_to_dict
+    from search_cache import SearchCache
+
+    cache = SearchCache(tmp_path)
+    html = (FIXTURE_DIR / "sucheErgebnisse.xhtml").read_text(encoding="utf-8")
+    companies = get_companies_in_searchresults(html)
+    key = cache.put("gasag", {'schlagwortOptionen': 'all'}, html, companies=companies)['key']
+
+    def must_not_parse(html):
+        raise AssertionError("a current record must not be re-parsed")
+
+    cached = cache.load_companies(key, must_not_parse)
+    assert json.dumps(cached) == json.dumps(companies, default=record_to_dict)
+
+    records_file = tmp_path / f"{key}.records.json"
+    records = json.loads(records_file.read_text(encoding="utf-8"))
+    records_file.write_text(json.dumps(dict(records, parser_version=html_parser.PARSER_VERSION - 1)))
+    parsed = []
+    assert cache.load_companies(key, lambda html: parsed.append(html) or ['re-derived']) == ['re-derived']
+    assert parsed and cache.load_companies(key, must_not_parse) == ['re-derived']
+
+
+def test_cached_search_fetches_documents_of_stale_companies_only(tmp_path, monkeypatch):
+    import time
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "GASAG_AG_AD.pdf").write_bytes(STAND_IN_PDF)
+    html = (FIXTURE_DIR / "sucheErgebnisse.xhtml").read_text(encoding="utf-8")
+    fetched = []
+
+    def fetch_company_documents(companies):
+        for company in companies:
+            fetched.append(company['name'])
+            company['document_files'] = {'AD': {'path': "GASAG_AG_AD.pdf", 'sha256': "x", 'bytes': 1,
+                                                'fetched_at': time.time()}}
+            company['extracted_data'] = {'company_number': 'HRB 44343'}
+
+    def search(documents_max_age):
+        args = argparse.Namespace(
+            debug=False, force=False, schlagwoerter='Gasag AG', schlagwortOptionen='all',
+            download_pdfs=True, documents=['AD'], documents_max_age=documents_max_age)
+        h = HandelsRegisterSelenium(args)
+        h.search_cache.put('Gasag AG', h._cache_options(), html)
+        monkeypatch.setattr(h, "_fetch_company_documents", fetch_company_documents)
+        for step in ("setup_driver", "open_startpage", "close_driver"):
+            monkeypatch.setattr(h.web_automation, step, lambda: None)
+        return h.search_company()
+
+    # Documents are missing: only GASAG is looked up, the search itself comes from the cache
+    assert search(3600)[0]['extracted_data'] == {'company_number': 'HRB 44343'} and fetched == ['GASAG AG']
+    # Fresh documents come from the result store without a browser
+    assert search(3600)[0]['extracted_data'] == {'company_number': 'HRB 44343'} and fetched == ['GASAG AG']
+    # Past their TTL they are fetched again
+    search(0)
+    assert fetched == ['GASAG AG', 'GASAG AG']
+
+
+def test_si_parser_drops_finished_elements_from_the_tree(monkeypatch):
+    import xml.etree.ElementTree as ET
+    import si_parser
+
+    attached = []
+    original_iterparse = ET.iterparse
+
+    def iterparse(source, events):
+        open_elements = []
+        for event, element in original_iterparse(source, events=events):
+            if event == 'start':
+                open_elements.append(element)
+            else:
+                open_elements.pop()
+            yield event, element
+            if event == 'end' and open_elements and element in list(open_elements[-1]):
+                attached.append(element.tag)
+
+    monkeypatch.setattr(si_parser.ET, "iterparse", iterparse)
+    si_file = pathlib.Path(__file__).parent / "fixtures" / "documents" / "GASAG_AG_SI.xml"
+    data = si_parser.parse_si_document(str(si_file))
+
+    assert data['company_name'] == 'GASAG AG'
+    # Finished elements leave the tree, clearing them alone keeps them in their parent
+    assert attached == []
+
+
+def test_unavailable_si_document_counts_as_fresh_after_ad_fallback(tmp_path, monkeypatch):
+    from pdf_processor import PDFProcessor
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "AD.pdf").write_bytes(b"%PDF")
+    processor = PDFProcessor(object(), readiness=object(), rate_limiter=object(), document_types=["SI"])
+    monkeypatch.setattr(processor, "_download_document", lambda doc_link, company, executor=None: (
+        {'path': "AD.pdf", 'sha256': "a", 'bytes': 4} if doc_link['type'] == 'AD' else None))
+    monkeypatch.setattr(processor, "_extract_pdf_content", lambda pdf, sha256=None: {'source': pdf})
+
+    company = {'name': 'GASAG AG', 'document_links': [{'id': 'ad', 'type': 'AD'}, {'id': 'si', 'type': 'SI'}]}
+    processor.download_company_documents(company)
+    assert company['extracted_data'] == {'source': 'AD.pdf'}
+    assert company['document_files']['SI']['unavailable'] and company['document_files']['AD']['path'] == "AD.pdf"
+
+    args = argparse.Namespace(debug=False, force=False, schlagwoerter='Gasag AG', schlagwortOptionen='all',
+                              download_pdfs=False, backend='http', documents=['SI'], documents_max_age=3600)
+    h = HandelsRegisterSelenium(args)
+    # The failed SI attempt is not repeated on the next -pd run
+    assert h._documents_fresh(company)
+    company['document_files']['SI']['fetched_at'] -= 7200
+    assert not h._documents_fresh(company)
+
+
+def test_default_documents_fall_back_to_ad_without_si_link(tmp_path, monkeypatch):
+    from config import DEFAULT_DOCUMENT_TYPES
+    from pdf_processor import PDFProcessor
+
+    assert DEFAULT_DOCUMENT_TYPES == ["SI"]
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "AD.pdf").write_bytes(b"%PDF")
+    processor = PDFProcessor(object(), readiness=object(), rate_limiter=object())
+    monkeypatch.setattr(processor, "_download_document", lambda doc_link, company, executor=None: (
+        {'path': f"{doc_link['type']}.pdf", 'sha256': doc_link['id'], 'bytes': 4}))
+    monkeypatch.setattr(processor, "_extract_pdf_content", lambda pdf, sha256=None: {'source': pdf})
+
+    company = {'name': 'GASAG AG', 'document_links': [{'id': 'ad', 'type': 'AD'}, {'id': 'cd', 'type': 'CD'}]}
+    args = argparse.Namespace(debug=False, force=False, schlagwoerter='Gasag AG', schlagwortOptionen='all',
+                              download_pdfs=False, backend='http', documents_max_age=3600)
+    h = HandelsRegisterSelenium(args)
+    # No SI offered: the AD fallback is what has to be fetched
+    assert not h._documents_fresh(company)
+
+    processor.download_company_documents(company)
+    assert company['extracted_data'] == {'source': 'AD.pdf'}
+    assert list(company['document_files']) == ['AD']
+    assert h._documents_fresh(company)
+
+
+def test_result_store_indexes_companies_by_register_and_court(tmp_path):
+    from result_store import ResultStore
+
+    html = (FIXTURE_DIR / "sucheErgebnisse.xhtml").read_text(encoding="utf-8")
+    companies = get_companies_in_searchresults(html)
+    companies[0]['extracted_data'] = {'company_number': 'HRB 44343'}
+
+    with ResultStore(tmp_path / "results.sqlite") as store:
+        assert store.store(companies, query="gasag") == 1
+        # A later search without PDF data updates the row but keeps the extracted data
+        assert store.store(get_companies_in_searchresults(html), query="gasag ag") == 1
+
+        found = store.lookup(register="hrb 44343", court="Charlottenburg")
+        assert [c['name'] for c in found] == ['GASAG AG']
+        assert found[0]['history'] == companies[0]['history']
+        assert [link['type'] for link in found[0]['document_links']] == ['AD', 'CD', 'HD', 'DK', 'UT', 'VÖ', 'SI']
+        assert found[0]['extracted_data'] == {'company_number': 'HRB 44343'}
+
+        assert store.lookup(register="HRB 44343", court="München") == []
+        assert len(store.lookup(name="gasag")) == 1
+        plan = " ".join(row[-1] for row in store.conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM companies WHERE register_type = 'HRB' AND register_number = '1'"))
+        assert "companies_register" in plan
@@ -1,7 +1,9 @@
 """Web automation utilities for handelsregister selenium operations."""
 
-import os
+import shutil
+import tempfile
 import time
+from contextlib import contextmanager
 
 try:
     from selenium import webdriver
@@ -11,7 +13,6 @@ try:
     from selenium.webdriver.chrome.options import Options
     from selenium.webdriver.chrome.service import Service
     from selenium.common.exceptions import TimeoutException, NoSuchElementException
-    from webdriver_manager.chrome import ChromeDriverManager
     SELENIUM_AVAILABLE = True
 except ImportError:
     SELENIUM_AVAILABLE = False
@@ -22,21 +23,44 @@ from config import (
     CHROME_EXPERIMENTAL_OPTIONS,
     USER_AGENT,
     DOWNLOAD_PREFS,
+    DOWNLOAD_DIR_PREFIX,
     DEFAULT_WAIT_TIMEOUT,
     EXTENDED_WAIT_TIMEOUT,
+    READINESS_TIMEOUT,
+    CHROME_LOGGING_PREFS,
+    LEAN_CONTENT_SETTINGS,
+    LEAN_BLOCKED_URL_PATTERNS,
+    NAVIGATION_DURATION_SCRIPT,
+    PAGINATOR_ROWS_PER_PAGE_SELECTOR,
+    PAGINATOR_NEXT_SELECTOR,
+    PAGINATOR_DISABLED_CLASS,
+    RESULT_ROW_SELECTOR,
     SEARCH_FIELD_SELECTORS,
     SEARCH_OPTION_SELECTORS,
     SUBMIT_BUTTON_SELECTORS,
     COMMON_FIELD_IDS,
     ADVANCED_SEARCH_LINK_TEXT,
+    ADVANCED_SEARCH_PAGE,
+    COMBINED_SELECTOR_PROBE_SCRIPT,
+    RESULT_ROWS_SCRIPT,
     SCHLAGWORT_OPTIONEN
 )
+from driver_resolver import ChromedriverResolver
+from http_backend import create_session
+from page_readiness import PageReadiness
+from selector_cache import SelectorCache
+from rate_limiter import RateLimiter
+
+# Field IDs expressed as CSS so they can join the combined selector probe
+SEARCH_FIELD_CANDIDATES = SEARCH_FIELD_SELECTORS + \
+    [f"[id='{field_id}']" for field_id in COMMON_FIELD_IDS]
 
 
 class WebAutomation:
     """Handles web automation tasks for handelsregister website."""
 
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, offline=False, max_wait=READINESS_TIMEOUT, lean=False,
+                 rate_limiter=None):
         if not SELENIUM_AVAILABLE:
             raise ImportError(
                 "Selenium is required for web automation. Install with: pip install selenium"
@@ -44,15 +68,27 @@ class WebAutomation:
         self.debug = debug
         self.driver = None
         self.wait = None
+        self.readiness = None
+        self.download_dir = None
+        self._http_session = None
+        self.max_wait = max_wait
+        self.lean = lean
+        self.step_metrics = []
+        self.driver_resolver = ChromedriverResolver(offline=offline, debug=debug)
+        self.selector_cache = SelectorCache()
+        self.rate_limiter = rate_limiter or RateLimiter(debug=debug)
+        self.startup_timings = {}
 
     def setup_driver(self):
         """Set up the Selenium WebDriver with optimal configuration."""
         chrome_options = Options()
 
-        # Configure download directory to current working directory
-        download_dir = os.path.abspath(".")
+        # Download into a private directory so concurrent jobs never see each other's files
+        self.download_dir = tempfile.mkdtemp(prefix=DOWNLOAD_DIR_PREFIX)
         prefs = DOWNLOAD_PREFS.copy()
-        prefs["download.default_directory"] = download_dir
+        prefs["download.default_directory"] = self.download_dir
+        if self.lean:
+            prefs.update(LEAN_CONTENT_SETTINGS)
         chrome_options.add_experimental_option("prefs", prefs)
 
         # Add automation options
@@ -72,18 +108,38 @@ class WebAutomation:
         # Add user agent
         chrome_options.add_argument(f"--user-agent={USER_AGENT}")
 
+        # Record CDP network events for network idle detection
+        chrome_options.set_capability("goog:loggingPrefs", CHROME_LOGGING_PREFS)
+
         try:
-            # Use webdriver-manager to automatically handle chromedriver
-            service = Service(ChromeDriverManager().install())
+            # Resolve chromedriver from the local cache, webdriver-manager only on version change
+            started = time.perf_counter()
+            service = Service(self.driver_resolver.resolve())
+            resolved = time.perf_counter()
             self.driver = webdriver.Chrome(
                 service=service, options=chrome_options)
+            launched = time.perf_counter()
             self.wait = WebDriverWait(self.driver, DEFAULT_WAIT_TIMEOUT)
+            self.readiness = PageReadiness(
+                self.driver, timeout=self.max_wait, debug=self.debug)
 
             # Remove webdriver property to appear more human-like
             self.driver.execute_script(
                 "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
             )
 
+            if self.lean:
+                self._block_unneeded_resources()
+
+            self.startup_timings = {
+                'driver_resolution': resolved - started,
+                'browser_launch': launched - resolved,
+                'total': time.perf_counter() - started
+            }
+            self._debug_print(
+                "Driver startup: resolve {driver_resolution:.2f}s, launch {browser_launch:.2f}s, "
+                "total {total:.2f}s".format(**self.startup_timings))
+
         except Exception as e:
             raise RuntimeError(
                 f"Failed to start Chrome WebDriver: {e}\n"
@@ -94,13 +150,21 @@ class WebAutomation:
         """Navigate to the handelsregister homepage."""
         self._debug_print("Opening handelsregister.de homepage...")
 
-        self.driver.get(HANDELSREGISTER_URL)
+        with self.measure_step('homepage'):
+            self.rate_limiter.acquire(reason="homepage")
+            self.driver.get(HANDELSREGISTER_URL)
+            self.readiness.wait_for_document_ready()
 
         self._debug_print(f"Page title: {self.driver.title}")
         self._debug_print(f"Current URL: {self.driver.current_url}")
 
     def navigate_to_advanced_search(self):
         """Navigate to the advanced search page using JavaScript links."""
+        with self.measure_step('advanced_search'):
+            return self._navigate_to_advanced_search()
+
+    def _navigate_to_advanced_search(self):
+        """Click through to the advanced search page."""
         self._debug_print("Navigating to advanced search...")
 
         # Longer timeout for headless mode
@@ -110,7 +174,7 @@ class WebAutomation:
         try:
             # Wait for page to fully load first
             wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-            time.sleep(3)  # Additional wait for dynamic content
+            self.readiness.wait_for_page_ready()
 
             # Try each advanced search link text
             for link_text in ADVANCED_SEARCH_LINK_TEXT:
@@ -123,10 +187,12 @@ class WebAutomation:
 
                     # Scroll to element to ensure it's visible
                     self._scroll_to_element(advanced_search_link)
-                    time.sleep(1)
 
+                    self.rate_limiter.acquire(reason="advanced search")
                     advanced_search_link.click()
-                    time.sleep(3)
+                    self.readiness.wait_for(
+                        'advanced_search_page', self.is_on_advanced_search)
+                    self.readiness.wait_for_page_ready()
 
                     page_title = self.driver.title
                     self._debug_print(
@@ -152,7 +218,7 @@ class WebAutomation:
     def find_and_fill_search_field(self, search_term, search_option):
         """Find and fill the search form field."""
         self._debug_print("Looking for search form...")
-        time.sleep(2)  # Wait for page to fully load
+        self.readiness.wait_for_page_ready()
 
         # Try to find search field using various selectors
         search_field = self._find_search_field()
@@ -168,6 +234,7 @@ class WebAutomation:
 
         # Try to find and click submit button
         submit_button = self._find_submit_button()
+        self.rate_limiter.acquire(reason="search")
 
         if submit_button:
             submit_button.click()
@@ -177,13 +244,102 @@ class WebAutomation:
             # Try submitting the first form directly
             return self._submit_form_directly()
 
+    def collect_result_pages(self, on_page, read_page=None):
+        """Walk every results page at the largest page size.
+
+        ``on_page(page)`` is called for each page while it is still shown in
+        the browser and returns False to stop early. A page is what
+        ``read_page()`` returns, the page HTML by default. Returns the pages.
+        """
+        read_page = read_page or (lambda: self.driver.page_source)
+        self._select_largest_page_size()
+
+        pages = []
+        while True:
+            page = read_page()
+            pages.append(page)
+            if not on_page(page):
+                break
+            if not self._goto_next_results_page():
+                break
+
+        self._debug_print(f"Collected {len(pages)} results page(s)")
+        return pages
+
+    def extract_result_rows(self):
+        """Collect the result rows of the shown page in the browser (see ``RESULT_ROWS_SCRIPT``).
+
+        One script call returns the rows as JSON instead of serializing the
+        whole page for a second parse in Python.
+        """
+        return self.driver.execute_script(RESULT_ROWS_SCRIPT)
+
+    @contextmanager
+    def measure_step(self, step):
+        """Record transferred bytes, request counts and load time of a navigation step."""
+        network = self.readiness.network
+        network.poll()
+        bytes_before = network.bytes_received
+        requests_before = network.requests_sent
+        blocked_before = network.requests_blocked
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            network.poll()
+            metrics = {
+                'step': step,
+                'lean': self.lean,
+                'bytes': network.bytes_received - bytes_before,
+                'requests': network.requests_sent - requests_before,
+                'blocked': network.requests_blocked - blocked_before,
+                'seconds': time.perf_counter() - started,
+                'page_load_ms': self._navigation_duration()
+            }
+            self.step_metrics.append(metrics)
+            self._debug_print(
+                "Step {step}: {bytes} bytes, {requests} requests ({blocked} blocked), "
+                "{seconds:.2f}s".format(**metrics))
+
+    def wait_for_results(self):
+        """Wait until the search results page has been rendered."""
+        return self.readiness.wait_for_results()
+
+    def is_on_advanced_search(self):
+        """Check whether the browser currently shows the advanced search form."""
+        if not self.driver:
+            return False
+        return ADVANCED_SEARCH_PAGE in self.driver.current_url
+
+    @property
+    def http_session(self):
+        """Keep-alive requests session for direct fetches made on behalf of this driver."""
+        if self._http_session is None:
+            self._http_session = create_session()
+        return self._http_session
+
     def close_driver(self):
         """Close the WebDriver."""
         if self.driver:
             self.driver.quit()
+            self.driver = None
+            self.wait = None
+            self.readiness = None
+        if self._http_session is not None:
+            self._http_session.close()
+            self._http_session = None
+        if self.download_dir:
+            shutil.rmtree(self.download_dir, ignore_errors=True)
+            self.download_dir = None
 
     def _find_search_field(self):
         """Find the search field using various selectors."""
+        # Try the learned selector and then all candidates in one round trip
+        search_field, _ = self._find_with_learned_selector(
+            'search_field', SEARCH_FIELD_CANDIDATES, clickable=True)
+        if search_field:
+            return search_field
+
         # Try CSS selectors first
         for selector in SEARCH_FIELD_SELECTORS:
             try:
@@ -192,6 +348,7 @@ class WebAutomation:
                 )
                 self._debug_print(
                     f"Found search field with selector: {selector}")
+                self.selector_cache.remember('search_field', selector)
                 return search_field
             except TimeoutException:
                 continue
@@ -203,6 +360,7 @@ class WebAutomation:
                     EC.element_to_be_clickable((By.ID, field_id))
                 )
                 self._debug_print(f"Found search field with ID: {field_id}")
+                self.selector_cache.remember('search_field', f"[id='{field_id}']")
                 return search_field
             except TimeoutException:
                 continue
@@ -221,7 +379,6 @@ class WebAutomation:
 
             # Scroll to element and focus
             self._scroll_to_element(search_field)
-            time.sleep(0.5)
             search_field.click()
 
             # Clear and fill the search field
@@ -244,41 +401,84 @@ class WebAutomation:
     def _set_search_options(self, search_option):
         """Set search options (dropdown or radio buttons)."""
         try:
-            for selector in SEARCH_OPTION_SELECTORS:
+            option_element, selector = self._find_with_learned_selector(
+                'search_option', SEARCH_OPTION_SELECTORS)
+            if option_element is None:
+                option_element, selector = self._find_first_element(SEARCH_OPTION_SELECTORS)
+                if option_element is not None:
+                    self.selector_cache.remember('search_option', selector)
+
+            if option_element is not None and selector.startswith("select"):
+                # Handle dropdown
+                select = Select(option_element)
+                option_value = SCHLAGWORT_OPTIONEN.get(
+                    search_option, 1)
                 try:
-                    option_element = self.driver.find_element(
-                        By.CSS_SELECTOR, selector)
-                    if selector.startswith("select"):
-                        # Handle dropdown
-                        select = Select(option_element)
-                        option_value = SCHLAGWORT_OPTIONEN.get(
-                            search_option, 1)
-                        try:
-                            select.select_by_value(str(option_value))
-                        except:
-                            select.select_by_index(option_value - 1)
-
-                        self._debug_print(
-                            f"Set search option to: {search_option}")
-                    break
-                except NoSuchElementException:
-                    continue
+                    select.select_by_value(str(option_value))
+                except:
+                    select.select_by_index(option_value - 1)
+
+                self._debug_print(
+                    f"Set search option to: {search_option}")
 
         except Exception as e:
             self._debug_print(f"Could not set search options: {e}")
 
     def _find_submit_button(self):
         """Find the submit button using various selectors."""
-        for selector in SUBMIT_BUTTON_SELECTORS:
+        submit_button, _ = self._find_with_learned_selector(
+            'submit_button', SUBMIT_BUTTON_SELECTORS)
+        if submit_button:
+            return submit_button
+
+        submit_button, selector = self._find_first_element(SUBMIT_BUTTON_SELECTORS)
+        if submit_button:
+            self._debug_print(
+                f"Found submit button with selector: {selector}")
+            self.selector_cache.remember('submit_button', selector)
+        return submit_button
+
+    def _find_first_element(self, selectors):
+        """Return the first element matching the selectors, probing them one by one."""
+        for selector in selectors:
             try:
-                submit_button = self.driver.find_element(
-                    By.CSS_SELECTOR, selector)
-                self._debug_print(
-                    f"Found submit button with selector: {selector}")
-                return submit_button
+                return self.driver.find_element(By.CSS_SELECTOR, selector), selector
             except NoSuchElementException:
                 continue
-        return None
+        return None, None
+
+    def _find_with_learned_selector(self, key, candidates, clickable=False):
+        """Resolve an element via the learned selector, then via one combined query.
+
+        A learned selector that no longer matches is invalidated. Returns
+        ``(element, selector)`` or ``(None, None)`` so the caller can fall
+        back to its full probe.
+        """
+        learned = self.selector_cache.get(key)
+        if learned:
+            element, _ = self._probe_selectors([learned], clickable)
+            if element is not None:
+                self._debug_print(f"Found {key} with learned selector: {learned}")
+                return element, learned
+            self._debug_print(f"Learned selector for {key} no longer matches: {learned}")
+            self.selector_cache.invalidate(key)
+
+        element, selector = self._probe_selectors(candidates, clickable)
+        if element is not None:
+            self._debug_print(f"Found {key} with combined probe: {selector}")
+            self.selector_cache.remember(key, selector)
+            return element, selector
+
+        return None, None
+
+    def _probe_selectors(self, selectors, clickable):
+        """Resolve all selectors with a single combined query in the page."""
+        match = self.driver.execute_script(
+            COMBINED_SELECTOR_PROBE_SCRIPT, selectors, clickable)
+        if not match:
+            return None, None
+        index, element = match
+        return element, selectors[int(index)]
 
     def _submit_form_directly(self):
         """Submit the first form directly if no submit button found."""
@@ -295,6 +495,77 @@ class WebAutomation:
             self._debug_print(f"Error submitting form: {e}")
             return False
 
+    def _select_largest_page_size(self):
+        """Switch the results datatable to its largest rows-per-page option."""
+        selects = self.driver.find_elements(By.CSS_SELECTOR, PAGINATOR_ROWS_PER_PAGE_SELECTOR)
+        if not selects:
+            return False
+
+        select = Select(selects[0])
+        values = [option.get_attribute('value') for option in select.options]
+        sizes = [int(value) for value in values if value and value.isdigit()]
+        if not sizes:
+            return False
+
+        largest = str(max(sizes))
+        if select.first_selected_option.get_attribute('value') == largest:
+            return True
+
+        self._debug_print(f"Setting results page size to {largest}")
+        first_row = self._first_result_row()
+        self.rate_limiter.acquire(reason="page size")
+        select.select_by_value(largest)
+        self._wait_for_table_update(first_row)
+        return True
+
+    def _goto_next_results_page(self):
+        """Click the paginator's next button. Returns False on the last page."""
+        buttons = self.driver.find_elements(By.CSS_SELECTOR, PAGINATOR_NEXT_SELECTOR)
+        if not buttons:
+            return False
+
+        button = buttons[0]
+        if PAGINATOR_DISABLED_CLASS in (button.get_attribute('class') or ''):
+            return False
+
+        first_row = self._first_result_row()
+        self.rate_limiter.acquire(reason="next results page")
+        self._scroll_to_element(button)
+        button.click()
+        return self._wait_for_table_update(first_row)
+
+    def _wait_for_table_update(self, previous_first_row):
+        """Wait until the AJAX refresh replaced the old rows and the queue is idle."""
+        updated = True
+        if previous_first_row is not None:
+            updated = self.readiness.wait_for(
+                'table_update', lambda: EC.staleness_of(previous_first_row)(self.driver))
+        self.readiness.wait_for_ajax_idle()
+        return updated
+
+    def _first_result_row(self):
+        """Return the first result row element, if any."""
+        rows = self.driver.find_elements(By.CSS_SELECTOR, RESULT_ROW_SELECTOR)
+        return rows[0] if rows else None
+
+    def _block_unneeded_resources(self):
+        """Stop images, fonts, stylesheets and analytics from loading via CDP."""
+        try:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            self.driver.execute_cdp_cmd(
+                "Network.setBlockedURLs", {"urls": LEAN_BLOCKED_URL_PATTERNS})
+            self._debug_print(
+                f"Lean browsing: blocking {len(LEAN_BLOCKED_URL_PATTERNS)} URL patterns")
+        except Exception as e:
+            self._debug_print(f"Could not enable lean browsing: {e}")
+
+    def _navigation_duration(self):
+        """Return the current document's navigation duration in milliseconds."""
+        try:
+            return self.driver.execute_script(NAVIGATION_DURATION_SCRIPT)
+        except Exception:
+            return None
+
     def _scroll_to_element(self, element):
         """Scroll to ensure element is visible."""
         self.driver.execute_script("arguments[0].scrollIntoView();", element)